@@ -0,0 +1,120 @@
+import argparse
+import os
+import tempfile
+import time
+
+from block_store import BlockStore, block_header, genesis_block, make_block
+from merkle import merkle_root
+from mining_engine import MiningEngine
+from reg_index import RegistrationIndex
+from transactions import registration_number
+
+# Transactions per block when the miner verifies them one by one
+MAX_BLOCK_TRANSACTIONS = 5
+# Default budget for batch mining, whichever limit is reached first ends the batch
+BATCH_MAX_TRANSACTIONS = 500
+BATCH_MAX_BYTES = 256 * 1024
+
+
+def select_batch(transactions, max_transactions=BATCH_MAX_TRANSACTIONS, max_bytes=BATCH_MAX_BYTES):
+    """The longest prefix of the pending pool that fits the count and byte budget"""
+    batch = []
+    size = 0
+    for transaction in transactions:
+        length = len(transaction.encode('utf-8'))
+        if len(batch) >= max_transactions or (batch and size + length > max_bytes):
+            break
+        batch.append(transaction)
+        size += length
+    return batch
+
+
+def validate_batch(transactions, index=None):
+    """Split a batch into (accepted, rejected) in one pass.
+
+    A transaction is rejected if it has no registration number, repeats a
+    registration earlier in the batch or is already in the blockchain.
+    rejected is a list of (transaction, reason).
+    """
+    accepted = []
+    rejected = []
+    seen = set()
+    close_index = index is None
+    if index is None:
+        index = RegistrationIndex()
+    try:
+        for transaction in transactions:
+            car_reg = registration_number(transaction)
+            if not car_reg:
+                rejected.append((transaction, "no car registration number"))
+            elif car_reg in seen:
+                rejected.append((transaction, "duplicate registration in batch"))
+            elif index.in_chain(car_reg):
+                rejected.append((transaction, "already in the blockchain"))
+            else:
+                seen.add(car_reg)
+                accepted.append(transaction)
+    finally:
+        if close_index:
+            index.close()
+    return accepted, rejected
+
+
+def mine_block(store, transactions, difficulty, engine=None):
+    """Build and mine one block of `transactions` on top of the store's tip.
+
+    The block is not appended. Returns the block record, or None if mining was
+    cancelled or the nonce space ran out.
+    """
+    engine = engine or MiningEngine()
+    tip = store.tip()
+    height = tip["height"] + 1 if tip else 0
+    prev_hash = tip["hash"] if tip else ""
+    timestamp = round(time.time(), 3)
+    header = block_header(prev_hash, merkle_root(transactions), height, timestamp, difficulty)
+    result = engine.mine(header, difficulty)
+    if result is None:
+        return None
+    nonce, block_hash = result
+    return make_block(height, prev_hash, transactions, nonce, block_hash,
+                      timestamp, difficulty, engine.hasher.spec())
+
+
+def _sample_transactions(count, start=0):
+    return [f"Transaction No: {n}, Car Registration Number: BENCH{n:08d}, License Number: L{n:08d}, "
+            f"Car Owner Name: Owner {n}, Pseudonym: {n:064x}" for n in range(start, start + count)]
+
+
+def benchmark(sizes, difficulty, blocks=3, workers=None):
+    """Yield (block size, transactions/sec) for each size, mining into a scratch store"""
+    engine = MiningEngine(workers=workers)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BlockStore(os.path.join(tmp, "blocks.jsonl"))
+        store.append(genesis_block())
+        with RegistrationIndex(os.path.join(tmp, "registrations.db"),
+                               os.path.join(tmp, "registrations.bloom")) as index:
+            next_tx = 0
+            for size in sizes:
+                mined = 0
+                start = time.perf_counter()
+                for _ in range(blocks):
+                    pending = _sample_transactions(size, next_tx)
+                    next_tx += size
+                    accepted, _ = validate_batch(select_batch(pending, size, float('inf')), index)
+                    block = mine_block(store, accepted, difficulty, engine)
+                    store.append(block)
+                    index.add_block(block)
+                    mined += len(block["transactions"])
+                yield size, mined / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure transactions/sec of batch mining for several block sizes")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[5, 50, 500, 5000], help="transactions per block")
+    parser.add_argument("--difficulty", type=float, default=8, help="difficulty in leading zero bits")
+    parser.add_argument("--blocks", type=int, default=3, help="blocks mined per size")
+    parser.add_argument("--workers", type=int, default=None, help="mining processes, one per core by default")
+    args = parser.parse_args()
+
+    for size, rate in benchmark(args.sizes, args.difficulty, args.blocks, args.workers):
+        print(f"{size:>8} transactions/block {rate:>12,.1f} transactions/sec")
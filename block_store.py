@@ -0,0 +1,290 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import struct
+
+from file_lock import LEDGER_LOCK_PATH, write_lock
+from merkle import merkle_root
+
+BLOCKS_PATH = "blocks.jsonl"
+LEGACY_BLOCKS_PATH = "blocks.txt"
+GENESIS_TEXT = "Genesis Block"
+# Separator the miner windows use when several transactions share one block
+TRANSACTION_SEPARATOR = "\n---TRANSACTION---\n"
+
+# One little-endian uint64 file offset per block, so block N is at byte N * 8
+_OFFSET = struct.Struct('<Q')
+# Proof-of-work header: previous hash, Merkle root, height, timestamp, difficulty.
+# The hasher appends the 8 byte nonce, so every attempt hashes 96 bytes
+# whatever the size of the block.
+_HEADER = struct.Struct('<32s32sQdd')
+
+
+def _hash_bytes(value):
+    """32 byte form of a block hash, older non-hex hashes are hashed down to 32 bytes"""
+    try:
+        raw = bytes.fromhex(value)
+        if len(raw) == 32:
+            return raw
+    except ValueError:
+        pass
+    return hashlib.sha256(str(value).encode('utf-8')).digest()
+
+
+def block_header(prev_hash, root, height, timestamp, difficulty):
+    """Fixed-size header that the proof of work is computed over"""
+    return _HEADER.pack(_hash_bytes(prev_hash), bytes.fromhex(root), height,
+                        float(timestamp or 0), float(difficulty or 0))
+
+
+def header_of(record):
+    """Rebuild the proof-of-work header of a stored block"""
+    return block_header(record["prev_hash"], record["merkle_root"], record["height"],
+                        record["timestamp"], record["difficulty"])
+
+
+def make_block(height, prev_hash, transactions, nonce, block_hash,
+               timestamp=None, difficulty=None, algorithm=None, legacy=False):
+    """Build a block record, the header fields always come first and in this order"""
+    record = {
+        "height": height,
+        "prev_hash": prev_hash,
+        "merkle_root": merkle_root(transactions),
+        "timestamp": timestamp,
+        "difficulty": difficulty,
+        "algorithm": algorithm,
+        "nonce": nonce,
+        "hash": block_hash,
+        "transactions": list(transactions),
+    }
+    if legacy:
+        # Migrated from blocks.txt, mined with a random salt so the PoW can't be re-checked
+        record["legacy"] = True
+    return record
+
+
+def genesis_block():
+    return make_block(0, "", [GENESIS_TEXT], 0, hashlib.sha256(GENESIS_TEXT.encode('utf-8')).hexdigest())
+
+
+class BlockStore:
+    """Append-only JSON-lines block file with a fixed-width offset index.
+
+    blocks.jsonl holds one JSON record per block and blocks.jsonl.idx holds the
+    byte offset of every record, so any block can be read with two seeks.
+    blocks.jsonl.tip caches the height, hash and offset of the last block.
+    """
+
+    def __init__(self, path=BLOCKS_PATH, index_path=None):
+        self.path = path
+        self.index_path = index_path or path + ".idx"
+        self.tip_path = path + ".tip"
+        self._sync_index()
+
+    def __len__(self):
+        if not os.path.exists(self.index_path):
+            return 0
+        return os.path.getsize(self.index_path) // _OFFSET.size
+
+    def _offset(self, height):
+        with open(self.index_path, "rb") as idx:
+            idx.seek(height * _OFFSET.size)
+            return _OFFSET.unpack(idx.read(_OFFSET.size))[0]
+
+    def _sync_index(self):
+        """Bring the index up to date with the data file after a crash or a copy"""
+        if not os.path.exists(self.path):
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path)
+            return
+        data_size = os.path.getsize(self.path)
+        count = 0
+        if os.path.exists(self.index_path):
+            count = os.path.getsize(self.index_path) // _OFFSET.size
+        start = 0
+        if count:
+            offset = self._offset(count - 1)
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                line = f.readline()
+            if offset >= data_size or not line.endswith(b"\n"):
+                count = 0
+            else:
+                start = offset + len(line)
+        with open(self.index_path, "r+b" if os.path.exists(self.index_path) else "wb") as idx:
+            # Drop any partial or stale entries before indexing the rest of the data
+            idx.truncate(count * _OFFSET.size)
+            idx.seek(0, os.SEEK_END)
+            with open(self.path, "r+b") as f:
+                f.seek(start)
+                offset = start
+                for line in iter(f.readline, b""):
+                    if not line.endswith(b"\n"):
+                        # Torn write at the end of the file, drop it
+                        f.truncate(offset)
+                        break
+                    idx.write(_OFFSET.pack(offset))
+                    offset += len(line)
+
+    def append(self, record):
+        """Append a block, its height must be the next one in the chain"""
+        height = len(self)
+        if record["height"] != height:
+            raise ValueError(f"Block {record['height']} does not follow block {height - 1}")
+        line = (json.dumps(record) + "\n").encode('utf-8')
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            f.write(line)
+        with open(self.index_path, "ab") as idx:
+            idx.write(_OFFSET.pack(offset))
+        self._write_tip(height, record["hash"], offset)
+        return height
+
+    def sync(self):
+        """fsync the data file and the index, the tip is rebuilt from them if it is lost"""
+        for path in (self.path, self.index_path):
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    os.fsync(f.fileno())
+
+    def _write_tip(self, height, block_hash, offset):
+        tip = {"height": height, "hash": block_hash, "offset": offset}
+        tmp_path = self.tip_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(tip, f)
+        # Readers see either the old or the new tip, never a partial one
+        os.replace(tmp_path, self.tip_path)
+        return tip
+
+    def tip(self):
+        """Height, hash and offset of the last block without reading the chain.
+
+        The cached tip is checked against the index and rebuilt from the last
+        record if it is stale. Returns None for an empty chain.
+        """
+        count = len(self)
+        if not count:
+            return None
+        try:
+            with open(self.tip_path, "r") as f:
+                tip = json.load(f)
+            if tip["height"] == count - 1 and tip["offset"] == self._offset(count - 1):
+                return tip
+        except (OSError, ValueError, KeyError):
+            pass
+        return self._write_tip(count - 1, self.get(count - 1)["hash"], self._offset(count - 1))
+
+    def get(self, height):
+        """Read block `height` in O(1) through the offset index"""
+        if height < 0:
+            height += len(self)
+        if height < 0 or height >= len(self):
+            raise IndexError(f"No block at height {height}")
+        with open(self.path, "rb") as f:
+            f.seek(self._offset(height))
+            return json.loads(f.readline())
+
+    def last(self):
+        """The most recent block, or None for an empty chain"""
+        return self.get(-1) if len(self) else None
+
+    def tail(self, count):
+        """The last `count` blocks, oldest first"""
+        total = len(self)
+        return [self.get(height) for height in range(max(0, total - count), total)]
+
+    def iter_blocks(self, start=0):
+        """Stream blocks from `start` without loading the whole chain"""
+        if start >= len(self):
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._offset(start))
+            for line in f:
+                yield json.loads(line)
+
+    def __iter__(self):
+        return self.iter_blocks()
+
+
+_LEGACY_BLOCK_RE = re.compile(r"^Block number: (\d+), Transactions?: \{(.*)\}, Nonce: (\d+), (.*)$")
+_LEGACY_FIELDS = {"Timestamp": float, "Difficulty": float, "Algorithm": str, "Hash": str}
+
+
+def parse_legacy_block(line):
+    """Parse one line of the old blocks.txt format, returns None if it is malformed"""
+    match = _LEGACY_BLOCK_RE.match(line.strip())
+    if not match:
+        return None
+    height, body, nonce, rest = match.groups()
+    fields = {}
+    hash_split = rest.split("Hash: ")
+    for part in hash_split[0].split(", "):
+        if ": " in part:
+            key, value = part.split(": ", 1)
+            if key in _LEGACY_FIELDS:
+                fields[key] = _LEGACY_FIELDS[key](value)
+    fields["Hash"] = hash_split[-1].strip()
+    # The miners replaced newlines with commas, including in the transaction separator
+    transactions = body.split(TRANSACTION_SEPARATOR.replace("\n", ","))
+    return {
+        "height": int(height),
+        "transactions": transactions,
+        "nonce": int(nonce),
+        "hash": fields["Hash"],
+        "timestamp": fields.get("Timestamp"),
+        "difficulty": fields.get("Difficulty"),
+        "algorithm": fields.get("Algorithm"),
+    }
+
+
+def migrate_legacy_blocks(store, legacy_path=LEGACY_BLOCKS_PATH):
+    """One-shot import of blocks.txt into an empty BlockStore.
+
+    Blocks are renumbered consecutively and linked through their previous hash.
+    The old file is renamed to blocks.txt.migrated afterwards. Returns the number
+    of blocks imported.
+    """
+    if not os.path.exists(legacy_path):
+        return 0
+    if len(store):
+        raise ValueError(f"{store.path} already contains blocks")
+    prev_hash = ""
+    imported = 0
+    with open(legacy_path, "r") as f:
+        for line in f:
+            parsed = parse_legacy_block(line)
+            if parsed is None:
+                if line.strip():
+                    print(f"Skipping malformed block line: {line.strip()[:80]}")
+                continue
+            store.append(make_block(imported, prev_hash, parsed["transactions"], parsed["nonce"],
+                                    parsed["hash"], parsed["timestamp"], parsed["difficulty"],
+                                    parsed["algorithm"], legacy=True))
+            prev_hash = parsed["hash"]
+            imported += 1
+    os.replace(legacy_path, legacy_path + ".migrated")
+    return imported
+
+
+def open_block_store(path=BLOCKS_PATH, legacy_path=LEGACY_BLOCKS_PATH):
+    """Open the block store, migrating an old blocks.txt the first time.
+
+    Opening can truncate a torn record and extend the offset index, so it
+    holds the write lock of the store's directory, like any other write.
+    """
+    with write_lock(os.path.join(os.path.dirname(path), LEDGER_LOCK_PATH)):
+        store = BlockStore(path)
+        if not len(store) and os.path.exists(legacy_path):
+            count = migrate_legacy_blocks(store, legacy_path)
+            print(f"Migrated {count} blocks from {legacy_path} to {path}")
+    return store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate blocks.txt into the structured block store")
+    parser.add_argument("legacy", nargs="?", default=LEGACY_BLOCKS_PATH, help="old blocks.txt file")
+    parser.add_argument("--store", default=BLOCKS_PATH, help="block store to create")
+    args = parser.parse_args()
+    open_block_store(args.store, args.legacy)
@@ -0,0 +1,136 @@
+import hashlib
+import math
+import os
+import struct
+
+DEFAULT_CAPACITY = 100000
+DEFAULT_ERROR_RATE = 0.01
+
+# magic, number of bits, number of hash functions, number of keys added
+_HEADER = struct.Struct('<4sQIQ')
+_MAGIC = b'BLM1'
+# Average distance between changed bytes up to which add_many() writes the whole span
+_SPAN_GAP = 64
+
+
+class BloomFilter:
+    """Bit-array Bloom filter used to prove that a key has never been seen.
+
+    A negative answer is always right, a positive one only means "maybe" and has
+    to be confirmed with an exact lookup. If the filter was loaded from a file,
+    add() and add_many() also write the changed bytes back so the file stays
+    current, add_many() with one open and one header write for all its keys.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE):
+        capacity = max(1, capacity)
+        self.capacity = capacity
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+        self.path = None
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        # Double hashing gives k independent-enough positions from one digest
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def add(self, key):
+        self.add_many([key])
+
+    def add_many(self, keys):
+        changed = set()
+        bits = self.bits
+        for key in keys:
+            for pos in self._positions(key):
+                byte, mask = pos >> 3, 1 << (pos & 7)
+                if not bits[byte] & mask:
+                    bits[byte] |= mask
+                    changed.add(byte)
+            self.count += 1
+        if self.path is not None:
+            self._write_changes(sorted(changed))
+
+    def _write_changes(self, changed):
+        with open(self.path, "r+b") as f:
+            if changed:
+                # One write of the span is cheaper than a seek per byte once the
+                # changed bytes are close together
+                first, last = changed[0], changed[-1]
+                if (last - first) // len(changed) <= _SPAN_GAP:
+                    f.seek(_HEADER.size + first)
+                    f.write(self.bits[first:last + 1])
+                else:
+                    for byte in changed:
+                        f.seek(_HEADER.size + byte)
+                        f.write(self.bits[byte:byte + 1])
+            # The header goes last, a reader that sees the new count sees its bits
+            f.seek(0)
+            f.write(self._header())
+
+    def _header(self):
+        return _HEADER.pack(_MAGIC, self.num_bits, self.num_hashes, self.count)
+
+    @property
+    def overfull(self):
+        """True once more keys were added than the filter was sized for"""
+        return self.count > self.capacity
+
+    def save(self, path):
+        """Write the whole filter atomically and keep it attached to the file"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self._header())
+            f.write(self.bits)
+        os.replace(tmp_path, path)
+        self.path = path
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            magic, num_bits, num_hashes, count = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != _MAGIC:
+                raise ValueError(f"{path} is not a Bloom filter file")
+            bloom = cls.__new__(cls)
+            bloom.num_bits = num_bits
+            bloom.num_hashes = num_hashes
+            bloom.count = count
+            bloom.capacity = int(num_bits * (math.log(2) ** 2) / -math.log(DEFAULT_ERROR_RATE))
+            bloom.bits = bytearray(f.read())
+            bloom.path = path
+        if len(bloom.bits) != (num_bits + 7) // 8:
+            raise ValueError(f"{path} is truncated")
+        return bloom
+
+    @classmethod
+    def build(cls, keys, path, expected_count=0, error_rate=DEFAULT_ERROR_RATE):
+        """Stream keys into a new filter with room to grow and save it to path"""
+        bloom = cls(max(DEFAULT_CAPACITY, 2 * expected_count), error_rate)
+        bloom.add_many(keys)
+        bloom.save(path)
+        return bloom
+
+
+def file_stamp(path):
+    """(inode, size, modification time) of a filter file, from a stat without opening it.
+
+    Writes within the file system's timestamp resolution can leave it unchanged,
+    read_signature() is the exact check.
+    """
+    st = os.stat(path)
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def read_signature(path):
+    """(inode, key count) of a filter file, changes whenever another process adds a key"""
+    with open(path, "rb") as f:
+        header = f.read(_HEADER.size)
+        inode = os.fstat(f.fileno()).st_ino
+    return inode, _HEADER.unpack(header)[3]
@@ -0,0 +1,138 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+from transactions import (CAR_REGISTRATION, FIELD_KEYS, format_transaction, registration_number,
+                          validate_registration)
+from txid import TransactionIds
+
+# Registrations buffered before one group write to the pending pool
+BUFFER_SIZE = 1000
+# Rows between progress reports
+PROGRESS_EVERY = 10000
+CSV_FORMAT = "csv"
+JSONL_FORMAT = "jsonl"
+
+
+def _field_name(key):
+    # Columns can be the JSON keys or the transaction field names
+    key = key.strip()
+    return FIELD_KEYS.get(key.lower(), key)
+
+
+def read_rows(path, file_format=None):
+    """Stream (line number, fields dict or None, error) from a CSV or JSONL file.
+
+    A CSV file needs a header row. Columns and JSON keys can be the keys of
+    transactions.FIELD_KEYS or the field names, other columns are ignored.
+    """
+    if file_format is None:
+        file_format = CSV_FORMAT if path.lower().endswith(".csv") else JSONL_FORMAT
+    with open(path, "r", newline="" if file_format == CSV_FORMAT else None, encoding="utf-8") as f:
+        if file_format == CSV_FORMAT:
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, {_field_name(k): (v or "").strip() for k, v in row.items() if k}, None
+            return
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_no, None, f"invalid JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield line_no, None, "not a JSON object"
+                continue
+            yield line_no, {_field_name(k): str(v if v is not None else "").strip() for k, v in record.items()}, None
+
+
+def bulk_import(path, ledger=None, file_format=None, buffer_size=BUFFER_SIZE, rejects=None, progress=None):
+    """Validate the registrations in a file and add them to the pending pool.
+
+    Rows go through the Certificate Authority form's checks, so a value with a
+    line break or a field separator is rejected rather than written as extra
+    pool lines. Registration numbers already pending or in the chain are found
+    through the ledger's registration index. Accepted rows are buffered and written buffer_size at a
+    time with ledger.add_pending_many(), after which the index also rejects
+    later repeats in the file, so only the buffer is kept in memory.
+
+    rejects, if given, is a file object that gets "line: reason" for every
+    rejected row. progress, if given, is called every PROGRESS_EVERY rows with
+    (rows read, imported, rejected, rows per second). Returns a dict with
+    rows, imported, rejected, seconds and rate.
+    """
+    if ledger is None:
+        from ledger import open_ledger
+        ledger = open_ledger()
+    ids = TransactionIds(lease_size=buffer_size, ledger=ledger)
+    buffer = []
+    buffered = set()
+    rows = imported = rejected = 0
+    started = time.perf_counter()
+
+    def flush():
+        nonlocal imported, rejected
+        if buffer:
+            duplicates = set(ledger.add_pending_many([transaction for _, transaction in buffer]))
+            for line_no, transaction in buffer:
+                if transaction in duplicates:
+                    # Added by another writer of the ledger since the row was validated
+                    rejected += 1
+                    if rejects is not None:
+                        rejects.write(f"{line_no}: car registration number "
+                                      f"{registration_number(transaction)} already exists\n")
+            imported += len(buffer) - len(duplicates)
+            buffer.clear()
+            buffered.clear()
+
+    for line_no, fields, error in read_rows(path, file_format):
+        rows += 1
+        if error is None:
+            error = validate_registration(fields, ledger)
+        if error is None and fields[CAR_REGISTRATION] in buffered:
+            error = f"car registration number {fields[CAR_REGISTRATION]} is repeated in the file"
+        if error is None:
+            buffer.append((line_no, format_transaction(ids.next(), fields)))
+            buffered.add(fields[CAR_REGISTRATION])
+            if len(buffer) >= buffer_size:
+                flush()
+        else:
+            rejected += 1
+            if rejects is not None:
+                rejects.write(f"{line_no}: {error}\n")
+        if progress is not None and rows % PROGRESS_EVERY == 0:
+            progress(rows, imported + len(buffer), rejected, rows / (time.perf_counter() - started))
+    flush()
+    seconds = time.perf_counter() - started
+    return {"rows": rows, "imported": imported, "rejected": rejected, "seconds": seconds,
+            "rate": rows / seconds if seconds > 0 else 0.0}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add the vehicle registrations in a CSV or JSONL file to the pool")
+    parser.add_argument("path", help="CSV file with a header row, or JSONL file with one object per line")
+    parser.add_argument("--format", choices=[CSV_FORMAT, JSONL_FORMAT], default=None,
+                        help="file format, by default .csv files are CSV and anything else JSONL")
+    parser.add_argument("--buffer", type=int, default=BUFFER_SIZE, help="registrations per write to the pool")
+    parser.add_argument("--rejects", default=None, help="write the line number and reason of rejected rows here")
+    args = parser.parse_args()
+    if not os.path.exists(args.path):
+        sys.exit(f"{args.path} does not exist")
+
+    def report(rows, imported, rejected, rate):
+        print(f"{rows} rows read, {imported} imported, {rejected} rejected, {rate:,.1f} rows/sec")
+
+    rejects = open(args.rejects, "w") if args.rejects else None
+    try:
+        result = bulk_import(args.path, file_format=args.format, buffer_size=args.buffer,
+                             rejects=rejects, progress=report)
+    finally:
+        if rejects is not None:
+            rejects.close()
+    print(f"Imported {result['imported']} of {result['rows']} rows in {result['seconds']:.2f}s "
+          f"({result['rate']:,.1f} rows/sec), {result['rejected']} rejected")
@@ -0,0 +1,93 @@
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import sys
+import time
+
+from verify_chain import verify_chain
+
+CHECKPOINT_PATH = "chain.checkpoint"
+# Set CHECKPOINT_KEY to sign checkpoints with HMAC-SHA256 instead of a plain SHA-256 hash
+CHECKPOINT_KEY = os.environ.get("CHECKPOINT_KEY")
+
+
+def _seal(record, key=CHECKPOINT_KEY):
+    payload = json.dumps({k: v for k, v in record.items() if k != "seal"}, sort_keys=True).encode('utf-8')
+    if key:
+        return hmac.new(key.encode('utf-8'), payload, hashlib.sha256).hexdigest()
+    return hashlib.sha256(payload).hexdigest()
+
+
+def read_checkpoint(path=CHECKPOINT_PATH, key=CHECKPOINT_KEY):
+    """The checkpoint record, or None if there is none or its seal doesn't match"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            record = json.load(f)
+    except ValueError:
+        return None
+    if not isinstance(record, dict) or not hmac.compare_digest(str(record.get("seal")), _seal(record, key)):
+        return None
+    return record
+
+
+def write_checkpoint(height, tip_hash, path=CHECKPOINT_PATH, key=CHECKPOINT_KEY):
+    """Atomically replace the checkpoint with one for the chain verified up to `height`"""
+    record = {"height": height, "tip_hash": tip_hash, "verified_at": time.time()}
+    record["seal"] = _seal(record, key)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(record, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return record
+
+
+def verify_from_checkpoint(ledger=None, path=CHECKPOINT_PATH, workers=None, progress=None):
+    """Verify the blocks after the last checkpoint and move the checkpoint to the new tip.
+
+    The checkpoint holds the verified height and the hash of the block at
+    that height. If the block at the checkpoint height no longer has that
+    hash the chain was rewritten, and it is verified from genesis. Returns
+    the verify_chain() result, with resumed_from set to the first height
+    verified.
+    """
+    if ledger is None:
+        from ledger import open_ledger
+        ledger = open_ledger()
+    checkpoint = read_checkpoint(path)
+    start = 0
+    if checkpoint is not None and checkpoint["height"] < len(ledger) \
+            and ledger.get_block(checkpoint["height"])["hash"] == checkpoint["tip_hash"]:
+        start = checkpoint["height"] + 1
+    elif os.path.exists(path):
+        print(f"Checkpoint {path} is invalid or does not match the chain, verifying from genesis")
+    if start >= len(ledger):
+        # Nothing new since the checkpoint, don't start the worker processes
+        result = {"valid": True, "verified_height": start - 1, "blocks": 0, "seconds": 0.0,
+                  "rate": 0.0, "pow_skipped": 0}
+    else:
+        result = verify_chain(ledger, start, workers, progress)
+        if result["valid"] and result["blocks"]:
+            tip = ledger.get_block(result["verified_height"])
+            write_checkpoint(tip["height"], tip["hash"], path)
+    result["resumed_from"] = start
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verify the blocks added since the last checkpoint")
+    parser.add_argument("--workers", type=int, default=None, help="proof-of-work processes, one per core by default")
+    parser.add_argument("--reset", action="store_true", help="drop the checkpoint and verify the whole chain")
+    args = parser.parse_args()
+    if args.reset and os.path.exists(CHECKPOINT_PATH):
+        os.remove(CHECKPOINT_PATH)
+    result = verify_from_checkpoint(workers=args.workers)
+    print(f"Verified blocks {result['resumed_from']} to {result['verified_height']} in {result['seconds']:.2f}s")
+    if not result["valid"]:
+        print(f"Block {result['error_height']} is invalid: {result['error']}")
+        sys.exit(1)
@@ -1,9 +1,11 @@
 from tkinter import *
 from tkinter import ttk
 import json
+from ledger import open_ledger
+from txid import next_transaction_number
+from transactions import CAR_REGISTRATION, LICENSE_NUMBER, OWNER_NAME, PSEUDONYM, unsafe_fields
 
 class Form:
-	counter=0
 	def __init__(self, window, master):
 		window.title("VANET Blockchain Login System")
 		window.geometry('400x400')
@@ -35,14 +37,18 @@ class Form:
 		license_no_info=self.license_no.get()
 		owner_name_info=self.owner_name.get()
 		pseudonym_info=self.pseudonym.get()
-		Form.counter+=1
-		file = open("vehicle_information.txt", "a+")
-		file.write("Transaction No: "+str(Form.counter)+", ")
-		file.write("Car Registration Number: " + car_reg_no_info + ", ")
-		file.write("License Number: "+ license_no_info + ", ")
-		file.write("Car Owner Name: " + owner_name_info + ", ")
-		file.write("Pseudonym: " + pseudonym_info + "\n")
-		file.close()
+		if unsafe_fields({CAR_REGISTRATION: car_reg_no_info, LICENSE_NUMBER: license_no_info,
+			OWNER_NAME: owner_name_info, PSEUDONYM: pseudonym_info}):
+			print("FIELDS CAN'T CONTAIN LINE BREAKS, ', ' OR ': '")
+			return
+		transaction = ("Transaction No: "+str(next_transaction_number())+", "
+			"Car Registration Number: " + car_reg_no_info + ", "
+			"License Number: "+ license_no_info + ", "
+			"Car Owner Name: " + owner_name_info + ", "
+			"Pseudonym: " + pseudonym_info)
+		if not open_ledger().add_pending(transaction):
+			print("REGISTRATION ALREADY EXISTS")
+			return
 		print("SUBMITTED")
 		window.withdraw()
 		self.car_reg_no.set('')
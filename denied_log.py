@@ -0,0 +1,105 @@
+import os
+import struct
+
+from transactions import registration_number
+
+DENIED_PATH = "denied_transactions.txt"
+
+# One little-endian uint64 file offset per line, so line N is at byte N * 8
+_OFFSET = struct.Struct('<Q')
+
+
+class DeniedLog:
+    """denied_transactions.txt with a line-offset index for paging.
+
+    The text file keeps one denied transaction per line. The index file
+    denied_transactions.txt.idx holds the byte offset of every line, so a page
+    starting at any line is read with two seeks. Each line is written before
+    its index entry, so readers only see complete lines and never write the
+    index. Opening or appending catches the index up with a line left
+    unindexed by a crash, and writers do that under the ledger's write lock.
+    """
+
+    def __init__(self, path=DENIED_PATH, index_path=None):
+        self.path = path
+        self.index_path = index_path or path + ".idx"
+        self._sync_index()
+
+    def _count(self):
+        if not os.path.exists(self.index_path):
+            return 0
+        return os.path.getsize(self.index_path) // _OFFSET.size
+
+    def _offset(self, line_no):
+        with open(self.index_path, "rb") as idx:
+            idx.seek(line_no * _OFFSET.size)
+            return _OFFSET.unpack(idx.read(_OFFSET.size))[0]
+
+    def _sync_index(self):
+        """Index lines appended since the last sync, or rebuild if the file was rewritten"""
+        if not os.path.exists(self.path):
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path)
+            return
+        count = self._count()
+        start = 0
+        if count:
+            offset = self._offset(count - 1)
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                line = f.readline()
+            if offset >= os.path.getsize(self.path) or not line.endswith(b"\n"):
+                count = 0
+            else:
+                start = offset + len(line)
+        with open(self.index_path, "r+b" if os.path.exists(self.index_path) else "wb") as idx:
+            idx.truncate(count * _OFFSET.size)
+            idx.seek(0, os.SEEK_END)
+            with open(self.path, "rb") as f:
+                f.seek(start)
+                offset = start
+                for line in iter(f.readline, b""):
+                    if not line.endswith(b"\n"):
+                        # Still being written, it is indexed on the next sync
+                        break
+                    if line.strip():
+                        idx.write(_OFFSET.pack(offset))
+                    offset += len(line)
+
+    def __len__(self):
+        return self._count()
+
+    def append(self, transaction):
+        self._sync_index()
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            f.write((transaction.rstrip("\n") + "\n").encode('utf-8'))
+        with open(self.index_path, "ab") as idx:
+            idx.write(_OFFSET.pack(offset))
+
+    def page(self, start, count):
+        """Up to `count` denied transactions starting at line `start`"""
+        end = min(start + count, self._count())
+        if start >= end:
+            return []
+        lines = []
+        with open(self.path, "rb") as f:
+            f.seek(self._offset(start))
+            while len(lines) < end - start:
+                line = f.readline()
+                if not line:
+                    break
+                if line.strip():
+                    lines.append(line.decode('utf-8').rstrip("\r\n"))
+        return lines
+
+    def search(self, query):
+        """Stream the denied transactions whose registration number starts with query, ignoring case"""
+        query = query.strip().upper()
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r") as f:
+            for line in f:
+                reg_no = registration_number(line)
+                if reg_no and reg_no.upper().startswith(query):
+                    yield line.rstrip("\n")
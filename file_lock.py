@@ -0,0 +1,96 @@
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no flock, msvcrt locks a byte range instead
+    fcntl = None
+    import msvcrt
+
+# Lock file whose holder is the one process allowed to write the ledger files
+LEDGER_LOCK_PATH = "ledger.lock"
+# Seconds a SQLite connection waits for another process's write to finish
+SQLITE_BUSY_TIMEOUT = 30.0
+
+# Write locks of this process, by lock file
+_write_locks = {}
+
+
+@contextmanager
+def locked(path, shared=False):
+    """Hold an advisory lock on the file at `path`, created if needed, for the with block.
+
+    Shared locks can be held by many processes at once, an exclusive lock by
+    one. Windows only has exclusive locks.
+    """
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class WriteLock:
+    """Exclusive lock that lets one process at a time write a data directory.
+
+    A thread that holds it can take it again, so a ledger method that takes it
+    can call others that do too. Readers never take it, they only read
+    records that are complete. `holds` counts the times this process took the
+    lock file, so a cache can tell a new hold from the one it last checked in.
+    """
+
+    def __init__(self, path=LEDGER_LOCK_PATH):
+        self.path = path
+        self._mutex = threading.RLock()
+        self._depth = 0
+        self._held = None
+        self._owner = None
+        self.holds = 0
+
+    def __enter__(self):
+        self._mutex.acquire()
+        if self._depth == 0:
+            held = locked(self.path)
+            try:
+                held.__enter__()
+            except BaseException:
+                self._mutex.release()
+                raise
+            self._held = held
+            self._owner = threading.get_ident()
+            self.holds += 1
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            self._owner = None
+            held, self._held = self._held, None
+            held.__exit__(None, None, None)
+        self._mutex.release()
+
+    def held(self):
+        """True if the calling thread holds the lock"""
+        return self._owner == threading.get_ident()
+
+
+def write_lock(path=LEDGER_LOCK_PATH):
+    """This process's WriteLock for `path`.
+
+    flock locks belong to an open file, so two WriteLocks on one path in the
+    same process would wait for each other forever.
+    """
+    if path not in _write_locks:
+        _write_locks[path] = WriteLock(path)
+    return _write_locks[path]
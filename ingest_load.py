@@ -0,0 +1,89 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from ingest_server import INGEST_HOST, INGEST_PORT
+
+
+def sample_submission(n, run_id):
+    """A registration with a registration number unique to this run"""
+    return {"car_registration": f"LOAD-{run_id}-{n:08d}", "license_number": f"L{n:08d}",
+            "owner_name": f"Owner {n}", "pseudonym": f"{n:064x}", "vehicle_type": "Car",
+            "manufacture_year": "2020"}
+
+
+async def _post(reader, writer, host, payload):
+    body = json.dumps(payload).encode('utf-8')
+    writer.write(f"POST /transactions HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode('latin-1').partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def _client(host, port, unix_path, numbers, batch_size, run_id, latencies, counts):
+    if unix_path:
+        reader, writer = await asyncio.open_unix_connection(unix_path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while numbers:
+            batch = [sample_submission(numbers.pop(), run_id) for _ in range(min(batch_size, len(numbers)))]
+            started = time.perf_counter()
+            status, response = await _post(reader, writer, host, batch if batch_size > 1 else batch[0])
+            latencies.append(time.perf_counter() - started)
+            results = response["results"] if batch_size > 1 else [response]
+            accepted = sum(1 for result in results if "transaction_no" in result) if status == 200 else 0
+            counts["accepted"] += accepted
+            counts["rejected"] += len(batch) - accepted
+    finally:
+        writer.close()
+
+
+async def run_load(total, connections, batch_size, host=INGEST_HOST, port=INGEST_PORT, unix_path=None):
+    """Submit `total` registrations over `connections` keep-alive connections.
+
+    Returns a dict with accepted, rejected, seconds, rate (accepted submissions
+    per second) and the median and 99th percentile request latency in ms.
+    """
+    run_id = os.urandom(4).hex()
+    numbers = list(range(total))
+    latencies = []
+    counts = {"accepted": 0, "rejected": 0}
+    started = time.perf_counter()
+    await asyncio.gather(*(_client(host, port, unix_path, numbers, batch_size, run_id, latencies, counts)
+                           for _ in range(connections)))
+    seconds = time.perf_counter() - started
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+
+    return dict(counts, seconds=seconds, rate=counts["accepted"] / seconds if seconds > 0 else 0.0,
+                p50_ms=percentile(0.5), p99_ms=percentile(0.99))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure sustained submissions/sec of the ingestion server")
+    parser.add_argument("--total", type=int, default=20000, help="registrations to submit")
+    parser.add_argument("--connections", type=int, default=16, help="concurrent client connections")
+    parser.add_argument("--batch-size", type=int, default=1, help="registrations per request")
+    parser.add_argument("--host", default=INGEST_HOST, help="server address")
+    parser.add_argument("--port", type=int, default=INGEST_PORT, help="server TCP port")
+    parser.add_argument("--unix", default=None, help="connect to this Unix socket instead of TCP")
+    args = parser.parse_args()
+
+    result = asyncio.run(run_load(args.total, args.connections, args.batch_size, args.host, args.port, args.unix))
+    print(f"{result['accepted']} accepted, {result['rejected']} rejected in {result['seconds']:.2f}s")
+    print(f"{result['rate']:,.1f} submissions/sec, latency p50 {result['p50_ms']:.1f} ms, "
+          f"p99 {result['p99_ms']:.1f} ms")
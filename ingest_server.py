@@ -0,0 +1,260 @@
+import argparse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from transactions import (CAR_REGISTRATION, FIELD_KEYS, format_transaction, transaction_number,
+                          validate_registration)
+from txid import TransactionIds
+
+INGEST_HOST = "127.0.0.1"
+INGEST_PORT = 8765
+# Most submissions written to the pending pool by one group commit
+GROUP_MAX = 1000
+# Largest request body accepted, in bytes
+MAX_BODY = 16 * 1024 * 1024
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large"}
+
+
+class HttpError(Exception):
+    """A request that can't be read, answered with `status` and the connection closed"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class IngestService:
+    """Validates registrations and group-commits them to the pending pool.
+
+    Submissions are checked as they arrive, on the event loop, then queued. A
+    writer task takes everything queued so far and hands it to the writer
+    thread, which numbers the group and adds it to the pool with one
+    ledger.add_pending_many() call, so under load many submissions share one
+    write and fsync. The writer thread opens the ledger and is the only thread
+    that uses it, so waiting for the ledger lock held by a miner or an import,
+    or for the fsync, never stalls the event loop. Registrations waiting in
+    the queue are reserved, so a duplicate can't slip in before they are
+    written, and add_pending_many() rejects the ones already in the ledger.
+
+    ledger_factory, if given, is called on the writer thread to open the
+    ledger, by default it is ledger.open_ledger().
+    """
+
+    def __init__(self, ledger_factory=None, group_max=GROUP_MAX):
+        self.ledger_factory = ledger_factory
+        self.group_max = group_max
+        self.ledger = None
+        self.ids = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-writer")
+        self.last_tx_no = None
+        self.reserved = set()
+        self.queue = None
+        self.writer = None
+        self.committed = 0
+        self.groups = 0
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.writer = asyncio.get_running_loop().create_task(self._write_groups())
+
+    async def stop(self):
+        await self.queue.join()
+        self.writer.cancel()
+        self.executor.shutdown()
+
+    def _write(self, group):
+        """Number a group of registrations and add it to the pool, runs on the writer thread.
+
+        Returns (transaction number, True if it was a duplicate) for each one.
+        """
+        if self.ledger is None:
+            if self.ledger_factory is None:
+                from ledger import open_ledger
+                self.ledger = open_ledger()
+            else:
+                self.ledger = self.ledger_factory()
+            # Numbers are reserved a group at a time from the shared sequence
+            self.ids = TransactionIds(lease_size=self.group_max, ledger=self.ledger)
+        transactions = [format_transaction(self.ids.next(), fields) for fields in group]
+        duplicates = set(self.ledger.add_pending_many(transactions))
+        return [(transaction_number(t), t in duplicates) for t in transactions]
+
+    async def _write_groups(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            group = [await self.queue.get()]
+            while len(group) < self.group_max and not self.queue.empty():
+                group.append(self.queue.get_nowait())
+            try:
+                written = await loop.run_in_executor(self.executor, self._write, [fields for fields, _ in group])
+            except Exception as e:
+                for _, future in group:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                self.groups += 1
+                for (fields, future), (tx_no, duplicate) in zip(group, written):
+                    if not duplicate:
+                        self.committed += 1
+                        self.last_tx_no = tx_no
+                    if future.done():
+                        # Cancelled when its client went away, the write stands
+                        continue
+                    if duplicate:
+                        # Already pending or in the chain, possibly added by another writer
+                        future.set_exception(ValueError(f"car registration number "
+                                                        f"{fields[CAR_REGISTRATION]} already exists"))
+                    else:
+                        future.set_result(tx_no)
+            finally:
+                for fields, _ in group:
+                    self.reserved.discard(fields[CAR_REGISTRATION])
+                    self.queue.task_done()
+
+    def _admit(self, submission):
+        """Check and queue one submission, returns (future, None) or (None, error)"""
+        if not isinstance(submission, dict):
+            return None, "a submission must be a JSON object"
+        fields = {name: str(submission.get(key) or "").strip() for key, name in FIELD_KEYS.items()}
+        # The ledger is only used on the writer thread, which finds registrations already in it
+        error = validate_registration(fields)
+        if error is None and fields[CAR_REGISTRATION] in self.reserved:
+            error = f"car registration number {fields[CAR_REGISTRATION]} already exists"
+        if error is not None:
+            return None, error
+        self.reserved.add(fields[CAR_REGISTRATION])
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((fields, future))
+        return future, None
+
+    async def submit(self, submissions):
+        """Submit a batch, one result dict per submission with transaction_no or error"""
+        admitted = [self._admit(submission) for submission in submissions]
+        results = []
+        for future, error in admitted:
+            if future is None:
+                results.append({"error": error})
+                continue
+            try:
+                results.append({"transaction_no": await future})
+            except ValueError as e:
+                results.append({"error": str(e)})
+            except Exception as e:
+                results.append({"error": f"could not save transaction: {e}"})
+        return results
+
+
+async def _read_request(reader):
+    """(method, path, headers, body) of the next request, or None at end of stream.
+
+    Raises HttpError for a request that can't be read.
+    """
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    try:
+        method, path, _ = line.decode('latin-1').split(" ", 2)
+    except ValueError:
+        raise HttpError(400, "malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode('latin-1').partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HttpError(400, "invalid Content-Length")
+    if length < 0:
+        raise HttpError(400, "invalid Content-Length")
+    if length > MAX_BODY:
+        raise HttpError(413, "request too large")
+    body = await reader.readexactly(length) if length else b""
+    return method, path, headers, body
+
+
+def _response(status, payload, keep_alive=True):
+    body = json.dumps(payload).encode('utf-8')
+    head = (f"HTTP/1.1 {status} {_REASONS[status]}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode('latin-1') + body
+
+
+async def _handle(service, method, path, body):
+    if path == "/stats" and method == "GET":
+        return 200, {"committed": service.committed, "groups": service.groups,
+                     "queued": service.queue.qsize(), "last_transaction_no": service.last_tx_no}
+    if path != "/transactions":
+        return 404, {"error": f"unknown path {path}"}
+    if method != "POST":
+        return 405, {"error": "use POST"}
+    try:
+        payload = json.loads(body or b"null")
+    except ValueError as e:
+        return 400, {"error": f"invalid JSON: {e}"}
+    if isinstance(payload, list):
+        return 200, {"results": await service.submit(payload)}
+    return 200, (await service.submit([payload]))[0]
+
+
+def make_handler(service):
+    """asyncio stream handler speaking HTTP/1.1 with keep-alive"""
+    async def handle_connection(reader, writer):
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except HttpError as e:
+                    writer.write(_response(e.status, {"error": e.message}, keep_alive=False))
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                status, payload = await _handle(service, method, path, body)
+                writer.write(_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+    return handle_connection
+
+
+async def serve(host=INGEST_HOST, port=INGEST_PORT, unix_path=None, ledger_factory=None, group_max=GROUP_MAX):
+    """Run the ingestion service on a TCP port, or on a Unix socket if unix_path is given"""
+    service = IngestService(ledger_factory, group_max)
+    service.start()
+    handler = make_handler(service)
+    if unix_path:
+        server = await asyncio.start_unix_server(handler, unix_path)
+        print(f"Accepting registrations on unix:{unix_path}")
+    else:
+        server = await asyncio.start_server(handler, host, port)
+        print(f"Accepting registrations on http://{host}:{port}/transactions")
+    async with server:
+        try:
+            await server.serve_forever()
+        finally:
+            await service.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Accept vehicle registrations as JSON over HTTP")
+    parser.add_argument("--host", default=INGEST_HOST, help="address to listen on")
+    parser.add_argument("--port", type=int, default=INGEST_PORT, help="TCP port to listen on")
+    parser.add_argument("--unix", default=None, help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--group-max", type=int, default=GROUP_MAX, help="most submissions per pool write")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, group_max=args.group_max))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,130 @@
+import json
+import os
+import zlib
+
+from block_store import open_block_store
+from mempool import Mempool
+
+JOURNAL_PATH = "commit.journal"
+# Commits kept in the journal before the data files are synced and it is cleared
+CHECKPOINT_INTERVAL = 32
+
+
+def _fsync_directory(path):
+    if os.path.exists(path):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class CommitJournal:
+    """Write-ahead journal that makes a mined block and its mempool removals one commit.
+
+    Each commit is written to the journal as one checksummed line and synced
+    with a single fsync before the block store and mempool are touched.
+    Applying a record twice is harmless, so the data files are only synced
+    every CHECKPOINT_INTERVAL commits. Until then the journal can replay them.
+    On startup recover() replays complete records and drops a torn last one,
+    whose commit never reached the data files.
+    """
+
+    def __init__(self, path=JOURNAL_PATH, checkpoint_interval=CHECKPOINT_INTERVAL):
+        self.path = path
+        self.checkpoint_interval = checkpoint_interval
+
+    def _encode(self, block, transactions):
+        payload = json.dumps({"block": block, "remove": list(transactions)})
+        return f"{zlib.crc32(payload.encode('utf-8')):08x} {payload}\n"
+
+    def records(self):
+        """Complete records in the journal, stops at the first torn or corrupt one"""
+        records = []
+        if not os.path.exists(self.path):
+            return records
+        with open(self.path, "r") as f:
+            for line in f:
+                checksum, _, payload = line.rstrip("\n").partition(" ")
+                if not line.endswith("\n") or checksum != f"{zlib.crc32(payload.encode('utf-8')):08x}":
+                    break
+                records.append(json.loads(payload))
+        return records
+
+    def _append(self, entries):
+        created = not os.path.exists(self.path)
+        with open(self.path, "a") as f:
+            f.write("".join(self._encode(block, transactions) for block, transactions in entries))
+            f.flush()
+            # One fsync for the whole group of commits
+            os.fsync(f.fileno())
+        if created:
+            _fsync_directory(os.path.dirname(os.path.abspath(self.path)))
+
+    def _apply(self, store, mempool, block, transactions):
+        height = block["height"]
+        if height < len(store):
+            if store.get(height)["hash"] != block["hash"]:
+                raise ValueError(f"Block {height} in the store differs from the journal")
+        else:
+            store.append(block)
+        mempool.remove_many(transactions)
+
+    def commit(self, store, mempool, entries):
+        """Durably commit [(block, transactions to remove from the pool), ...]"""
+        height = len(store)
+        tip = store.tip()
+        prev_hash = tip["hash"] if tip else ""
+        for block, _ in entries:
+            # Refuse before journaling, a record that can't be applied would be replayed forever
+            if block["height"] != height:
+                raise ValueError(f"Block {block['height']} does not follow block {height - 1}")
+            if block["prev_hash"] != prev_hash:
+                raise ValueError(f"Block {block['height']} does not link to block {height - 1} {prev_hash!r}")
+            height += 1
+            prev_hash = block["hash"]
+        self._append(entries)
+        for block, transactions in entries:
+            self._apply(store, mempool, block, transactions)
+        if len(self.records()) >= self.checkpoint_interval:
+            self.checkpoint(store, mempool)
+
+    def checkpoint(self, store, mempool):
+        """Sync the block store and mempool, after which the journal is not needed"""
+        store.sync()
+        mempool.sync()
+        with open(self.path, "w"):
+            pass
+
+    def recover(self, store, mempool):
+        """Replay the journal after a crash, returns the number of records replayed"""
+        records = self.records()
+        for record in records:
+            try:
+                self._apply(store, mempool, record["block"], record["remove"])
+            except ValueError as e:
+                print(f"Skipping journal record for block {record['block']['height']}: {e}")
+        if os.path.exists(self.path):
+            self.checkpoint(store, mempool)
+        return len(records)
+
+
+def commit_block(block, transactions, store=None, mempool=None, journal=None):
+    """Append a mined block and remove its transactions from the pool as one commit"""
+    if store is None:
+        store = open_block_store()
+    if mempool is None:
+        mempool = Mempool()
+    (journal or CommitJournal()).commit(store, mempool, [(block, transactions)])
+
+
+def recover_journal(store=None, mempool=None, path=JOURNAL_PATH):
+    """Finish or roll back commits interrupted by a crash, call before using the chain"""
+    if store is None:
+        store = open_block_store()
+    if mempool is None:
+        mempool = Mempool()
+    replayed = CommitJournal(path).recover(store, mempool)
+    if replayed:
+        print(f"Replayed {replayed} commits from {path}")
+    return replayed
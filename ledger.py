@@ -0,0 +1,458 @@
+import argparse
+import os
+import sqlite3
+from itertools import islice
+
+from block_store import BLOCKS_PATH, LEGACY_BLOCKS_PATH, open_block_store
+from denied_log import DENIED_PATH, DeniedLog
+from file_lock import SQLITE_BUSY_TIMEOUT, write_lock
+from journal import CommitJournal, recover_journal
+from mempool import POOL_PATH, Mempool
+from merkle import merkle_proof
+from reg_index import CHAIN, PENDING, open_registration_index
+from search_index import DEFAULT_LIMIT, open_search_index, search_transactions
+from transactions import (CAR_REGISTRATION, LICENSE_NUMBER, PSEUDONYM, parse_transaction,
+                          registration_number, transaction_number)
+
+LEDGER_DB_PATH = "ledger.db"
+FILE_BACKEND = "file"
+SQLITE_BACKEND = "sqlite"
+# Storage backend of the applications, set LEDGER_BACKEND=sqlite to use ledger.db
+LEDGER_BACKEND = os.environ.get("LEDGER_BACKEND", FILE_BACKEND)
+
+# Ledgers opened by this process, by backend
+_open_ledgers = {}
+
+
+class FileLedger:
+    """The flat-file storage: block store, mempool, journal, registration index and denied file.
+
+    FileLedger and SqliteLedger have the same methods, so the windows don't
+    need to know which backend they are using.
+
+    Several processes can use one data directory. Every write, and the repair
+    of the files when the ledger is opened, holds the exclusive lock on
+    ledger.lock. Reads take no lock. The files are only appended to, or
+    replaced in one step, and each record is written before the index entry
+    that makes it visible, so a reader only ever sees complete records.
+    """
+
+    def __init__(self, denied_path=DENIED_PATH):
+        self.lock = write_lock()
+        with self.lock:
+            self.store = open_block_store()
+            self.mempool = Mempool()
+            self.journal = CommitJournal()
+            self.denied_log = DeniedLog(denied_path)
+            recover_journal(self.store, self.mempool)
+            self.index = open_registration_index(store=self.store, mempool=self.mempool, rebuild_bloom=True)
+            self.search_index = open_search_index(self)
+
+    def close(self):
+        self.index.close()
+        self.search_index.close()
+
+    def __len__(self):
+        return len(self.store)
+
+    def tip(self):
+        return self.store.tip()
+
+    def get_block(self, height):
+        return self.store.get(height)
+
+    def iter_blocks(self, start=0):
+        return self.store.iter_blocks(start)
+
+    def tail(self, count):
+        return self.store.tail(count)
+
+    def snapshot(self):
+        return LedgerSnapshot(self)
+
+    def commit_block(self, block, transactions):
+        """Append a block and remove its transactions from the pending pool in one commit"""
+        with self.lock:
+            # Another miner may have mined some of the same transactions since they were checked
+            for reg_no in filter(None, map(registration_number, block["transactions"])):
+                if self.index.in_chain(reg_no):
+                    raise ValueError(f"Registration {reg_no} is already in the blockchain")
+            self.journal.commit(self.store, self.mempool, [(block, transactions)])
+            self.index.add_block(block)
+        self.search_index.sync(self)
+
+    def pending(self):
+        return self.mempool.transactions()
+
+    def add_pending(self, transaction):
+        """Add a transaction to the pool, returns False if its registration already exists"""
+        return not self.add_pending_many([transaction])
+
+    def add_pending_many(self, transactions):
+        """Add a group of transactions to the pool with one durable write.
+
+        The registration numbers are checked again under the write lock, since
+        another process may have added them after the caller's check. Returns
+        the transactions left out as duplicates.
+        """
+        with self.lock:
+            added, duplicates, seen = [], [], set()
+            for transaction in transactions:
+                reg_no = registration_number(transaction)
+                if reg_no and (reg_no in seen or self.index.lookup(reg_no) is not None):
+                    duplicates.append(transaction)
+                else:
+                    seen.add(reg_no)
+                    added.append(transaction)
+            if added:
+                self.mempool.add_many(added, sync=True)
+                self.index.add_pending_many([(registration_number(t), transaction_number(t)) for t in added])
+        return duplicates
+
+    def deny(self, transaction):
+        """Move a pending transaction to the denied transactions"""
+        with self.lock:
+            self.denied_log.append(transaction)
+            self.mempool.remove(transaction)
+            car_reg = registration_number(transaction)
+            if car_reg:
+                # A denied registration may be submitted again
+                self.index.remove_pending(car_reg)
+
+    def denied_count(self):
+        return len(self.denied_log)
+
+    def denied_page(self, start, count):
+        """Up to `count` denied transactions from position `start`, oldest first"""
+        return self.denied_log.page(start, count)
+
+    def search_denied(self, query):
+        """Stream denied transactions whose registration number starts with query"""
+        return self.denied_log.search(query)
+
+    def lookup(self, reg_no):
+        return self.index.lookup(reg_no)
+
+    def in_chain(self, reg_no):
+        return self.index.in_chain(reg_no)
+
+    def inclusion_proof(self, reg_no):
+        return self.index.inclusion_proof(reg_no, self.store)
+
+    def registration_heights(self, reg_no):
+        """Heights of every block in the chain holding reg_no, found through the search index"""
+        return [height for height in self.search_index.registration_heights(reg_no)
+                if reg_no in map(registration_number, self.store.get(height)["transactions"])]
+
+    def search(self, query, field=None, limit=DEFAULT_LIMIT):
+        """Transactions in the chain matching the query, see search_index.SearchIndex.search"""
+        # Pick up blocks mined by other processes
+        self.search_index.sync(self)
+        return search_transactions(self, self.search_index, query, field, limit)
+
+
+class SqliteLedger:
+    """All ledger data in one SQLite database in WAL mode.
+
+    Blocks, chain transactions, pending and denied transactions are tables,
+    with indexes on block height, registration number, license number and
+    pseudonym. A block and the removal of its transactions from the pending
+    table commit in one SQL transaction. The statements are constant strings,
+    so sqlite3 prepares each of them once and reuses it.
+
+    Writes that check the data first start with BEGIN IMMEDIATE, which takes
+    SQLite's write lock before the check, so writers in other processes wait
+    their turn. In WAL mode readers are never blocked by a writer.
+    """
+
+    def __init__(self, path=LEDGER_DB_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # In WAL mode a commit only needs to fsync at checkpoints
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS blocks (height INTEGER PRIMARY KEY, prev_hash TEXT, "
+                              "merkle_root TEXT, timestamp REAL, difficulty REAL, algorithm TEXT, "
+                              "nonce INTEGER, hash TEXT NOT NULL, legacy INTEGER NOT NULL DEFAULT 0)")
+            for table, key in (("transactions", "height INTEGER NOT NULL, position INTEGER NOT NULL"),
+                               ("pending", "id INTEGER PRIMARY KEY"),
+                               ("denied", "id INTEGER PRIMARY KEY")):
+                self.conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({key}, tx_no INTEGER, reg_no TEXT, "
+                                  f"license TEXT, pseudonym TEXT, text TEXT NOT NULL)")
+                for column in ("reg_no", "license", "pseudonym"):
+                    self.conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_{column} ON {table} ({column})")
+            self.conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS transactions_height "
+                              "ON transactions (height, position)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS pending_tx_no ON pending (tx_no)")
+        # The postings live in the same database
+        self.search_index = open_search_index(self, path)
+
+    def close(self):
+        self.conn.close()
+        self.search_index.close()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COALESCE(MAX(height) + 1, 0) FROM blocks").fetchone()[0]
+
+    def tip(self):
+        row = self.conn.execute("SELECT height, hash FROM blocks ORDER BY height DESC LIMIT 1").fetchone()
+        return None if row is None else {"height": row[0], "hash": row[1]}
+
+    def _block_record(self, row):
+        height, prev_hash, root, timestamp, difficulty, algorithm, nonce, block_hash, legacy = row
+        transactions = [text for (text,) in self.conn.execute(
+            "SELECT text FROM transactions WHERE height = ? ORDER BY position", (height,))]
+        # Same field order as block_store.make_block
+        record = {"height": height, "prev_hash": prev_hash, "merkle_root": root, "timestamp": timestamp,
+                  "difficulty": difficulty, "algorithm": algorithm, "nonce": nonce, "hash": block_hash,
+                  "transactions": transactions}
+        if legacy:
+            record["legacy"] = True
+        return record
+
+    def get_block(self, height):
+        if height < 0:
+            height += len(self)
+        row = self.conn.execute("SELECT * FROM blocks WHERE height = ?", (height,)).fetchone()
+        if row is None:
+            raise IndexError(f"No block at height {height}")
+        return self._block_record(row)
+
+    def iter_blocks(self, start=0):
+        rows = self.conn.execute("SELECT * FROM blocks WHERE height >= ? ORDER BY height", (start,))
+        for row in rows:
+            yield self._block_record(row)
+
+    def tail(self, count):
+        rows = self.conn.execute("SELECT * FROM blocks ORDER BY height DESC LIMIT ?", (count,)).fetchall()
+        return [self._block_record(row) for row in reversed(rows)]
+
+    @staticmethod
+    def _columns(transaction):
+        fields = parse_transaction(transaction)
+        return (transaction_number(transaction), fields.get(CAR_REGISTRATION), fields.get(LICENSE_NUMBER),
+                fields.get(PSEUDONYM), transaction)
+
+    def snapshot(self):
+        return LedgerSnapshot(self)
+
+    def _in_chain(self, reg_no):
+        row = self.conn.execute("SELECT 1 FROM transactions WHERE reg_no = ? LIMIT 1", (reg_no,)).fetchone()
+        return row is not None
+
+    def commit_block(self, block, transactions):
+        """Append a block and remove its transactions from the pending pool in one commit"""
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            tip = self.tip()
+            height, prev_hash = (tip["height"] + 1, tip["hash"]) if tip else (0, "")
+            if block["height"] != height:
+                raise ValueError(f"Block {block['height']} does not follow block {height - 1}")
+            if block["prev_hash"] != prev_hash:
+                raise ValueError(f"Block {block['height']} does not link to block {height - 1} {prev_hash!r}")
+            # Another miner may have mined some of the same transactions since they were checked
+            for reg_no in filter(None, map(registration_number, block["transactions"])):
+                if self._in_chain(reg_no):
+                    raise ValueError(f"Registration {reg_no} is already in the blockchain")
+            self._insert_block(block)
+            self.conn.executemany("DELETE FROM pending WHERE tx_no IS ? AND text = ?",
+                                  [(transaction_number(t), t) for t in transactions])
+        self.search_index.sync(self)
+
+    def _insert_block(self, block):
+        self.conn.execute("INSERT INTO blocks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                          (block["height"], block["prev_hash"], block.get("merkle_root"), block.get("timestamp"),
+                           block.get("difficulty"), block.get("algorithm"), block["nonce"], block["hash"],
+                           int(bool(block.get("legacy")))))
+        self.conn.executemany("INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                              [(block["height"], position) + self._columns(t)
+                               for position, t in enumerate(block["transactions"])])
+
+    def pending(self):
+        return [text for (text,) in self.conn.execute("SELECT text FROM pending ORDER BY id")]
+
+    def add_pending(self, transaction):
+        """Add a transaction to the pool, returns False if its registration already exists"""
+        return not self.add_pending_many([transaction])
+
+    def add_pending_many(self, transactions):
+        """Add a group of transactions to the pool in one SQL transaction.
+
+        The registration numbers are checked again inside the transaction, since
+        another process may have added them after the caller's check. Returns
+        the transactions left out as duplicates.
+        """
+        added, duplicates, seen = [], [], set()
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            for transaction in transactions:
+                columns = self._columns(transaction)
+                reg_no = columns[1]
+                if reg_no and (reg_no in seen or self.lookup(reg_no) is not None):
+                    duplicates.append(transaction)
+                else:
+                    seen.add(reg_no)
+                    added.append(columns)
+            self.conn.executemany("INSERT INTO pending (tx_no, reg_no, license, pseudonym, text) "
+                                  "VALUES (?, ?, ?, ?, ?)", added)
+        return duplicates
+
+    def deny(self, transaction):
+        """Move a pending transaction to the denied transactions"""
+        with self.conn:
+            self.conn.execute("INSERT INTO denied (tx_no, reg_no, license, pseudonym, text) "
+                              "VALUES (?, ?, ?, ?, ?)", self._columns(transaction))
+            self.conn.execute("DELETE FROM pending WHERE tx_no IS ? AND text = ?",
+                              (transaction_number(transaction), transaction))
+
+    def denied_count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM denied").fetchone()[0]
+
+    def denied_page(self, start, count):
+        """Up to `count` denied transactions from position `start`, oldest first"""
+        # Denied rows are never deleted, so ids run from 1 without gaps
+        return [text for (text,) in self.conn.execute(
+            "SELECT text FROM denied WHERE id > ? ORDER BY id LIMIT ?", (start, count))]
+
+    def search_denied(self, query):
+        """Stream denied transactions whose registration number starts with query"""
+        pattern = query.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        for (text,) in self.conn.execute("SELECT text FROM denied WHERE reg_no LIKE ? ESCAPE '\\' ORDER BY id",
+                                         (pattern,)):
+            yield text
+
+    def lookup(self, reg_no):
+        row = self.conn.execute("SELECT height FROM transactions WHERE reg_no = ? LIMIT 1", (reg_no,)).fetchone()
+        if row is not None:
+            return CHAIN, row[0]
+        row = self.conn.execute("SELECT 1 FROM pending WHERE reg_no = ? LIMIT 1", (reg_no,)).fetchone()
+        return None if row is None else (PENDING, None)
+
+    def in_chain(self, reg_no):
+        found = self.lookup(reg_no)
+        return found is not None and found[0] == CHAIN
+
+    def registration_heights(self, reg_no):
+        """Heights of every block in the chain holding reg_no"""
+        return [row[0] for row in self.conn.execute(
+            "SELECT DISTINCT height FROM transactions WHERE reg_no = ? ORDER BY height", (reg_no,))]
+
+    def inclusion_proof(self, reg_no):
+        row = self.conn.execute("SELECT height, position FROM transactions WHERE reg_no = ? LIMIT 1",
+                                (reg_no,)).fetchone()
+        if row is None:
+            return None
+        block = self.get_block(row[0])
+        return {
+            "registration": reg_no,
+            "height": block["height"],
+            "block_hash": block["hash"],
+            "merkle_root": block["merkle_root"],
+            "transaction": block["transactions"][row[1]],
+            "position": row[1],
+            "proof": merkle_proof(block["transactions"], row[1]),
+        }
+
+    def search(self, query, field=None, limit=DEFAULT_LIMIT):
+        """Transactions in the chain matching the query, see search_index.SearchIndex.search"""
+        # Pick up blocks mined by other processes
+        self.search_index.sync(self)
+        return search_transactions(self, self.search_index, query, field, limit)
+
+    def import_text_files(self, pending_path=POOL_PATH, denied_path=DENIED_PATH):
+        """One-shot import of the flat-file ledger into an empty database.
+
+        Reads the block store (migrating an old blocks.txt first), the live
+        transactions of the pending pool and denied_transactions.txt. Returns
+        (blocks, pending, denied) counts.
+        """
+        if len(self):
+            raise ValueError(f"{self.path} already contains blocks")
+        with write_lock():
+            store = open_block_store()
+            pool = Mempool(pending_path)
+            recover_journal(store, pool)
+        denied = []
+        if os.path.exists(denied_path):
+            with open(denied_path, "r") as f:
+                denied = [line.rstrip("\n") for line in f if line.strip()]
+        pending = pool.transactions()
+        with self.conn:
+            blocks = 0
+            for block in store:
+                self._insert_block(block)
+                blocks += 1
+            self.conn.executemany("INSERT INTO pending (tx_no, reg_no, license, pseudonym, text) "
+                                  "VALUES (?, ?, ?, ?, ?)", [self._columns(t) for t in pending])
+            self.conn.executemany("INSERT INTO denied (tx_no, reg_no, license, pseudonym, text) "
+                                  "VALUES (?, ?, ?, ?, ?)", [self._columns(t) for t in denied])
+        self.search_index.sync(self)
+        return blocks, len(pending), len(denied)
+
+
+class LedgerSnapshot:
+    """Read-only view of a ledger as it was when the snapshot was taken.
+
+    Blocks are only ever appended, so the view is the chain up to its length
+    at that moment plus a copy of the pending pool. Taking and reading a
+    snapshot takes no lock, so writers in other processes carry on while a
+    window pages through it, and what it shows doesn't change underneath.
+    """
+
+    def __init__(self, ledger):
+        self.ledger = ledger
+        self.length = len(ledger)
+        self._pending = ledger.pending()
+
+    def __len__(self):
+        return self.length
+
+    def tip(self):
+        return self.get_block(-1) if self.length else None
+
+    def get_block(self, height):
+        if height < 0:
+            height += self.length
+        if height < 0 or height >= self.length:
+            raise IndexError(f"No block at height {height}")
+        return self.ledger.get_block(height)
+
+    def iter_blocks(self, start=0):
+        return islice(self.ledger.iter_blocks(start), max(0, self.length - start))
+
+    def tail(self, count):
+        return [self.ledger.get_block(height) for height in range(max(0, self.length - count), self.length)]
+
+    def pending(self):
+        return list(self._pending)
+
+
+def open_ledger(backend=None):
+    """The ledger of this process for the configured backend, opened once.
+
+    A new SQLite ledger imports the flat files the first time it is opened.
+    """
+    backend = backend or LEDGER_BACKEND
+    if backend not in _open_ledgers:
+        if backend == SQLITE_BACKEND:
+            ledger = SqliteLedger()
+            if not len(ledger) and (os.path.exists(BLOCKS_PATH) or os.path.exists(LEGACY_BLOCKS_PATH)):
+                counts = ledger.import_text_files()
+                print(f"Imported {counts[0]} blocks, {counts[1]} pending and {counts[2]} denied "
+                      f"transactions into {ledger.path}")
+        elif backend == FILE_BACKEND:
+            ledger = FileLedger()
+        else:
+            raise ValueError(f"Unknown ledger backend: {backend}")
+        _open_ledgers[backend] = ledger
+    return _open_ledgers[backend]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import the flat-file ledger into a SQLite ledger")
+    parser.add_argument("--db", default=LEDGER_DB_PATH, help="SQLite ledger to create")
+    args = parser.parse_args()
+    ledger = SqliteLedger(args.db)
+    blocks, pending, denied = ledger.import_text_files()
+    print(f"Imported {blocks} blocks, {pending} pending and {denied} denied transactions into {args.db}")
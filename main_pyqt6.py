@@ -1,15 +1,32 @@
 import hashlib
-import os
+import html
 import sys
+import time
+from itertools import islice
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QPushButton, QLabel, QVBoxLayout, 
                            QHBoxLayout, QWidget, QTextEdit, QLineEdit, QGridLayout,
-                           QFrame, QScrollArea, QSizePolicy, QMessageBox)
+                           QMessageBox, QSpinBox,
+                           QTableView, QAbstractItemView, QComboBox)
 from PyQt6.QtGui import QFont, QColor, QPalette
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QObject, QThread, pyqtSignal, QAbstractTableModel, QModelIndex
 
 # Import the original classes (with PyQt6 adaptations)
 from client import *
 from miner import *
+from mining_engine import MiningEngine
+from pow_hash import get_hasher
+from retarget import next_difficulty
+from block_builder import (BATCH_MAX_BYTES, BATCH_MAX_TRANSACTIONS, MAX_BLOCK_TRANSACTIONS,
+                           select_batch, validate_batch)
+from block_store import TRANSACTION_SEPARATOR, block_header, genesis_block, make_block
+from checkpoint import verify_from_checkpoint
+from ledger import open_ledger
+from merkle import merkle_root
+from search_index import FIELDS
+from txid import next_transaction_number
+from transactions import (CAR_REGISTRATION, LICENSE_NUMBER, MANUFACTURE_YEAR, OWNER_NAME, PSEUDONYM,
+                          VEHICLE_TYPE, format_transaction, missing_fields, parse_transaction,
+                          registration_number, unsafe_fields)
 
 class BlockchainApp(QMainWindow):
     def __init__(self):
@@ -160,7 +177,7 @@ class BlockchainApp(QMainWindow):
     
     def open_blockchain_miner(self):
         self.hide()
-        self.miner_window = MinerWindow(self, self.last_block_hash)
+        self.miner_window = MinerWindow(self)
         self.miner_window.show()
     
     def view_blocks(self):
@@ -181,33 +198,36 @@ class BlockchainApp(QMainWindow):
         self.move(x, y)
     
     def load_blockchain_data(self):
-        # Check if blockchain files exist
-        if os.path.exists("blocks.txt"):
-            # Load last hash from blocks.txt
-            with open("blocks.txt", "r") as f:
-                blocks = f.readlines()
-                if blocks:
-                    last_block = blocks[-1].strip()
-                    # Extract hash from the last line
-                    hash_part = last_block.split("Hash: ")[-1].strip()
-                    self.last_block_hash = hash_part
-                    print(f"Loaded last block hash: {self.last_block_hash}")
-                else:
-                    # Empty file, initialize with Genesis block
-                    self._initialize_genesis_block()
+        # Open the ledger, this migrates old files, finishes any block commit that
+        # was interrupted by a crash and catches the registration index up
+        ledger = open_ledger()
+        # The chain tip gives the last hash without reading the chain
+        tip = ledger.tip()
+        if tip is not None:
+            self.last_block_hash = tip["hash"]
+            print(f"Loaded last block hash: {self.last_block_hash}")
+            # Only the blocks added since the last checkpoint are verified
+            result = verify_from_checkpoint(ledger)
+            if result["valid"]:
+                print(f"Verified blocks {result['resumed_from']} to {result['verified_height']} "
+                      f"in {result['seconds']:.2f}s")
+            else:
+                msg_box = QMessageBox()
+                msg_box.setIcon(QMessageBox.Icon.Warning)
+                msg_box.setWindowTitle("Blockchain Verification")
+                msg_box.setText(f"Block {result['error_height']} of the blockchain is invalid.")
+                msg_box.setDetailedText(result["error"])
+                msg_box.setStandardButtons(QMessageBox.StandardButton.Ok)
+                msg_box.exec()
         else:
-            # No blockchain file, initialize with Genesis block
-            self._initialize_genesis_block()
+            # Empty chain, initialize with Genesis block
+            self._initialize_genesis_block(ledger)
     
-    def _initialize_genesis_block(self):
+    def _initialize_genesis_block(self, ledger):
         # Initialize blockchain with Genesis block
-        t0 = 'Genesis Block'
-        digest = hash(t0)
-        self.last_block_hash = digest
-        
-        # Save Genesis block to file
-        with open("blocks.txt", "w") as f:
-            f.write(f"Block number: 0, Transaction: {{Genesis Block}}, Nonce: 0, Number of Transactions: 1, Hash: {digest}\n")
+        genesis = genesis_block()
+        ledger.commit_block(genesis, [])
+        self.last_block_hash = genesis["hash"]
         
     def close_application(self):
         # Preserve blockchain data - don't delete files
@@ -215,30 +235,6 @@ class BlockchainApp(QMainWindow):
 
 
 class CertificateAuthorityWindow(QMainWindow):
-    counter = 0
-    
-    @classmethod
-    def load_transaction_counter(cls):
-        # Initialize counter based on existing transactions
-        cls.counter = 0
-        if os.path.exists("vehicle_information.txt"):
-            try:
-                with open("vehicle_information.txt", "r") as f:
-                    transactions = f.readlines()
-                    for trans in transactions:
-                        if trans.strip():
-                            try:
-                                # Extract transaction number
-                                trans_num_str = trans.split("Transaction No: ")[1].split(",")[0]
-                                trans_num = int(trans_num_str)
-                                # Update counter to highest value
-                                cls.counter = max(cls.counter, trans_num)
-                            except (IndexError, ValueError):
-                                # Skip malformed lines
-                                pass
-            except Exception as e:
-                print(f"Error loading transaction counter: {e}")
-    
     def center_on_screen(self):
         # Center window on screen
         screen_geometry = QApplication.primaryScreen().geometry()
@@ -375,20 +371,23 @@ class CertificateAuthorityWindow(QMainWindow):
         self.car_reg_input.setFocus()
 
     def check_duplicate_car_registration(self, car_reg_info):
-        """Check if a car registration number already exists in the transaction file"""
-        if not os.path.exists("vehicle_information.txt"):
-            return False
-            
+        """Check if a car registration number is already pending or in the blockchain"""
         try:
-            with open("vehicle_information.txt", "r") as file:
-                for line in file:
-                    if f"Car Registration Number: {car_reg_info}" in line:
-                        return True
-            return False
+            # New registrations are rejected by the in-memory Bloom filter without a disk lookup
+            return open_ledger().lookup(car_reg_info) is not None
         except Exception:
             # If there's an error reading the file, proceed assuming it's not a duplicate
             return False
     
+    def show_duplicate_registration(self, car_reg_info):
+        msg_box = QMessageBox()
+        msg_box.setIcon(QMessageBox.Icon.Warning)
+        msg_box.setWindowTitle("Duplicate Registration")
+        msg_box.setText(f"Car with registration number '{car_reg_info}' already exists in the system.")
+        msg_box.setInformativeText("Please use a different registration number or check existing records.")
+        msg_box.setStandardButtons(QMessageBox.StandardButton.Ok)
+        msg_box.exec()
+    
     def save_info(self):
         car_reg_info = self.car_reg_input.text().strip()
         license_info = self.license_input.text().strip()
@@ -397,8 +396,11 @@ class CertificateAuthorityWindow(QMainWindow):
         vehicle_type_info = self.vehicle_type_input.text().strip() if hasattr(self, 'vehicle_type_input') else ""
         year_info = self.year_input.text().strip() if hasattr(self, 'year_input') else ""
         
+        fields = {CAR_REGISTRATION: car_reg_info, LICENSE_NUMBER: license_info, OWNER_NAME: owner_info,
+                  PSEUDONYM: pseudonym_info, VEHICLE_TYPE: vehicle_type_info, MANUFACTURE_YEAR: year_info}
+        
         # Validate required fields
-        if not car_reg_info or not license_info or not owner_info or not pseudonym_info:
+        if missing_fields(fields):
             msg_box = QMessageBox()
             msg_box.setIcon(QMessageBox.Icon.Warning)
             msg_box.setWindowTitle("Missing Information")
@@ -407,39 +409,35 @@ class CertificateAuthorityWindow(QMainWindow):
             msg_box.setStandardButtons(QMessageBox.StandardButton.Ok)
             msg_box.exec()
             return
-            
-        # Check for duplicate car registration
-        if self.check_duplicate_car_registration(car_reg_info):
+        
+        # A line break or field separator in a value would write extra pool lines
+        unsafe = unsafe_fields(fields)
+        if unsafe:
             msg_box = QMessageBox()
             msg_box.setIcon(QMessageBox.Icon.Warning)
-            msg_box.setWindowTitle("Duplicate Registration")
-            msg_box.setText(f"Car with registration number '{car_reg_info}' already exists in the system.")
-            msg_box.setInformativeText("Please use a different registration number or check existing records.")
+            msg_box.setWindowTitle("Invalid Information")
+            msg_box.setText("Some fields contain characters that can't be saved.")
+            msg_box.setDetailedText(f"{', '.join(unsafe)} can't contain line breaks, ', ' or ': '.")
             msg_box.setStandardButtons(QMessageBox.StandardButton.Ok)
             msg_box.exec()
             return
+            
+        # Check for duplicate car registration
+        if self.check_duplicate_car_registration(car_reg_info):
+            self.show_duplicate_registration(car_reg_info)
+            return
         
-        CertificateAuthorityWindow.counter += 1
-        
-        # Save to file
+        # Save to the pending transaction pool
         try:
-            file = open("vehicle_information.txt", "a+")
-            file.write("Transaction No: " + str(CertificateAuthorityWindow.counter) + ", ")
-            file.write("Car Registration Number: " + car_reg_info + ", ")
-            file.write("License Number: " + license_info + ", ")
-            file.write("Car Owner Name: " + owner_info + ", ")
-            file.write("Pseudonym: " + pseudonym_info)
+            # Numbers come from the shared sequence, so other writers never reuse them
+            # Vehicle type and year are only written when they were filled in
+            transaction = format_transaction(next_transaction_number(), fields)
             
-            # Add new fields if they exist
-            if vehicle_type_info:
-                file.write(", Vehicle Type: " + vehicle_type_info)
-            if year_info:
-                file.write(", Manufacture Year: " + year_info)
-                
-            file.write("\n")
-            file.close()
+            # The ledger keeps the registration index in step with the pending pool.
+            # It checks the registration again under its write lock, in case another
+            # Certificate Authority submitted it since the check above
+            added = open_ledger().add_pending(transaction)
         except Exception as e:
-            CertificateAuthorityWindow.counter -= 1  # Revert counter increase
             msg_box = QMessageBox()
             msg_box.setIcon(QMessageBox.Icon.Critical)
             msg_box.setWindowTitle("Error")
@@ -449,6 +447,10 @@ class CertificateAuthorityWindow(QMainWindow):
             msg_box.exec()
             return
         
+        if not added:
+            self.show_duplicate_registration(car_reg_info)
+            return
+        
         # Show success message
         msg_box = QMessageBox()
         msg_box.setIcon(QMessageBox.Icon.Information)
@@ -535,33 +537,22 @@ class MinerWindow(QMainWindow):
         self.move(x, y)
         
     def load_block_number(self):
-        # Initialize block number based on existing blocks
-        MinerWindow.blocknumber = 0
-        if os.path.exists("blocks.txt"):
-            with open("blocks.txt", "r") as f:
-                blocks = f.readlines()
-                if blocks:
-                    for block in blocks:
-                        if block.strip():  # Skip empty lines
-                            try:
-                                # Extract block number from line
-                                block_num_str = block.split("Block number: ")[1].split(",")[0]
-                                block_num = int(block_num_str)
-                                # Update the block number to the highest value found
-                                MinerWindow.blocknumber = max(MinerWindow.blocknumber, block_num)
-                            except (IndexError, ValueError):
-                                # Skip malformed lines
-                                pass
-                    # We'll start with the next block number
-                    print(f"Loaded block number: {MinerWindow.blocknumber}")
+        # Block number and previous hash both come from the chain tip, so blocks
+        # mined since the application started are built on
+        tip = self.ledger.tip()
+        MinerWindow.blocknumber = tip["height"] if tip else 0
+        self.last_hash = tip["hash"] if tip else ""
+        # We'll start with the next block number
+        print(f"Loaded block number: {MinerWindow.blocknumber}")
     
-    def __init__(self, parent=None, last_hash=""):
+    def __init__(self, parent=None):
         super().__init__()
         self.parent = parent
-        self.last_hash = last_hash
+        self.last_hash = ""
         self.count = 0
         self.new_hash = ""
         self.transactions = []
+        self.ledger = open_ledger()
         
         self.setWindowTitle("Blockchain Miner")
         self.setMinimumSize(700, 500)
@@ -577,20 +568,14 @@ class MinerWindow(QMainWindow):
         # Main layout
         main_layout = QVBoxLayout(central_widget)
         
-        # Check for existing transactions
-        if os.path.exists("vehicle_information.txt"):
-            try:
-                f = open("vehicle_information.txt", "r")
-                content = f.read()
-                f.close()
-                if content.strip():  # Make sure file is not empty
-                    self.transactions = content.split('\n')
-                    # Remove empty entries
-                    self.transactions = [t for t in self.transactions if t.strip()]
-            except Exception as e:
-                print(f"Error loading transactions: {e}")
-                self.transactions = []
-            
+        # Check for existing transactions, denied and mined ones are no longer pending
+        try:
+            self.transactions = self.ledger.pending()
+        except Exception as e:
+            print(f"Error loading transactions: {e}")
+            self.transactions = []
+        
+        if self.transactions:
             # Header
             header_label = QLabel("Verify Transaction")
             header_label.setStyleSheet("font-size: 22px; font-weight: bold; margin: 20px 0; color: #00FF00;")
@@ -679,6 +664,19 @@ class MinerWindow(QMainWindow):
             
             main_layout.addWidget(buttons_widget)
             
+            # Batch mining: take many pending transactions at once instead of one by one
+            batch_widget = QWidget()
+            batch_layout = QHBoxLayout(batch_widget)
+            batch_layout.addWidget(QLabel("Batch size:"))
+            self.batch_size_input = QSpinBox()
+            self.batch_size_input.setRange(1, 100000)
+            self.batch_size_input.setValue(BATCH_MAX_TRANSACTIONS)
+            batch_layout.addWidget(self.batch_size_input)
+            batch_button = QPushButton("Mine Batch")
+            batch_button.clicked.connect(self.mine_batch)
+            batch_layout.addWidget(batch_button)
+            main_layout.addWidget(batch_widget)
+            
         else:
             # No transactions
             no_trans_label = QLabel("No transaction present in transaction repository")
@@ -704,48 +702,26 @@ class MinerWindow(QMainWindow):
         if not hasattr(self, 'current_block_transactions'):
             return False
             
-        # Extract car registration number from transaction
-        car_reg_match = None
-        for part in transaction.split(','):
-            if "Car Registration Number:" in part:
-                car_reg_match = part.strip()
-                break
-                
-        if not car_reg_match:
+        car_reg = registration_number(transaction)
+        if not car_reg:
             return False
             
-        # Check if this car registration exists in any transaction in current block
-        for existing_trans in self.current_block_transactions:
-            if car_reg_match in existing_trans:
-                return True
-                
-        return False
+        # Compare whole registration numbers, KA01 must not match KA012
+        return any(registration_number(existing_trans) == car_reg
+                   for existing_trans in self.current_block_transactions)
             
     def check_duplicate_in_blockchain(self, transaction):
         """Check if a transaction is already in the blockchain"""
-        if not os.path.exists("blocks.txt"):
-            return False
-            
         # Extract car registration number from transaction
-        car_reg_match = None
-        for part in transaction.split(','):
-            if "Car Registration Number:" in part:
-                car_reg_match = part.strip()
-                break
-                
-        if not car_reg_match:
+        car_reg = registration_number(transaction)
+        if not car_reg:
             return False
             
-        # Check blocks.txt for this car registration
+        # Bloom filter first, then an exact lookup in the registration index
         try:
-            with open("blocks.txt", "r") as f:
-                blockchain_content = f.read()
-                if car_reg_match in blockchain_content:
-                    return True
+            return self.ledger.in_chain(car_reg)
         except Exception:
-            pass
-            
-        return False
+            return False
     
     def add_to_block(self):
         # Get the transactions to add to the block
@@ -753,7 +729,7 @@ class MinerWindow(QMainWindow):
         
         # Check if we already have a block being built and how many transactions it has
         block_transactions = []
-        max_transactions_per_block = 5  # Maximum transactions per block
+        max_transactions_per_block = MAX_BLOCK_TRANSACTIONS
         
         if hasattr(self, 'current_block_transactions'):
             block_transactions = self.current_block_transactions
@@ -792,7 +768,7 @@ class MinerWindow(QMainWindow):
         if len(block_transactions) >= max_transactions_per_block or self.count == len(self.transactions) - 1:
             self.hide()
             # Join all transactions with a special delimiter
-            block_content = "\n---TRANSACTION---\n".join(block_transactions)
+            block_content = TRANSACTION_SEPARATOR.join(block_transactions)
             self.mine_window = MiningWindow(self, block_content, self.last_hash, block_transactions)
             self.mine_window.show()
             # Clear the current block after mining
@@ -807,6 +783,40 @@ class MinerWindow(QMainWindow):
             # Move to next transaction
             self.next_transaction()
 
+    def mine_batch(self):
+        """Pull a batch from the pending pool, validate it in bulk and mine it as one block"""
+        batch = select_batch(self.transactions, self.batch_size_input.value(), BATCH_MAX_BYTES)
+        try:
+            accepted, rejected = validate_batch(batch, self.ledger)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to validate the batch: {str(e)}")
+            return
+        
+        if not accepted:
+            msg_box = QMessageBox()
+            msg_box.setIcon(QMessageBox.Icon.Warning)
+            msg_box.setWindowTitle("Nothing to Mine")
+            msg_box.setText(f"None of the {len(batch)} transactions in the batch can be mined.")
+            msg_box.setDetailedText("\n".join(f"{reason}: {t}" for t, reason in rejected))
+            msg_box.setStandardButtons(QMessageBox.StandardButton.Ok)
+            msg_box.exec()
+            return
+        
+        if rejected:
+            # Rejected transactions stay in the pool so they can be reviewed and denied
+            msg_box = QMessageBox()
+            msg_box.setIcon(QMessageBox.Icon.Information)
+            msg_box.setWindowTitle("Transactions Skipped")
+            msg_box.setText(f"{len(rejected)} of {len(batch)} transactions were skipped and left in the pool.")
+            msg_box.setDetailedText("\n".join(f"{reason}: {t}" for t, reason in rejected))
+            msg_box.setStandardButtons(QMessageBox.StandardButton.Ok)
+            msg_box.exec()
+        
+        self.hide()
+        self.current_block_transactions = []
+        self.mine_window = MiningWindow(self, TRANSACTION_SEPARATOR.join(accepted), self.last_hash, accepted)
+        self.mine_window.show()
+
     def prev_transaction(self):
         if not self.transactions or self.count <= 0:
             return
@@ -828,28 +838,21 @@ class MinerWindow(QMainWindow):
         # Get current transaction
         current_transaction = self.transactions[self.count]
         
-        # Add to denied transactions file
+        # Move it from the pending pool to the denied transactions
         try:
-            # Create the denied_transactions.txt file if it doesn't exist
-            with open("denied_transactions.txt", "a+") as file:
-                file.write(current_transaction + "\n")
+            self.ledger.deny(current_transaction)
                 
             # Show confirmation message
             msg_box = QMessageBox()
             msg_box.setIcon(QMessageBox.Icon.Information)
             msg_box.setWindowTitle("Transaction Denied")
-            msg_box.setText("Transaction has been denied and saved to denied_transactions.txt")
+            msg_box.setText("Transaction has been denied and saved to the denied transactions")
             msg_box.setStandardButtons(QMessageBox.StandardButton.Ok)
             msg_box.exec()
             
             # Remove transaction from list immediately
             self.transactions.pop(self.count)
             
-            # Update transaction file with remaining transactions
-            with open("vehicle_information.txt", "w") as file:
-                if self.transactions:
-                    file.write("\n".join(self.transactions) + "\n")
-            
             # Handle navigation after removal
             if not self.transactions:
                 # No transactions left
@@ -918,6 +921,31 @@ class MinerWindow(QMainWindow):
         return '\n'.join(formatted_lines)
 
 
+class MiningWorker(QObject):
+    """Runs the nonce search on a QThread and reports progress back to the GUI"""
+    progress = pyqtSignal(object, float, float)  # nonces tried, hashes/sec, ETA in seconds
+    finished = pyqtSignal(object, bool)  # (nonce, hash) or None, cancelled
+    failed = pyqtSignal(str)
+    
+    def __init__(self, header, difficulty, hasher):
+        super().__init__()
+        self.header = header
+        self.difficulty = difficulty
+        self.engine = MiningEngine(hasher=hasher)
+    
+    def run(self):
+        try:
+            result = self.engine.mine(self.header, self.difficulty, self.progress.emit)
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.finished.emit(result, self.engine.cancelled)
+    
+    def cancel(self):
+        # Called from the GUI thread, the engine only sets a shared stop event
+        self.engine.cancel()
+
+
 class MiningWindow(QMainWindow):
     def center_on_screen(self):
         # Center window on screen
@@ -931,6 +959,9 @@ class MiningWindow(QMainWindow):
         self.transaction = transaction  # This can now contain multiple transactions
         self.last_hash = last_hash
         self.original_transactions = original_transactions or []  # List of original transactions
+        self.mining_thread = None
+        self.mining_worker = None
+        self.hasher = get_hasher()  # Proof-of-work backend, recorded with the block
         
         self.setWindowTitle("Mining Block...")
         self.setMinimumSize(700, 500)
@@ -972,10 +1003,31 @@ class MiningWindow(QMainWindow):
         
         main_layout.addWidget(self.transaction_display)
         
+        # Mining progress
+        self.progress_label = QLabel("")
+        self.progress_label.setStyleSheet("font-size: 14px; color: #2C3E50;")
+        self.progress_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        main_layout.addWidget(self.progress_label)
+        
         # Mine button
         self.mine_button = QPushButton("Start Mining the blocks")
         self.mine_button.clicked.connect(self.start_mining)
         main_layout.addWidget(self.mine_button, alignment=Qt.AlignmentFlag.AlignCenter)
+        
+        # Cancel button, only shown while mining
+        self.cancel_button = QPushButton("Cancel Mining")
+        self.cancel_button.setStyleSheet("""
+            QPushButton {
+                background-color: #e74c3c;
+                color: white;
+            }
+            QPushButton:hover {
+                background-color: #c0392b;
+            }
+        """)
+        self.cancel_button.clicked.connect(self.cancel_mining)
+        self.cancel_button.hide()
+        main_layout.addWidget(self.cancel_button, alignment=Qt.AlignmentFlag.AlignCenter)
 
     def start_mining(self):
         # Switch button function based on text
@@ -989,16 +1041,14 @@ class MiningWindow(QMainWindow):
         
         # Check for duplicates within the transactions to be mined
         if not self.check_duplicate_transactions_in_block():
-            # Proceed with mining
-            # Use our own SCRYPT implementation instead of importing from miner
+            # Proceed with mining on the current tip, another miner may have extended the chain
+            self.parent.load_block_number()
+            self.last_hash = self.parent.last_hash
             MinerWindow.blocknumber = MinerWindow.blocknumber + 1
             
-            # Set up mining parameters
-            difficulty = 2
-            prefix_str = '0' * difficulty
-            
-            # Start mining process
-            QApplication.processEvents()  # Update UI
+            # Set up mining parameters, difficulty is in leading zero bits and
+            # retargeted from the recent block times
+            self.difficulty = next_difficulty(self.parent.ledger)
         else:
             # If duplicates found, stop mining and show error
             self.transaction_display.setText("Error: Duplicate transactions detected in block. Mining cancelled.")
@@ -1006,66 +1056,117 @@ class MiningWindow(QMainWindow):
             self.mine_button.setEnabled(True)
             return
         
-        for nonce in range(10000000000):
-            mine_string = self.transaction + str(self.last_hash) + str(MinerWindow.blocknumber)
-            text = mine_string + str(nonce)
-            new_h = self.SCRYPT(text)  # Use the local SCRYPT method
+        # Only the fixed-size header is hashed, the transactions are covered by the Merkle root
+        self.timestamp = round(time.time(), 3)
+        header = block_header(str(self.last_hash), merkle_root(self.original_transactions),
+                              MinerWindow.blocknumber, self.timestamp, self.difficulty)
+        self.mining_started = time.monotonic()
+        
+        # Search the nonce space on a worker thread so the window stays responsive
+        self.mining_thread = QThread()
+        self.mining_worker = MiningWorker(header, self.difficulty, self.hasher)
+        self.mining_worker.moveToThread(self.mining_thread)
+        self.mining_thread.started.connect(self.mining_worker.run)
+        self.mining_worker.progress.connect(self.on_mining_progress)
+        self.mining_worker.finished.connect(self.on_mining_finished)
+        self.mining_worker.failed.connect(self.on_mining_failed)
+        self.mining_worker.finished.connect(self.mining_thread.quit)
+        self.mining_worker.failed.connect(self.mining_thread.quit)
+        self.mining_thread.finished.connect(self.mining_worker.deleteLater)
+        self.mining_thread.finished.connect(self.mining_thread.deleteLater)
+        
+        self.cancel_button.setEnabled(True)
+        self.cancel_button.show()
+        self.mining_thread.start()
+
+    def cancel_mining(self):
+        """Stop the running nonce search, the block number is rolled back when it finishes"""
+        if self.mining_worker is not None:
+            self.cancel_button.setEnabled(False)
+            self.progress_label.setText("Cancelling...")
+            self.mining_worker.cancel()
+
+    def on_mining_progress(self, tried, rate, eta):
+        if eta == float('inf'):
+            eta_text = "unknown"
+        else:
+            eta_text = f"{eta:.1f}s"
+        self.progress_label.setText(f"Nonces tried: {tried} | {rate:.1f} hashes/sec | ETA: {eta_text}")
+
+    def on_mining_failed(self, error):
+        self.mining_worker = None
+        self.mining_thread = None
+        self.cancel_button.hide()
+        MinerWindow.blocknumber -= 1  # Revert block number increase
+        self.transaction_display.setText(f"Error while mining: {error}")
+        self.mine_button.setText("EXIT")
+        self.mine_button.setEnabled(True)
+
+    def on_mining_finished(self, result, cancelled):
+        self.mining_worker = None
+        self.mining_thread = None
+        self.cancel_button.hide()
+        
+        if cancelled:
+            MinerWindow.blocknumber -= 1  # Revert block number increase
+            self.progress_label.setText("Mining cancelled")
+            self.transaction_display.setText("Mining cancelled. The block was not added to the blockchain.")
+            self.mine_button.setText("EXIT")
+            self.mine_button.setEnabled(True)
+            return
+        
+        if result is not None:
+            nonce, new_h = result
+            print("Successfully mined with nonce:", nonce)
+            self.new_hash = new_h
             
-            if new_h.startswith(prefix_str):
-                print("Successfully mined with nonce:", nonce)
-                self.new_hash = new_h
-                
-                # Check for duplicates in existing blockchain before saving
-                if self.check_duplicates_in_blockchain():
-                    self.transaction_display.setText("Error: Some transactions are already in the blockchain. Mining cancelled.")
-                    self.mine_button.setText("EXIT")
-                    self.mine_button.setEnabled(True)
-                    MinerWindow.blocknumber -= 1  # Revert block number increase
-                    return
-                
-                # Save to blocks file
-                try:
-                    file = open("blocks.txt", "a+")
-                    file.write("Block number: " + str(MinerWindow.blocknumber) + ", ")
-                    file.write("Transactions: {" + self.transaction.replace('\n', ',') + "}, ")
-                    file.write("Nonce: " + str(nonce) + ", ")
-                    file.write("Number of Transactions: " + str(len(self.original_transactions)) + ", ")
-                    file.write("Hash: " + str(new_h) + "\n")
-                    file.close()
-                except Exception as e:
-                    print(f"Error writing to blockchain file: {e}")
-                    self.transaction_display.setText(f"Error saving to blockchain: {str(e)}")
-                    self.mine_button.setText("EXIT")
-                    self.mine_button.setEnabled(True)
-                    MinerWindow.blocknumber -= 1  # Revert block number increase
-                    return
-                
-                # Update transaction file by removing all transactions in this block
-                for trans in self.original_transactions:
-                    if trans in self.parent.transactions:
-                        self.parent.transactions.remove(trans)
-                
-                # Update transaction file
-                string = '\n'.join(self.parent.transactions)
-                file = open("vehicle_information.txt", "w+")
-                file.write(string + "\n" if string else "")
-                file.close()
-                
-                # Update parent's last_hash
-                self.parent.last_hash = str(new_h)
-                
-                # Update UI
-                mining_result = "Transaction added to block\n\n"
-                mining_result += self.transaction.replace(',', '\n')
-                mining_result += "\n\nNONCE: " + str(nonce)
-                mining_result += "\nNEW HASH: " + str(new_h)
-                self.transaction_display.setText(mining_result)
-                
-                # Re-enable button with exit text
+            # Check for duplicates in existing blockchain before saving
+            if self.check_duplicates_in_blockchain():
+                self.transaction_display.setText("Error: Some transactions are already in the blockchain. Mining cancelled.")
+                self.mine_button.setText("EXIT")
                 self.mine_button.setEnabled(True)
+                MinerWindow.blocknumber -= 1  # Revert block number increase
+                return
+            
+            # Save to the block store
+            try:
+                block = make_block(MinerWindow.blocknumber, str(self.last_hash), self.original_transactions,
+                                   nonce, new_h, self.timestamp, self.difficulty, self.hasher.spec())
+                # The block and the removal of its transactions from the pool commit together
+                self.parent.ledger.commit_block(block, self.original_transactions)
+            except Exception as e:
+                print(f"Error writing to blockchain file: {e}")
+                self.transaction_display.setText(f"Error saving to blockchain: {str(e)}")
                 self.mine_button.setText("EXIT")
+                self.mine_button.setEnabled(True)
+                MinerWindow.blocknumber -= 1  # Revert block number increase
                 return
-                
+            
+            # The pool was updated by the commit, drop the mined transactions from the list too
+            mined = set(self.original_transactions)
+            self.parent.transactions = [t for t in self.parent.transactions if t not in mined]
+            
+            # Update parent's last_hash
+            self.parent.last_hash = str(new_h)
+            
+            # Update UI
+            mining_result = "Transaction added to block\n\n"
+            mining_result += self.transaction.replace(',', '\n')
+            mining_result += "\n\nNONCE: " + str(nonce)
+            mining_result += "\nNEW HASH: " + str(new_h)
+            self.transaction_display.setText(mining_result)
+            
+            # Throughput of the whole block, from the start of mining until it was stored
+            elapsed = time.monotonic() - self.mining_started
+            count = len(self.original_transactions)
+            rate = count / elapsed if elapsed > 0 else 0.0
+            self.progress_label.setText(f"Mined {count} transactions in {elapsed:.2f}s ({rate:.1f} transactions/sec)")
+            
+            # Re-enable button with exit text
+            self.mine_button.setEnabled(True)
+            self.mine_button.setText("EXIT")
+            return
+            
         # If mining fails
         self.transaction_display.setText("Max limit exceeded")
         self.mine_button.setEnabled(True)
@@ -1074,48 +1175,29 @@ class MiningWindow(QMainWindow):
 
     def check_duplicate_transactions_in_block(self):
         """Check if there are duplicate car registrations within the transactions to be mined"""
-        car_registrations = []
+        car_registrations = set()
         
         # Process each transaction in the block
         for transaction in self.original_transactions:
-            car_reg = None
-            # Extract car registration number
-            for part in transaction.split(','):
-                if "Car Registration Number:" in part:
-                    car_reg = part.strip()
-                    break
-                    
+            car_reg = registration_number(transaction)
             if car_reg:
                 if car_reg in car_registrations:
                     return True  # Duplicate found
-                car_registrations.append(car_reg)
+                car_registrations.add(car_reg)
                 
         return False  # No duplicates found
         
     def check_duplicates_in_blockchain(self):
         """Check if any transaction in current block already exists in blockchain"""
-        if not os.path.exists("blocks.txt"):
-            return False
-            
         try:
-            with open("blocks.txt", "r") as f:
-                blockchain_content = f.read()
-                
-            # Extract all car registration numbers from current transactions
+            ledger = self.parent.ledger
             for transaction in self.original_transactions:
-                car_reg = None
-                # Extract car registration number
-                for part in transaction.split(','):
-                    if "Car Registration Number:" in part:
-                        car_reg = part.strip()
-                        break
-                        
-                if car_reg and car_reg in blockchain_content:
+                car_reg = registration_number(transaction)
+                if car_reg and ledger.in_chain(car_reg):
                     return True  # Found in blockchain
-                    
             return False  # No duplicates found
         except Exception:
-            # If error reading file, proceed assuming no duplicates
+            # If error reading the index, proceed assuming no duplicates
             return False
     
     def _format_transaction_data(self, transaction_text):
@@ -1145,14 +1227,6 @@ class MiningWindow(QMainWindow):
         # Join with double line breaks to add more space between entries
         return '\n'.join(formatted_lines)
         
-    def SCRYPT(self, text):
-        # Implement the SCRYPT method from the original miner class
-        import pyscrypt
-        salt = os.urandom(8)
-        b = bytes(text, 'utf-8')
-        digest = pyscrypt.hash(b, salt, 8, 2, 1, 32)
-        return str(digest.hex())
-        
     def exit_to_main(self):
         self.hide()
         if self.parent and self.parent.parent:
@@ -1262,6 +1336,60 @@ class TransactionEndWindow(QMainWindow):
             self.main_parent.show()
 
 
+class BlockTableModel(QAbstractTableModel):
+    """One row per block, fetched from the ledger a page at a time as the view scrolls"""
+    COLUMNS = ["Block", "Timestamp", "Difficulty", "Transactions", "Hash"]
+    PAGE_SIZE = 200
+    
+    def __init__(self, ledger, parent=None):
+        super().__init__(parent)
+        self.ledger = ledger
+        self.total = len(ledger)
+        self.rows = []  # Summaries of the fetched blocks, without their transactions
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+    
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        return self.rows[index.row()][index.column()]
+    
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.COLUMNS[section]
+        return None
+    
+    def canFetchMore(self, parent):
+        return not parent.isValid() and len(self.rows) < self.total
+    
+    def fetchMore(self, parent):
+        if parent.isValid():
+            return
+        start = len(self.rows)
+        # The ledger seeks straight to the first block of the page through its offset index
+        blocks = list(islice(self.ledger.iter_blocks(start), min(self.PAGE_SIZE, self.total - start)))
+        if not blocks:
+            self.total = start
+            return
+        self.beginInsertRows(QModelIndex(), start, start + len(blocks) - 1)
+        self.rows.extend(self._summary(block) for block in blocks)
+        self.endInsertRows()
+    
+    def height(self, row):
+        return self.rows[row][0]
+    
+    def _summary(self, block):
+        timestamp = ""
+        if block.get("timestamp") is not None:
+            timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(block["timestamp"]))
+        difficulty = f"{block['difficulty']} bits" if block.get("difficulty") is not None else ""
+        return (block["height"], timestamp, difficulty, len(block["transactions"]), block["hash"])
+
+
 class BlocksWindow(QMainWindow):
     def center_on_screen(self):
         # Center window on screen
@@ -1286,10 +1414,8 @@ class BlocksWindow(QMainWindow):
         main_layout = QVBoxLayout(central_widget)
         
         # Check for blocks
-        if os.path.exists("blocks.txt"):
-            f = open("blocks.txt", "r")
-            blocks = f.read().split("\n")
-            f.close()
+        ledger = open_ledger()
+        if len(ledger):
             
             # Header
             header_label = QLabel("Blockchain Blocks")
@@ -1297,51 +1423,59 @@ class BlocksWindow(QMainWindow):
             header_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
             main_layout.addWidget(header_label)
             
-            # Create scroll area for blocks
-            scroll_area = QScrollArea()
-            scroll_area.setWidgetResizable(True)
-            scroll_content = QWidget()
-            scroll_layout = QVBoxLayout(scroll_content)
+            # Search the transactions of the whole chain through the inverted index
+            search_widget = QWidget()
+            search_layout = QHBoxLayout(search_widget)
+            self.search_input = QLineEdit()
+            self.search_input.setPlaceholderText("Search registration, license, owner, pseudonym, type or year")
+            self.search_input.returnPressed.connect(self.search_chain)
+            search_layout.addWidget(self.search_input)
+            self.search_field = QComboBox()
+            self.search_field.addItem("All fields", None)
+            for field in FIELDS:
+                self.search_field.addItem(field, field)
+            search_layout.addWidget(self.search_field)
+            search_button = QPushButton("Search")
+            search_button.clicked.connect(self.search_chain)
+            search_layout.addWidget(search_button)
+            main_layout.addWidget(search_widget)
             
-            # Add each block as a styled frame
-            for block in blocks:
-                if not block:  # Skip empty lines
-                    continue
-                    
-                block_frame = QFrame()
-                block_frame.setFrameShape(QFrame.Shape.StyledPanel)
-                block_frame.setStyleSheet("""
-                    QFrame {
-                        background-color: #ecf0f1;
-                        border: 1px solid #bdc3c7;
-                        border-radius: 5px;
-                        margin: 5px;
-                    }
-                """)
-                
-                block_layout = QVBoxLayout(block_frame)
-                # Format block data for better readability
-                formatted_block = self._format_block_text(block)
-                block_text = QTextEdit()
-                block_text.setReadOnly(True)
-                block_text.setHtml(formatted_block)
-                block_text.setStyleSheet("""
-                    background-color: #f8f9fa;
-                    border: 1px solid #d1d1d1;
-                    border-radius: 4px;
-                    font-family: monospace;
-                    font-size: 14px;
-                    color: #000000;
-                    font-weight: bold;
-                    padding: 5px;
-                """)
-                block_text.setMaximumHeight(120)
-                block_layout.addWidget(block_text)
-                
-                scroll_layout.addWidget(block_frame)
+            # Only the rows in view are painted, and blocks are read from the ledger
+            # a page at a time as the table is scrolled
+            # The model reads a snapshot, so blocks mined meanwhile by other
+            # processes don't shift the rows under the view
+            self.block_model = BlockTableModel(ledger.snapshot(), self)
+            self.block_view = QTableView()
+            self.block_view.setModel(self.block_model)
+            self.block_view.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+            self.block_view.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+            self.block_view.verticalHeader().setVisible(False)
+            self.block_view.horizontalHeader().setStretchLastSection(True)
+            self.block_view.setStyleSheet("""
+                background-color: #ecf0f1;
+                font-family: monospace;
+                font-size: 14px;
+                color: #000000;
+            """)
+            self.block_view.selectionModel().currentRowChanged.connect(self.show_block)
+            main_layout.addWidget(self.block_view)
             
-            scroll_area.setWidget(scroll_content)
-            main_layout.addWidget(scroll_area)
+            # Details of the selected block
+            self.block_details = QTextEdit()
+            self.block_details.setReadOnly(True)
+            self.block_details.setPlaceholderText("Select a block to see its transactions")
+            self.block_details.setStyleSheet("""
+                background-color: #f8f9fa;
+                border: 1px solid #d1d1d1;
+                border-radius: 4px;
+                font-family: monospace;
+                font-size: 14px;
+                color: #000000;
+                font-weight: bold;
+                padding: 5px;
+            """)
+            self.block_details.setMaximumHeight(220)
+            main_layout.addWidget(self.block_details)
             
         else:
             # No blocks
@@ -1364,32 +1498,121 @@ class BlocksWindow(QMainWindow):
         exit_button.clicked.connect(self.exit_to_main)
         main_layout.addWidget(exit_button, alignment=Qt.AlignmentFlag.AlignCenter)
 
+    def search_chain(self):
+        query = self.search_input.text().strip()
+        if not query:
+            return
+        start = time.perf_counter()
+        results = open_ledger().search(query, self.search_field.currentData())
+        elapsed = (time.perf_counter() - start) * 1000
+        html_output = [f"<b>{len(results)} results in {elapsed:.1f} ms</b><br>"]
+        for result in results:
+            html_output.append(f"<br><b>Block {result['height']}, transaction {result['position'] + 1}:</b><br>")
+            html_output.append(f"{html.escape(result['transaction'])}<br>")
+        self.block_details.setHtml(''.join(html_output))
+    
+    def show_block(self, current, previous):
+        # Only the selected block is read in full
+        if current.isValid():
+            block = open_ledger().get_block(self.block_model.height(current.row()))
+            self.block_details.setHtml(self._format_block_record(block))
+    
     def exit_to_main(self):
         self.hide()
         if self.parent:
             self.parent.show()
             
-    def _format_block_text(self, block_text):
-        """Format block text for better HTML display"""
-        # Parse the block text
-        html_output = []
-        
-        # Split by commas and format each part
-        parts = block_text.split(',')
-        for part in parts:
-            if ':' in part:
-                key_val = part.split(':', 1)
-                key = key_val[0].strip()
-                val = key_val[1].strip() if len(key_val) > 1 else ""
-                
-                # Add HTML formatting - bold for keys, normal for values
-                html_output.append(f"<b>{key}:</b> {val}<br>")
-            else:
-                html_output.append(f"{part}<br>")
-                
+    def _format_block_record(self, block):
+        """Format a block record for better HTML display"""
+        fields = [("Block number", block["height"]), ("Previous Hash", block["prev_hash"])]
+        if block.get("timestamp") is not None:
+            fields.append(("Timestamp", time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(block["timestamp"]))))
+        if block.get("difficulty") is not None:
+            fields.append(("Difficulty", f"{block['difficulty']} bits"))
+        fields.append(("Nonce", block["nonce"]))
+        fields.append(("Number of Transactions", len(block["transactions"])))
+        
+        # Add HTML formatting - bold for keys, normal for values
+        html_output = [f"<b>{key}:</b> {html.escape(str(val))}<br>" for key, val in fields]
+        for transaction in block["transactions"]:
+            html_output.append("<br>")
+            # Each transaction is "Key: value, Key: value, ..."
+            for part in transaction.split(', '):
+                if ':' in part:
+                    key, val = part.split(':', 1)
+                    html_output.append(f"<b>{html.escape(key.strip())}:</b> {html.escape(val.strip())}<br>")
+                else:
+                    html_output.append(f"{html.escape(part)}<br>")
+        html_output.append(f"<br><b>Hash:</b> {html.escape(block['hash'])}<br>")
         return ''.join(html_output)
 
 
+class DeniedTableModel(QAbstractTableModel):
+    """Denied transactions paged in from the ledger, optionally filtered by registration number"""
+    COLUMNS = ["Transaction No", "Car Registration Number", "License Number", "Car Owner Name", "Pseudonym"]
+    PAGE_SIZE = 200
+    
+    def __init__(self, ledger, parent=None):
+        super().__init__(parent)
+        self.ledger = ledger
+        self.query = ""
+        self.rows = []
+        self.total = ledger.denied_count()
+        self._matches = None  # Streaming search results while a filter is set
+    
+    def set_filter(self, query):
+        self.beginResetModel()
+        self.query = query.strip()
+        self.rows = []
+        self.total = self.ledger.denied_count()
+        self._matches = self.ledger.search_denied(self.query) if self.query else None
+        self.endResetModel()
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+    
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        return parse_transaction(self.rows[index.row()]).get(self.COLUMNS[index.column()], "")
+    
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.COLUMNS[section]
+        return None
+    
+    def canFetchMore(self, parent):
+        if parent.isValid():
+            return False
+        if self._matches is not None:
+            return True
+        return len(self.rows) < self.total
+    
+    def fetchMore(self, parent):
+        if parent.isValid():
+            return
+        start = len(self.rows)
+        if self._matches is not None:
+            page = list(islice(self._matches, self.PAGE_SIZE))
+            if len(page) < self.PAGE_SIZE:
+                self._matches = None  # Search finished
+                self.total = start + len(page)
+        else:
+            # The line-offset index lets the ledger seek straight to the page
+            page = self.ledger.denied_page(start, self.PAGE_SIZE)
+        if not page:
+            return
+        self.beginInsertRows(QModelIndex(), start, start + len(page) - 1)
+        self.rows.extend(page)
+        self.endInsertRows()
+    
+    def transaction(self, row):
+        return self.rows[row]
+
+
 # Window to display denied transactions
 class DeniedTransactionsWindow(QMainWindow):
     def center_on_screen(self):
@@ -1420,73 +1643,64 @@ class DeniedTransactionsWindow(QMainWindow):
         header_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         main_layout.addWidget(header_label)
         
-        # Check for denied transactions
-        if os.path.exists("denied_transactions.txt"):
-            try:
-                with open("denied_transactions.txt", "r") as f:
-                    content = f.read()
-                    denied_transactions = content.split('\n')
-                    denied_transactions = [t for t in denied_transactions if t.strip()]
-                    
-                if denied_transactions:
-                    # Create a scroll area for transactions
-                    scroll_area = QScrollArea()
-                    scroll_area.setWidgetResizable(True)
-                    
-                    scroll_content = QWidget()
-                    scroll_layout = QVBoxLayout(scroll_content)
-                    
-                    # Display each denied transaction in a card
-                    for transaction in denied_transactions:
-                        transaction_frame = QFrame()
-                        transaction_frame.setFrameShape(QFrame.Shape.StyledPanel)
-                        transaction_frame.setStyleSheet("""
-                            QFrame {
-                                background-color: #ffebee;
-                                border: 1px solid #ef9a9a;
-                                border-radius: 8px;
-                                margin: 5px;
-                            }
-                        """)
-                        
-                        transaction_layout = QVBoxLayout(transaction_frame)
-                        
-                        # Format transaction for display
-                        transaction_text = str(transaction).replace(',', '\n')
-                        formatted_transaction = self._format_transaction_text(transaction_text)
-                        
-                        transaction_display = QTextEdit()
-                        transaction_display.setReadOnly(True)
-                        transaction_display.setText(formatted_transaction)
-                        transaction_display.setStyleSheet("""
-                            background-color: transparent;
-                            border: none;
-                            font-family: monospace;
-                            font-size: 14px;
-                            color: #000000;
-                        """)
-                        transaction_display.setMaximumHeight(150)
-                        
-                        transaction_layout.addWidget(transaction_display)
-                        scroll_layout.addWidget(transaction_frame)
-                    
-                    scroll_area.setWidget(scroll_content)
-                    main_layout.addWidget(scroll_area)
-                else:
-                    no_transactions_label = QLabel("No denied transactions found")
-                    no_transactions_label.setStyleSheet("font-size: 18px; color: #666666; margin: 50px 0;")
-                    no_transactions_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-                    main_layout.addWidget(no_transactions_label)
-            except Exception as e:
-                error_label = QLabel(f"Error loading denied transactions: {str(e)}")
-                error_label.setStyleSheet("font-size: 16px; color: #e74c3c; margin: 50px 0;")
-                error_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-                main_layout.addWidget(error_label)
-        else:
-            no_file_label = QLabel("No denied transactions have been recorded yet")
-            no_file_label.setStyleSheet("font-size: 18px; color: #666666; margin: 50px 0;")
-            no_file_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            main_layout.addWidget(no_file_label)
+        # Search by registration number
+        search_widget = QWidget()
+        search_layout = QHBoxLayout(search_widget)
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Filter by car registration number")
+        self.search_input.returnPressed.connect(self.apply_filter)
+        search_layout.addWidget(self.search_input)
+        search_button = QPushButton("Search")
+        search_button.clicked.connect(self.apply_filter)
+        search_layout.addWidget(search_button)
+        clear_button = QPushButton("Clear")
+        clear_button.clicked.connect(self.clear_filter)
+        search_layout.addWidget(clear_button)
+        main_layout.addWidget(search_widget)
+        
+        # Denied transactions are paged in from the ledger as the table is scrolled
+        try:
+            self.denied_model = DeniedTableModel(open_ledger(), self)
+        except Exception as e:
+            self.denied_model = None
+            error_label = QLabel(f"Error loading denied transactions: {str(e)}")
+            error_label.setStyleSheet("font-size: 16px; color: #e74c3c; margin: 50px 0;")
+            error_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            main_layout.addWidget(error_label)
+        
+        if self.denied_model is not None:
+            self.denied_view = QTableView()
+            self.denied_view.setModel(self.denied_model)
+            self.denied_view.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+            self.denied_view.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+            self.denied_view.verticalHeader().setVisible(False)
+            self.denied_view.horizontalHeader().setStretchLastSection(True)
+            self.denied_view.setStyleSheet("""
+                background-color: #ffebee;
+                font-family: monospace;
+                font-size: 14px;
+                color: #000000;
+            """)
+            self.denied_view.selectionModel().currentRowChanged.connect(self.show_transaction)
+            main_layout.addWidget(self.denied_view)
+            
+            self.status_label = QLabel("")
+            self.status_label.setStyleSheet("font-size: 14px; color: #666666;")
+            main_layout.addWidget(self.status_label)
+            
+            # Details of the selected transaction
+            self.transaction_display = QTextEdit()
+            self.transaction_display.setReadOnly(True)
+            self.transaction_display.setStyleSheet("""
+                background-color: transparent;
+                border: 1px solid #ef9a9a;
+                font-family: monospace;
+                font-size: 14px;
+                color: #000000;
+            """)
+            self.transaction_display.setMaximumHeight(150)
+            main_layout.addWidget(self.transaction_display)
+            self.update_status()
         
         # Back button
         back_button = QPushButton("Back to Main Menu")
@@ -1506,6 +1720,30 @@ class DeniedTransactionsWindow(QMainWindow):
         """)
         main_layout.addWidget(back_button, alignment=Qt.AlignmentFlag.AlignCenter)
     
+    def apply_filter(self):
+        if self.denied_model is not None:
+            self.denied_model.set_filter(self.search_input.text())
+            self.transaction_display.clear()
+            self.update_status()
+    
+    def clear_filter(self):
+        self.search_input.clear()
+        self.apply_filter()
+    
+    def update_status(self):
+        model = self.denied_model
+        if model.query:
+            self.status_label.setText(f"Showing matches for '{model.query}', more are loaded as you scroll")
+        elif model.total:
+            self.status_label.setText(f"{model.total} denied transactions")
+        else:
+            self.status_label.setText("No denied transactions have been recorded yet")
+    
+    def show_transaction(self, current, previous):
+        if current.isValid():
+            transaction_text = self.denied_model.transaction(current.row()).replace(',', '\n')
+            self.transaction_display.setText(self._format_transaction_text(transaction_text))
+    
     def _format_transaction_text(self, transaction_text):
         """Format transaction text for better display"""
         # Split by lines
@@ -1541,14 +1779,11 @@ class Block:
         self.verified_transactions = []  # List to store multiple transactions
         self.previous_block_hash = ""
         self.Nonce = ""
-        self.max_transactions = 5  # Maximum number of transactions per block
+        self.max_transactions = MAX_BLOCK_TRANSACTIONS  # Maximum number of transactions per block
 
 
 # Main application entry point
 if __name__ == "__main__":
-    # Initialize transaction counter from existing data
-    CertificateAuthorityWindow.load_transaction_counter()
-    
     app = QApplication(sys.argv)
     window = BlockchainApp()
     window.show()
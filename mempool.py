@@ -0,0 +1,234 @@
+import argparse
+import os
+
+from transactions import registration_number, transaction_number
+
+POOL_PATH = "vehicle_information.txt"
+# Compact once at least this many removed entries outnumber the live ones
+COMPACT_MIN_DEAD = 1000
+
+
+class Mempool:
+    """Pending transactions kept in an append-only log.
+
+    vehicle_information.txt stays a plain file with one transaction per line,
+    but it is only ever appended to. Removing a transaction appends the byte
+    offset of its line to vehicle_information.txt.removed, a tombstone file,
+    instead of rewriting the pool. Live transactions are held in dicts keyed by
+    offset, transaction number and registration number, and new lines written
+    by other processes are picked up by reading the tail of the log.
+
+    The tombstone file starts with the inode of the log it belongs to, so
+    tombstones left over from an interrupted compaction are ignored.
+    """
+
+    def __init__(self, path=POOL_PATH, tombstone_path=None, compact_min_dead=COMPACT_MIN_DEAD):
+        self.path = path
+        self.tombstone_path = tombstone_path or path + ".removed"
+        self.compact_min_dead = compact_min_dead
+        self._reset()
+
+    def _reset(self):
+        self._entries = {}  # log offset -> line, in log order
+        self._by_tx = {}  # transaction number -> log offset
+        self._by_reg = {}  # registration number -> log offset
+        self._removed = set()  # tombstoned log offsets
+        self._log_inode = None
+        self._log_size = 0
+        self._tombstone_size = 0
+
+    @property
+    def dead(self):
+        """Number of removed lines still taking space in the log"""
+        return len(self._removed)
+
+    def refresh(self):
+        """Read lines and tombstones appended since the last refresh"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._reset()
+            return
+        if stat.st_ino != self._log_inode or stat.st_size < self._log_size:
+            # The log was replaced or truncated by someone else, start over
+            self._reset()
+            self._log_inode = stat.st_ino
+        if stat.st_size > self._log_size:
+            self._read_log()
+        self._read_tombstones()
+
+    def _read_log(self):
+        with open(self.path, "rb") as f:
+            f.seek(self._log_size)
+            offset = self._log_size
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    # Line still being written, pick it up on the next refresh
+                    break
+                line = raw.decode('utf-8').rstrip("\r\n")
+                if line.strip() and offset not in self._removed:
+                    self._insert(offset, line)
+                offset += len(raw)
+            self._log_size = offset
+
+    def _read_tombstones(self):
+        try:
+            with open(self.tombstone_path, "r") as f:
+                if f.readline().strip() != f"log {self._log_inode}":
+                    return
+                if self._tombstone_size:
+                    f.seek(self._tombstone_size)
+                for line in iter(f.readline, ""):
+                    if not line.endswith("\n"):
+                        break
+                    self._drop(int(line))
+                    self._tombstone_size = f.tell()
+        except FileNotFoundError:
+            pass
+
+    def _insert(self, offset, line):
+        self._entries[offset] = line
+        tx_no = transaction_number(line)
+        if tx_no is not None:
+            self._by_tx[tx_no] = offset
+        reg_no = registration_number(line)
+        if reg_no:
+            self._by_reg[reg_no] = offset
+
+    def _drop(self, offset):
+        self._removed.add(offset)
+        line = self._entries.pop(offset, None)
+        if line is None:
+            return
+        tx_no = transaction_number(line)
+        if self._by_tx.get(tx_no) == offset:
+            del self._by_tx[tx_no]
+        reg_no = registration_number(line)
+        if self._by_reg.get(reg_no) == offset:
+            del self._by_reg[reg_no]
+
+    def __len__(self):
+        self.refresh()
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self.transactions())
+
+    def transactions(self):
+        """Live transaction lines in the order they were submitted"""
+        self.refresh()
+        return list(self._entries.values())
+
+    def get(self, tx_no):
+        """The pending transaction with this number, or None"""
+        self.refresh()
+        offset = self._by_tx.get(tx_no)
+        return None if offset is None else self._entries[offset]
+
+    def by_registration(self, reg_no):
+        """The pending transaction for a car registration number, or None"""
+        self.refresh()
+        offset = self._by_reg.get(reg_no)
+        return None if offset is None else self._entries[offset]
+
+    def add(self, line):
+        """Append a transaction line to the pool"""
+        self.add_many([line])
+
+    def add_many(self, lines, sync=False):
+        """Append transaction lines with one write, and one fsync if sync is set"""
+        with open(self.path, "a") as f:
+            f.write("".join(line.rstrip("\n") + "\n" for line in lines))
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        if self._log_inode is not None:
+            self.refresh()
+
+    def _offset_of(self, line):
+        offset = self._by_tx.get(transaction_number(line))
+        if offset is not None and self._entries[offset] == line:
+            return offset
+        # Lines without a usable transaction number need a scan
+        for offset, entry in self._entries.items():
+            if entry == line:
+                return offset
+        return None
+
+    def remove(self, line):
+        """Remove one transaction line, returns False if it is not in the pool"""
+        return self.remove_many([line]) == 1
+
+    def remove_many(self, lines):
+        """Remove transaction lines with one tombstone write, returns how many were removed"""
+        self.refresh()
+        offsets = []
+        for line in lines:
+            offset = self._offset_of(line)
+            if offset is not None:
+                self._drop(offset)
+                offsets.append(offset)
+        if offsets:
+            self._write_tombstones(offsets)
+            self.maybe_compact()
+        return len(offsets)
+
+    def _write_tombstones(self, offsets):
+        try:
+            with open(self.tombstone_path, "r") as f:
+                current = f.readline().strip() == f"log {self._log_inode}"
+        except FileNotFoundError:
+            current = False
+        with open(self.tombstone_path, "a" if current else "w") as f:
+            if not current:
+                f.write(f"log {self._log_inode}\n")
+                self._tombstone_size = 0
+            f.write("".join(f"{offset}\n" for offset in offsets))
+
+    def sync(self):
+        """fsync the pool log and the tombstone file"""
+        for path in (self.path, self.tombstone_path):
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    os.fsync(f.fileno())
+
+    def maybe_compact(self):
+        """Compact when removed lines take more space than live ones"""
+        if self.dead >= self.compact_min_dead and self.dead > len(self._entries):
+            self.compact()
+            return True
+        return False
+
+    def compact(self):
+        """Rewrite the log with only the live transactions and drop the tombstones"""
+        tmp_path = self.path + ".tmp"
+        while True:
+            self.refresh()
+            size = self._log_size
+            with open(tmp_path, "w") as f:
+                f.write("".join(line + "\n" for line in self._entries.values()))
+                f.flush()
+                os.fsync(f.fileno())
+            # Retry if another process appended while the new log was written
+            if not os.path.exists(self.path) or os.path.getsize(self.path) == size:
+                break
+        os.replace(tmp_path, self.path)
+        # The new log has a new inode, so the old tombstones no longer apply
+        if os.path.exists(self.tombstone_path):
+            os.remove(self.tombstone_path)
+        self._reset()
+        self.refresh()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show or compact the pending transaction pool")
+    parser.add_argument("--path", default=POOL_PATH, help="pending transaction log")
+    parser.add_argument("--compact", action="store_true", help="drop removed transactions from the log")
+    args = parser.parse_args()
+    pool = Mempool(args.path)
+    if args.compact:
+        # Writers of the pool must not append while the log is replaced
+        from file_lock import write_lock
+        with write_lock():
+            pool.compact()
+    print(f"{len(pool)} pending transactions, {pool.dead} removed lines in {args.path}")
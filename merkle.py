@@ -0,0 +1,65 @@
+import hashlib
+
+# Leaves and inner nodes are hashed with different prefixes so an inner node
+# can never be passed off as a transaction
+_LEAF = b'\x00'
+_NODE = b'\x01'
+
+
+def leaf_hash(transaction):
+    return hashlib.sha256(_LEAF + transaction.encode('utf-8')).digest()
+
+
+def _node_hash(left, right):
+    return hashlib.sha256(_NODE + left + right).digest()
+
+
+def _next_level(level):
+    if len(level) % 2:
+        # Odd number of nodes, pair the last one with itself
+        level = level + [level[-1]]
+    return [_node_hash(level[i], level[i + 1]) for i in range(0, len(level), 2)]
+
+
+def merkle_root(transactions):
+    """Hex Merkle root of a list of transaction strings"""
+    level = [leaf_hash(t) for t in transactions]
+    if not level:
+        return hashlib.sha256(b'').hexdigest()
+    while len(level) > 1:
+        level = _next_level(level)
+    return level[0].hex()
+
+
+def merkle_proof(transactions, index):
+    """Inclusion proof for transactions[index] as a list of (sibling hash, side).
+
+    side is "left" or "right" and tells which side the sibling goes on when
+    hashing up towards the root.
+    """
+    if not 0 <= index < len(transactions):
+        raise IndexError(f"No transaction at position {index}")
+    level = [leaf_hash(t) for t in transactions]
+    proof = []
+    while len(level) > 1:
+        if len(level) % 2:
+            level = level + [level[-1]]
+        if index % 2:
+            proof.append((level[index - 1].hex(), "left"))
+        else:
+            proof.append((level[index + 1].hex(), "right"))
+        level = _next_level(level)
+        index //= 2
+    return proof
+
+
+def verify_proof(transaction, proof, root):
+    """Check that a transaction is part of the block with this Merkle root"""
+    current = leaf_hash(transaction)
+    for sibling, side in proof:
+        sibling = bytes.fromhex(sibling)
+        if side == "left":
+            current = _node_hash(sibling, current)
+        else:
+            current = _node_hash(current, sibling)
+    return current.hex() == root
@@ -1,8 +1,12 @@
 from tkinter import ttk
 from tkinter import *
 from hashlib import sha256
-import pyscrypt
-import os
+import time
+from mining_engine import MiningEngine
+from retarget import next_difficulty
+from block_store import block_header, make_block
+from ledger import open_ledger
+from merkle import merkle_root
 
 
 
@@ -10,11 +14,9 @@ class Miner:
     blocknumber = 0
 
     def __init__(self, window, master, last_hash):
-        if (os.path.exists("vehicle_information.txt")):
-            f = open("vehicle_information.txt", "r")
-            transactions = f.read().split('\n')
-            transactions.pop()
-            f.close()
+        self.ledger = open_ledger()
+        transactions = self.ledger.pending()
+        if (transactions):
             window.title("Transactions")
             l = Label(window, text="Verify Transaction")
             T = Text(window, height=5, width=52)
@@ -83,18 +85,11 @@ class Miner:
             window.destroy()
         root.deiconify()
 
-    def SCRYPT(self, text):
-        salt = os.urandom(8) #initially 8
-        b = bytes(text, 'utf-8')
-        digest = pyscrypt.hash(b, salt, 8, 2, 1, 32)
-        return str(digest.hex())
-
     def mine(self, transactions, transaction, last_hash, window, master, root):
         if (self.b['text'] == "EXIT"):
             self.exit(root, master, window)
         else:
-            difficulty = 2 #initially 2
-            prefix_str = '0' * difficulty
+            difficulty = next_difficulty(self.ledger) # leading zero bits
             self.b["state"] = 'disabled'
             self.T.configure(state='normal')
             self.T.delete('1.0', 'end')
@@ -102,33 +97,29 @@ class Miner:
             self.T.configure(state='disabled')
             self.T.update_idletasks()
             self.b.update_idletasks()
-            Miner.blocknumber += 1
-            for nonce in range(10000000000):
-                mine_string = transaction + str(last_hash) + str(Miner.blocknumber)
-                text = mine_string + str(nonce)
-                new_h = self.SCRYPT(text)
-                if new_h.startswith(prefix_str):
-                    print("Successfully mined with nonce:", nonce)
-                    self.new_hash = new_h
-                    file = open("blocks.txt", "a+")
-                    file.write("Block number: " + str(Miner.blocknumber) + ", ")
-                    file.write("Transaction: {" + transaction.replace('\n', ',') + "}, ")
-                    file.write("Nonce: " + str(nonce) + ", ")
-                    file.write("Hash: " + str(new_h) + "\n")
-                    file.close()
-                    transactions.pop(self.count)
-                    string = '\n'.join(transactions)
-                    file = open("vehicle_information.txt", "w+")
-                    file.write(string + "\n")
-                    file.close()
-                    last_hash = str(new_h)
-                    self.T.configure(state='normal')
-                    self.T.insert(INSERT, "\nNONCE: " + str(nonce))
-                    self.T.insert(END, "\nNEW HASH: " + str(new_h))
-                    self.T.configure(state='disabled')
-                    self.b["state"] = 'normal'
-                    self.b['text'] = "EXIT"
-                    return
+            Miner.blocknumber = len(self.ledger)
+            # Only the fixed-size block header is hashed
+            timestamp = round(time.time(), 3)
+            header = block_header(str(last_hash), merkle_root([transactions[self.count]]),
+                                  Miner.blocknumber, timestamp, difficulty)
+            engine = MiningEngine()
+            result = engine.mine(header, difficulty)
+            if result is not None:
+                nonce, new_h = result
+                print("Successfully mined with nonce:", nonce)
+                self.new_hash = new_h
+                block = make_block(Miner.blocknumber, str(last_hash), [transactions[self.count]], nonce, new_h,
+                                   timestamp, difficulty, engine.hasher.spec())
+                self.ledger.commit_block(block, [transactions[self.count]])
+                transactions.pop(self.count)
+                last_hash = str(new_h)
+                self.T.configure(state='normal')
+                self.T.insert(INSERT, "\nNONCE: " + str(nonce))
+                self.T.insert(END, "\nNEW HASH: " + str(new_h))
+                self.T.configure(state='disabled')
+                self.b["state"] = 'normal'
+                self.b['text'] = "EXIT"
+                return
             # raise BaseException("Max limit exceeded")
             self.T.configure(state='normal')
             self.T.insert(END, "\nMax limit exceeded")
@@ -0,0 +1,134 @@
+import argparse
+import threading
+import time
+
+from block_builder import BATCH_MAX_BYTES, BATCH_MAX_TRANSACTIONS, mine_block, select_batch, validate_batch
+from mining_engine import MiningEngine
+from pow_hash import DEFAULT_BACKEND, get_hasher
+from retarget import next_difficulty
+
+# Seconds between checks of an empty pending pool
+POLL_INTERVAL = 2.0
+
+
+class MinerDaemon:
+    """Mines the pending pool into the chain without any window.
+
+    Each round takes a batch from the front of the pool, drops transactions
+    that fail validation, mines the rest as one block on top of the chain tip
+    and commits it through the ledger, which also removes them from the pool.
+    Rejected transactions are skipped in later rounds, or moved to the denied
+    transactions with deny_rejected. observer, if given, is called with a
+    report dict after every round that mined or rejected something, which is
+    how a GUI or a log can follow the daemon.
+    """
+
+    def __init__(self, ledger=None, workers=None, hasher=None, difficulty=None,
+                 max_transactions=BATCH_MAX_TRANSACTIONS, max_bytes=BATCH_MAX_BYTES,
+                 deny_rejected=False, observer=None):
+        if ledger is None:
+            from ledger import open_ledger
+            ledger = open_ledger()
+        self.ledger = ledger
+        self.engine = MiningEngine(workers=workers, hasher=hasher)
+        self.difficulty = difficulty
+        self.max_transactions = max_transactions
+        self.max_bytes = max_bytes
+        self.deny_rejected = deny_rejected
+        self.observer = observer
+        self.skipped = set()
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Stop after the current round, a running nonce search is cancelled"""
+        self._stop.set()
+        self.engine.cancel()
+
+    def _notify(self, report):
+        if self.observer is not None:
+            self.observer(report)
+
+    def candidates(self):
+        """Pending transactions that haven't been rejected yet"""
+        return [t for t in self.ledger.pending() if t not in self.skipped]
+
+    def mine_once(self):
+        """Mine one block from the pending pool, returns it or None if nothing was mined"""
+        batch = select_batch(self.candidates(), self.max_transactions, self.max_bytes)
+        if not batch:
+            return None
+        accepted, rejected = validate_batch(batch, self.ledger)
+        for transaction, _ in rejected:
+            if self.deny_rejected:
+                self.ledger.deny(transaction)
+            else:
+                self.skipped.add(transaction)
+        if not accepted:
+            self._notify({"block": None, "rejected": rejected})
+            return None
+
+        started = time.monotonic()
+        difficulty = self.difficulty if self.difficulty is not None else next_difficulty(self.ledger)
+        block = mine_block(self.ledger, accepted, difficulty, self.engine)
+        if block is None:
+            return None
+        try:
+            self.ledger.commit_block(block, accepted)
+        except ValueError as e:
+            # Another miner extended the chain or mined some of the batch first,
+            # the batch is validated again and retried on the new tip
+            print(f"Block {block['height']} was not committed: {e}")
+            return None
+        elapsed = time.monotonic() - started
+        self._notify({"block": block, "rejected": rejected, "seconds": elapsed,
+                      "rate": len(accepted) / elapsed if elapsed > 0 else 0.0})
+        return block
+
+    def run(self, max_blocks=None, poll_interval=POLL_INTERVAL):
+        """Mine until stopped, or until max_blocks blocks were mined. Returns the number mined"""
+        self._stop.clear()
+        # A stop() of an earlier run cancelled the engine
+        self.engine.reset()
+        mined = 0
+        while not self._stop.is_set() and (max_blocks is None or mined < max_blocks):
+            if self.mine_once() is not None:
+                mined += 1
+            elif max_blocks is not None and not self.candidates():
+                break
+            else:
+                self._stop.wait(poll_interval)
+        return mined
+
+
+def print_report(report):
+    for transaction, reason in report["rejected"]:
+        print(f"Rejected ({reason}): {transaction}")
+    block = report["block"]
+    if block is not None:
+        print(f"Mined block {block['height']} {block['hash']} with {len(block['transactions'])} transactions "
+              f"in {report['seconds']:.2f}s ({report['rate']:,.1f} transactions/sec)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mine the pending transactions without the GUI")
+    parser.add_argument("--workers", type=int, default=None, help="mining processes, one per core by default")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND, help="proof-of-work backend from pow_hash.py")
+    parser.add_argument("--difficulty", type=float, default=None, help="fixed difficulty, retargeted by default")
+    parser.add_argument("--batch-size", type=int, default=BATCH_MAX_TRANSACTIONS, help="transactions per block")
+    parser.add_argument("--max-bytes", type=int, default=BATCH_MAX_BYTES, help="transaction bytes per block")
+    parser.add_argument("--blocks", type=int, default=None,
+                        help="stop after this many blocks or when the pool is empty, runs until Ctrl+C by default")
+    parser.add_argument("--poll", type=float, default=POLL_INTERVAL, help="seconds between checks of an empty pool")
+    parser.add_argument("--deny-rejected", action="store_true",
+                        help="move transactions that fail validation to the denied transactions")
+    args = parser.parse_args()
+
+    daemon = MinerDaemon(workers=args.workers, hasher=get_hasher(args.backend), difficulty=args.difficulty,
+                         max_transactions=args.batch_size, max_bytes=args.max_bytes,
+                         deny_rejected=args.deny_rejected, observer=print_report)
+    try:
+        mined = daemon.run(args.blocks, args.poll)
+    except KeyboardInterrupt:
+        daemon.stop()
+    else:
+        print(f"{mined} blocks mined")
@@ -0,0 +1,122 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from pow_hash import expected_attempts, get_hasher, target_bytes
+
+MAX_NONCE = 10000000000
+# Nonces a worker tries between looks at the clock
+CHECK_INTERVAL = 64
+# Seconds between a worker's progress updates and checks of the stop event
+CHECK_SECONDS = 0.05
+# Seconds between progress reports while a search is running
+PROGRESS_INTERVAL = 0.5
+
+# Shared with the parent through the pool initializer: the stop event and one
+# nonces-tried counter per worker in shared memory
+_stop_event = None
+_progress = None
+
+
+def _init_worker(stop_event, progress):
+    global _stop_event, _progress
+    _stop_event = stop_event
+    _progress = progress
+
+
+def search_nonces(hasher, header, target, offset, stride, max_nonce=MAX_NONCE):
+    """Try nonces offset, offset + stride, ... until a digest is below target or another worker wins.
+
+    The clock is read every CHECK_INTERVAL nonces, and the shared counter and
+    stop event are only touched every CHECK_SECONDS, so a slow hasher still
+    stops promptly and a fast one spends its time hashing.
+    """
+    hash_nonce = hasher.bind(header)
+    stop_event, progress = _stop_event, _progress
+    monotonic = time.monotonic
+    next_check = monotonic() + CHECK_SECONDS
+    tried = 0
+    for nonce in range(offset, max_nonce, stride):
+        digest = hash_nonce(nonce)
+        tried += 1
+        # Byte strings of equal length compare like big-endian integers
+        if digest < target:
+            progress[offset] = tried
+            return nonce, digest.hex()
+        if tried % CHECK_INTERVAL == 0 and monotonic() >= next_check:
+            progress[offset] = tried
+            if stop_event.is_set():
+                return None
+            next_check = monotonic() + CHECK_SECONDS
+    progress[offset] = tried
+    return None
+
+
+class MiningEngine:
+    """Split the nonce space into disjoint strided ranges, one worker process per core"""
+
+    def __init__(self, workers=None, hasher=None, max_nonce=MAX_NONCE):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.hasher = hasher or get_hasher()
+        self.max_nonce = max_nonce
+        self.cancelled = False
+        self._stop_event = None
+
+    def cancel(self):
+        """Ask every worker to stop at its next check"""
+        self.cancelled = True
+        stop_event = self._stop_event
+        if stop_event is not None:
+            stop_event.set()
+
+    def reset(self):
+        """Let mine() search again after a cancel, which otherwise stops every later search"""
+        self.cancelled = False
+
+    def mine(self, header, difficulty, progress_callback=None):
+        """Search for a nonce that gives the header `difficulty` leading zero bits.
+
+        progress_callback, if given, is called every PROGRESS_INTERVAL seconds with
+        (nonces tried, hashes per second, estimated seconds remaining).
+        Returns (nonce, hash) from the first worker that succeeds, or None if the
+        nonce space is exhausted or the search was cancelled.
+        """
+        target = target_bytes(difficulty)
+        expected = expected_attempts(difficulty)
+        result = None
+        start_time = time.monotonic()
+        # Plain shared memory, each worker only writes its own slot so no lock is needed
+        progress = multiprocessing.RawArray('Q', self.workers)
+        self._stop_event = multiprocessing.Event()
+        if self.cancelled:
+            self._stop_event.set()
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                     initargs=(self._stop_event, progress)) as executor:
+                pending = {
+                    executor.submit(search_nonces, self.hasher, header, target, offset,
+                                    self.workers, self.max_nonce)
+                    for offset in range(self.workers)
+                }
+                try:
+                    while pending and result is None:
+                        done, pending = wait(pending, timeout=PROGRESS_INTERVAL,
+                                             return_when=FIRST_COMPLETED)
+                        for future in done:
+                            found = future.result()
+                            if found is not None:
+                                result = found
+                                break
+                        if progress_callback is not None:
+                            tried = sum(progress[:])
+                            elapsed = time.monotonic() - start_time
+                            rate = tried / elapsed if elapsed > 0 else 0.0
+                            eta = max(0, expected - tried) / rate if rate > 0 else float('inf')
+                            progress_callback(tried, rate, eta)
+                finally:
+                    # Tell the remaining workers to stop before the pool shuts down
+                    self._stop_event.set()
+        finally:
+            self._stop_event = None
+        return result
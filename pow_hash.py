@@ -0,0 +1,204 @@
+import argparse
+import hashlib
+import struct
+import time
+
+# Default proof-of-work backend and scrypt cost parameters (same as the original pyscrypt call)
+DEFAULT_BACKEND = 'scrypt'
+SCRYPT_N = 8
+SCRYPT_R = 2
+SCRYPT_P = 1
+DIGEST_SIZE = 32
+# The nonce is appended to the header as a fixed-width little-endian integer
+NONCE = struct.Struct('<Q')
+# Difficulty is the number of leading zero bits required in the digest, 8 bits
+# is the same work as the old two leading hex zeros
+DEFAULT_DIFFICULTY = 8
+MAX_TARGET = (1 << (DIGEST_SIZE * 8)) - 1
+
+
+def target_from_difficulty(difficulty):
+    """256-bit integer target for a difficulty in leading zero bits, fractions allowed"""
+    if difficulty <= 0:
+        return MAX_TARGET
+    return min(MAX_TARGET, int(2 ** (DIGEST_SIZE * 8 - difficulty)))
+
+
+def target_bytes(difficulty):
+    """The target as big-endian digest bytes, a digest meets it if digest < target"""
+    return target_from_difficulty(difficulty).to_bytes(DIGEST_SIZE, 'big')
+
+
+def meets_target(digest, target):
+    """Compare raw digest bytes with a target from target_bytes(), no hex conversion"""
+    return digest < target
+
+
+def expected_attempts(difficulty):
+    """Average number of hashes needed to meet the difficulty"""
+    return 2 ** max(0, difficulty)
+
+
+def header_salt(header):
+    """Derive the salt from the block header so every hash can be re-verified"""
+    return hashlib.sha256(b'pow-salt:' + header).digest()[:16]
+
+
+class PowHasher:
+    """Base class for proof-of-work hash backends.
+
+    A block is hashed as header + nonce, where the header is the constant part of the
+    mining preimage and the nonce is packed as an 8 byte little-endian integer.
+    """
+    name = None
+
+    def digest(self, data, salt):
+        raise NotImplementedError
+
+    def spec(self):
+        """Short text description stored with each block, e.g. 'scrypt:8:2:1'"""
+        return self.name
+
+    def hash(self, header, nonce):
+        return self.digest(header + NONCE.pack(nonce), header_salt(header))
+
+    def bind(self, header):
+        """Return a nonce -> digest function for a fixed header, used by the mining loop.
+
+        The header and salt are prepared once and each nonce is packed into a
+        preallocated buffer, so the loop does no string building.
+        """
+        salt = header_salt(header)
+        offset = len(header)
+        buf = bytearray(offset + NONCE.size)
+        buf[:offset] = header
+        pack_into = NONCE.pack_into
+        digest = self.digest
+
+        def hash_nonce(nonce):
+            pack_into(buf, offset, nonce)
+            return digest(buf, salt)
+        return hash_nonce
+
+    def hexdigest(self, header, nonce):
+        return self.hash(header, nonce).hex()
+
+    def verify(self, header, nonce, expected_hex, difficulty=None):
+        """Check the stored hash and, when given, that it meets the difficulty"""
+        digest = self.hash(header, nonce)
+        if digest.hex() != expected_hex:
+            return False
+        return difficulty is None or meets_target(digest, target_bytes(difficulty))
+
+
+class ScryptHasher(PowHasher):
+    """scrypt through hashlib, which is backed by OpenSSL"""
+    name = 'scrypt'
+
+    def __init__(self, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P):
+        self.n = int(n)
+        self.r = int(r)
+        self.p = int(p)
+
+    def spec(self):
+        return f"{self.name}:{self.n}:{self.r}:{self.p}"
+
+    def digest(self, data, salt):
+        return hashlib.scrypt(data, salt=salt, n=self.n, r=self.r, p=self.p, dklen=DIGEST_SIZE)
+
+
+class PyScryptHasher(ScryptHasher):
+    """The original pure-Python scrypt implementation, kept for comparison"""
+    name = 'pyscrypt'
+
+    def digest(self, data, salt):
+        import pyscrypt
+        return pyscrypt.hash(bytes(data), salt, self.n, self.r, self.p, DIGEST_SIZE)
+
+
+class DoubleSha256Hasher(PowHasher):
+    """SHA256(SHA256(data)) as used by Bitcoin, the salt is not needed"""
+    name = 'sha256d'
+
+    def digest(self, data, salt):
+        return hashlib.sha256(hashlib.sha256(data).digest()).digest()
+
+    def bind(self, header):
+        # Midstate: absorb the constant header once and copy the hash object per nonce
+        midstate = hashlib.sha256(header)
+        buf = bytearray(NONCE.size)
+        pack_into = NONCE.pack_into
+        sha256 = hashlib.sha256
+
+        def hash_nonce(nonce):
+            pack_into(buf, 0, nonce)
+            inner = midstate.copy()
+            inner.update(buf)
+            return sha256(inner.digest()).digest()
+        return hash_nonce
+
+
+HASHERS = {
+    ScryptHasher.name: ScryptHasher,
+    PyScryptHasher.name: PyScryptHasher,
+    DoubleSha256Hasher.name: DoubleSha256Hasher,
+}
+
+
+def get_hasher(name=DEFAULT_BACKEND, **params):
+    """Create a hasher by backend name, scrypt backends accept n, r and p"""
+    if name not in HASHERS:
+        raise ValueError(f"Unknown proof-of-work backend: {name}")
+    return HASHERS[name](**params)
+
+
+def hasher_from_spec(spec):
+    """Rebuild the hasher described by PowHasher.spec()"""
+    parts = spec.split(':')
+    if parts[0] in (ScryptHasher.name, PyScryptHasher.name) and len(parts) == 4:
+        return get_hasher(parts[0], n=parts[1], r=parts[2], p=parts[3])
+    return get_hasher(parts[0])
+
+
+def benchmark(hasher, seconds=2.0, bound=True):
+    """Return the single-core hashes/sec of a backend.
+
+    With bound=True the header is prepared once through bind(), as the miner does.
+    """
+    header = b'benchmark header' * 8
+    if bound:
+        hash_nonce = hasher.bind(header)
+    else:
+        hash_nonce = lambda nonce: hasher.hash(header, nonce)
+    count = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while True:
+        hash_nonce(count)
+        count += 1
+        if count % 16 == 0 and time.perf_counter() >= deadline:
+            break
+    return count / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare hashes/sec of the proof-of-work backends")
+    parser.add_argument("--seconds", type=float, default=2.0, help="time spent on each backend")
+    parser.add_argument("--backends", nargs="*", default=list(HASHERS), help="backends to benchmark")
+    parser.add_argument("-N", type=int, default=SCRYPT_N, help="scrypt CPU/memory cost")
+    parser.add_argument("-r", type=int, default=SCRYPT_R, help="scrypt block size")
+    parser.add_argument("-p", type=int, default=SCRYPT_P, help="scrypt parallelism")
+    args = parser.parse_args()
+
+    for name in args.backends:
+        if name in (ScryptHasher.name, PyScryptHasher.name):
+            hasher = get_hasher(name, n=args.N, r=args.r, p=args.p)
+        else:
+            hasher = get_hasher(name)
+        try:
+            direct = benchmark(hasher, args.seconds, bound=False)
+            bound = benchmark(hasher, args.seconds, bound=True)
+        except ImportError as e:
+            print(f"{hasher.spec():<20} skipped ({e})")
+            continue
+        print(f"{hasher.spec():<20} {direct:>14,.0f} hashes/sec, {bound:>14,.0f} hashes/sec with bind()")
@@ -0,0 +1,264 @@
+import argparse
+import json
+import os
+import sqlite3
+
+from block_store import open_block_store
+from bloom import BloomFilter, file_stamp, read_signature
+from file_lock import LEDGER_LOCK_PATH, SQLITE_BUSY_TIMEOUT, write_lock
+from mempool import Mempool
+from merkle import merkle_proof
+from transactions import registration_number, transaction_number
+
+INDEX_PATH = "registrations.db"
+BLOOM_PATH = "registrations.bloom"
+PENDING_PATH = "vehicle_information.txt"
+
+PENDING = "pending"
+CHAIN = "chain"
+
+# Bloom filters kept in memory for the life of the process, by file path, as
+# (file stamp, signature, write lock hold it was last checked in, filter)
+_bloom_cache = {}
+
+
+class RegistrationIndex:
+    """Persistent registration number -> (location, block height) index.
+
+    location is "pending" for registrations waiting in vehicle_information.txt
+    (height is None) or "chain" once they have been mined. The index is kept up
+    to date on every append, so duplicate checks are a single key lookup.
+
+    A Bloom filter over every indexed registration sits in front of the table.
+    Most lookups are for new registrations, and those are answered from memory
+    without opening the database.
+    """
+
+    def __init__(self, path=INDEX_PATH, bloom_path=BLOOM_PATH):
+        self.path = path
+        self.bloom_path = bloom_path
+        self._conn = None
+
+    @property
+    def conn(self):
+        # Connect lazily so filter-only lookups never open the database
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT)
+            # Readers in other processes keep reading while a writer commits
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS registrations (
+                reg_no TEXT PRIMARY KEY,
+                location TEXT NOT NULL,
+                height INTEGER,
+                tx_no INTEGER
+            ) WITHOUT ROWID""")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+            self._conn.commit()
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def bloom(self):
+        """The in-memory Bloom filter, reloaded if another process changed the file.
+
+        A lookup only stats the file. A stale filter can only call a
+        registration new, and writers check again under the ledger's write
+        lock, where the first lookup of each hold also reads the key count in
+        the file's header, which every added key changes.
+        """
+        cached = _bloom_cache.get(self.bloom_path)
+        lock = write_lock()
+        hold = lock.holds if lock.held() else None
+        try:
+            stamp = file_stamp(self.bloom_path)
+        except OSError:
+            return self.rebuild_bloom()
+        if cached is not None and cached[0] == stamp and (hold is None or cached[2] == hold):
+            return cached[3]
+        try:
+            signature = read_signature(self.bloom_path)
+        except (OSError, ValueError):
+            return self.rebuild_bloom()
+        if cached is not None and cached[1] == signature:
+            bloom = cached[3]
+        else:
+            try:
+                bloom = BloomFilter.load(self.bloom_path)
+            except (OSError, ValueError):
+                return self.rebuild_bloom()
+        if hold is None and cached is not None:
+            hold = cached[2]
+        _bloom_cache[self.bloom_path] = (stamp, signature, hold, bloom)
+        return bloom
+
+    def _cache_bloom(self, bloom):
+        # After this process wrote the file, so it is current for the rest of the hold
+        lock = write_lock()
+        stamp = file_stamp(self.bloom_path)
+        _bloom_cache[self.bloom_path] = (stamp, (stamp[0], bloom.count), lock.holds if lock.held() else None, bloom)
+
+    def rebuild_bloom(self):
+        """Rebuild the filter from every registration in the index"""
+        count = self.conn.execute("SELECT COUNT(*) FROM registrations").fetchone()[0]
+        keys = (row[0] for row in self.conn.execute("SELECT reg_no FROM registrations"))
+        bloom = BloomFilter.build(keys, self.bloom_path, count)
+        self._cache_bloom(bloom)
+        return bloom
+
+    def _add_to_bloom(self, reg_nos):
+        bloom = self.bloom()
+        bloom.add_many(reg_nos)
+        self._cache_bloom(bloom)
+
+    def might_contain(self, reg_no):
+        """False means the registration is certainly unknown, True needs lookup()"""
+        return reg_no in self.bloom()
+
+    def lookup(self, reg_no):
+        """Return (location, height) for a registration number, or None"""
+        if not self.might_contain(reg_no):
+            return None
+        row = self.conn.execute("SELECT location, height FROM registrations WHERE reg_no = ?",
+                                (reg_no,)).fetchone()
+        return tuple(row) if row else None
+
+    def in_chain(self, reg_no):
+        found = self.lookup(reg_no)
+        return found is not None and found[0] == CHAIN
+
+    def inclusion_proof(self, reg_no, store=None):
+        """Merkle inclusion proof for a mined registration, or None if it is not in the chain.
+
+        The proof can be checked against the block's merkle_root with
+        merkle.verify_proof(result["transaction"], result["proof"], result["merkle_root"]).
+        """
+        found = self.lookup(reg_no)
+        if found is None or found[0] != CHAIN:
+            return None
+        if store is None:
+            store = open_block_store()
+        block = store.get(found[1])
+        for position, transaction in enumerate(block["transactions"]):
+            if registration_number(transaction) == reg_no:
+                return {
+                    "registration": reg_no,
+                    "height": block["height"],
+                    "block_hash": block["hash"],
+                    "merkle_root": block["merkle_root"],
+                    "transaction": transaction,
+                    "position": position,
+                    "proof": merkle_proof(block["transactions"], position),
+                }
+        return None
+
+    def add_pending(self, reg_no, tx_no=None):
+        """Record a new registration in the pending pool"""
+        self.add_pending_many([(reg_no, tx_no)])
+
+    def add_pending_many(self, registrations):
+        """Record [(reg_no, tx_no), ...] in the pending pool in one SQL transaction"""
+        with self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO registrations (reg_no, location, height, tx_no) "
+                                  "VALUES (?, ?, NULL, ?)",
+                                  [(reg_no, PENDING, tx_no) for reg_no, tx_no in registrations])
+        self._add_to_bloom([reg_no for reg_no, _ in registrations])
+
+    def remove_pending(self, reg_no):
+        """Forget a pending registration, e.g. after it was denied"""
+        with self.conn:
+            self.conn.execute("DELETE FROM registrations WHERE reg_no = ? AND location = ?",
+                              (reg_no, PENDING))
+
+    def add_block(self, block):
+        """Mark every registration in a mined block as being in the chain"""
+        with self.conn:
+            reg_nos = self._index_block(block)
+        self._add_to_bloom(reg_nos)
+
+    def _index_block(self, block):
+        rows = []
+        for transaction in block["transactions"]:
+            reg_no = registration_number(transaction)
+            if reg_no:
+                rows.append((reg_no, CHAIN, block["height"], transaction_number(transaction)))
+        self.conn.executemany("INSERT OR REPLACE INTO registrations (reg_no, location, height, tx_no) "
+                              "VALUES (?, ?, ?, ?)", rows)
+        self._set_meta("chain_height", block["height"])
+        return [row[0] for row in rows]
+
+    def sync(self, store, mempool=None):
+        """Catch up with blocks appended since the last sync, and reconcile the
+        pending registrations with the pool.
+
+        Adding to the pool, or denying, writes the pool and then the index, so
+        a crash in between leaves them apart. Registrations in the pool that
+        the index doesn't know are added, and pending ones no longer in the
+        pool are dropped. mempool defaults to the pool at PENDING_PATH.
+        """
+        tip = store.tip()
+        pool = {}
+        for line in mempool if mempool is not None else Mempool(PENDING_PATH):
+            reg_no = registration_number(line)
+            if reg_no:
+                pool[reg_no] = transaction_number(line)
+        added = []
+        with self.conn:
+            # Another process may be syncing too, the second one finds the work done
+            self.conn.execute("BEGIN IMMEDIATE")
+            indexed = self._get_meta("chain_height", -1)
+            if tip is not None and indexed < tip["height"]:
+                for block in store.iter_blocks(indexed + 1):
+                    added.extend(self._index_block(block))
+            pending = {reg_no for (reg_no,) in self.conn.execute(
+                "SELECT reg_no FROM registrations WHERE location = ?", (PENDING,))}
+            missing = pool.keys() - pending
+            self.conn.executemany("INSERT OR IGNORE INTO registrations (reg_no, location, height, tx_no) "
+                                  "VALUES (?, ?, NULL, ?)", [(reg_no, PENDING, pool[reg_no]) for reg_no in missing])
+            self.conn.executemany("DELETE FROM registrations WHERE reg_no = ? AND location = ?",
+                                  [(reg_no, PENDING) for reg_no in pending - pool.keys()])
+            added.extend(missing)
+        if added:
+            self._add_to_bloom(added)
+
+
+def open_registration_index(path=INDEX_PATH, store=None, mempool=None, rebuild_bloom=False):
+    """Open the registration index and bring it up to date with the chain and the pool.
+
+    rebuild_bloom=True rebuilds the Bloom filter from scratch, which drops
+    denied registrations and resizes it for the current number of keys.
+    """
+    index = RegistrationIndex(path)
+    # Syncing writes the Bloom filter file, which only a lock holder may write
+    with write_lock(os.path.join(os.path.dirname(path), LEDGER_LOCK_PATH)):
+        index.sync(store if store is not None else open_block_store(), mempool)
+        if rebuild_bloom or index.bloom().overfull:
+            index.rebuild_bloom()
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print the Merkle inclusion proof of a registration number")
+    parser.add_argument("registration", help="car registration number")
+    args = parser.parse_args()
+    with open_registration_index() as index:
+        proof = index.inclusion_proof(args.registration)
+    if proof is None:
+        print(f"{args.registration} is not in the blockchain")
+    else:
+        print(json.dumps(proof, indent=2))
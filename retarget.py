@@ -0,0 +1,52 @@
+import math
+
+from block_store import open_block_store
+from pow_hash import DEFAULT_DIFFICULTY
+
+# Block time the chain aims for, in seconds
+BLOCK_INTERVAL = 60
+# Number of recent blocks used to measure the hash rate
+RETARGET_WINDOW = 10
+# Largest change in one retarget, in bits (a factor of 4 in work either way)
+MAX_ADJUSTMENT = 2.0
+MIN_DIFFICULTY = 1.0
+MAX_DIFFICULTY = 64.0
+
+
+def read_recent_blocks(store=None, window=RETARGET_WINDOW):
+    """(timestamp, difficulty) of the last `window` blocks, oldest first.
+
+    Blocks without timing, such as the genesis block, are skipped.
+    """
+    if store is None:
+        store = open_block_store()
+    return [(block["timestamp"], block["difficulty"]) for block in store.tail(window)
+            if block.get("timestamp") is not None and block.get("difficulty") is not None]
+
+
+def compute_next_difficulty(timings, block_interval=BLOCK_INTERVAL):
+    """Difficulty in leading zero bits that should make the next block take block_interval.
+
+    The hash rate is estimated as the expected work of the window's blocks
+    (2 ** difficulty each) divided by the time they took.
+    """
+    if len(timings) < 2:
+        return timings[-1][1] if timings else DEFAULT_DIFFICULTY
+    last_difficulty = timings[-1][1]
+    timespan = timings[-1][0] - timings[0][0]
+    if timespan <= 0:
+        new_difficulty = last_difficulty + MAX_ADJUSTMENT
+    else:
+        # The first block only marks the start of the window, its work came before it
+        work = sum(2 ** difficulty for _, difficulty in timings[1:])
+        hash_rate = work / timespan
+        new_difficulty = math.log2(hash_rate * block_interval)
+    new_difficulty = max(last_difficulty - MAX_ADJUSTMENT,
+                         min(last_difficulty + MAX_ADJUSTMENT, new_difficulty))
+    new_difficulty = max(MIN_DIFFICULTY, min(MAX_DIFFICULTY, new_difficulty))
+    return round(new_difficulty, 2)
+
+
+def next_difficulty(store=None, window=RETARGET_WINDOW, block_interval=BLOCK_INTERVAL):
+    """Difficulty for the next block based on the timing of the chain's last blocks"""
+    return compute_next_difficulty(read_recent_blocks(store, window), block_interval)
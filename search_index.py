@@ -0,0 +1,241 @@
+import argparse
+import heapq
+import re
+import sqlite3
+import time
+from collections import Counter
+from itertools import islice
+
+from file_lock import SQLITE_BUSY_TIMEOUT
+from transactions import (CAR_REGISTRATION, LICENSE_NUMBER, MANUFACTURE_YEAR, OWNER_NAME, PSEUDONYM,
+                          VEHICLE_TYPE, parse_transaction)
+
+SEARCH_INDEX_PATH = "search.db"
+# Indexed transaction fields and the small integer stored for each in the postings
+FIELDS = {
+    CAR_REGISTRATION: 1,
+    LICENSE_NUMBER: 2,
+    OWNER_NAME: 3,
+    PSEUDONYM: 4,
+    VEHICLE_TYPE: 5,
+    MANUFACTURE_YEAR: 6,
+}
+DEFAULT_LIMIT = 200
+# Layout of the tables, an index with another version is dropped and rebuilt
+SCHEMA_VERSION = 3
+# A query word that starts more terms than this is read with one sorted range
+# scan, and loaded whole when other words' matches are checked against it
+MERGE_TERMS = 16
+# Matches of the rarest word checked against the other words per statement
+PROBE_BATCH = 256
+
+_WORD_RE = re.compile(r"\w+")
+# Sorts after every term that starts with a given prefix
+_PREFIX_END = "\U0010ffff"
+
+
+def tokenize(value):
+    """Lower-case words of a field value, "KA-01 AB" gives ka, 01 and ab"""
+    return _WORD_RE.findall(value.lower())
+
+
+class SearchIndex:
+    """Inverted index from the words of transaction fields to their place in the chain.
+
+    Every posting is one (term, height, position, field) row in a WITHOUT
+    ROWID table, so the postings of a term can be read newest first by walking
+    its key range backwards, and the read stopped as soon as there are enough
+    results. The key is ascending because blocks are appended in height
+    order, which keeps the pages full.
+    The terms table keeps the number of postings of every term. A query
+    matches transactions that contain a word starting with each of the
+    query's words.
+    """
+
+    def __init__(self, path=SEARCH_INDEX_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT)
+        # Searches in other processes keep reading while a sync commits
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'schema'").fetchone()
+            if row is None or row[0] != SCHEMA_VERSION:
+                # Postings in an older layout, they are rebuilt from the chain by sync()
+                self.conn.execute("DROP TABLE IF EXISTS postings")
+                self.conn.execute("DROP TABLE IF EXISTS terms")
+                self.conn.execute("DELETE FROM meta WHERE key = 'chain_height'")
+                self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('schema', ?)", (SCHEMA_VERSION,))
+            self.conn.execute("CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, height INTEGER NOT NULL, "
+                              "position INTEGER NOT NULL, field INTEGER NOT NULL, "
+                              "PRIMARY KEY (term, height, position, field)) WITHOUT ROWID")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, count INTEGER NOT NULL) "
+                              "WITHOUT ROWID")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def indexed_height(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'chain_height'").fetchone()
+        return -1 if row is None else row[0]
+
+    def _index_block(self, block):
+        rows = set()
+        for position, transaction in enumerate(block["transactions"]):
+            fields = parse_transaction(transaction)
+            for name, field in FIELDS.items():
+                for term in tokenize(fields.get(name, "")):
+                    rows.add((term, field, block["height"], position))
+        self.conn.executemany("INSERT OR IGNORE INTO postings (term, field, height, position) "
+                              "VALUES (?, ?, ?, ?)", rows)
+        self.conn.executemany("INSERT INTO terms VALUES (?, ?) "
+                              "ON CONFLICT (term) DO UPDATE SET count = count + excluded.count",
+                              Counter(row[0] for row in rows).items())
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('chain_height', ?)", (block["height"],))
+
+    def sync(self, ledger):
+        """Index the blocks mined since the last sync, called after every new block"""
+        tip = ledger.tip()
+        if tip is None or self.indexed_height() >= tip["height"]:
+            return
+        with self.conn:
+            # Another process may be syncing too, counting its blocks twice would
+            # double the terms' counts, so check again holding the write lock
+            self.conn.execute("BEGIN IMMEDIATE")
+            indexed = self.indexed_height()
+            for block in ledger.iter_blocks(indexed + 1):
+                self._index_block(block)
+
+    def _expand(self, word):
+        """(word, terms starting with word, their total number of postings).
+
+        terms is None if there are more than MERGE_TERMS of them.
+        """
+        rows = self.conn.execute("SELECT term, count FROM terms WHERE term >= ? AND term < ? LIMIT ?",
+                                 (word, word + _PREFIX_END, MERGE_TERMS + 1)).fetchall()
+        if len(rows) <= MERGE_TERMS:
+            return word, [term for term, _ in rows], sum(count for _, count in rows)
+        count = self.conn.execute("SELECT SUM(count) FROM terms WHERE term >= ? AND term < ?",
+                                  (word, word + _PREFIX_END)).fetchone()[0]
+        return word, None, count
+
+    def _walk(self, word, terms, field):
+        """(height, position) of every posting of the terms, newest first and without repeats"""
+        where = "" if field is None else f" AND field = {FIELDS[field]}"
+        order = " ORDER BY height DESC, position DESC"
+        if terms is None:
+            # Cheaper to let SQLite sort the range than to open a cursor per term
+            cursors = [self.conn.execute("SELECT DISTINCT height, position FROM postings "
+                                         "WHERE term >= ? AND term < ?" + where + order,
+                                         (word, word + _PREFIX_END))]
+        else:
+            # Each cursor reads one term in key order and stops when the merge does
+            cursors = [self.conn.execute("SELECT height, position FROM postings WHERE term = ?" + where + order,
+                                         (term,)) for term in terms]
+        previous = None
+        for posting in heapq.merge(*cursors, reverse=True):
+            if posting != previous:
+                yield posting
+                previous = posting
+
+    def _probe(self, terms, field, candidates):
+        """The candidates that have a posting for one of the terms, one key lookup each"""
+        values = ", ".join(["(?, ?)"] * len(candidates))
+        where = "" if field is None else f" AND field = {FIELDS[field]}"
+        sql = (f"SELECT column1, column2 FROM (VALUES {values}) WHERE EXISTS (SELECT 1 FROM postings "
+               f"WHERE term IN ({', '.join('?' * len(terms))}) AND height = column1 AND position = column2{where})")
+        params = [value for candidate in candidates for value in candidate] + terms
+        return set(self.conn.execute(sql, params))
+
+    def _load(self, word, field):
+        """Every (height, position) with a term starting with word"""
+        where = "" if field is None else f" AND field = {FIELDS[field]}"
+        return set(self.conn.execute("SELECT height, position FROM postings WHERE term >= ? AND term < ?" + where,
+                                     (word, word + _PREFIX_END)))
+
+    def search(self, query, field=None, limit=DEFAULT_LIMIT):
+        """(height, position) of matching transactions, newest first.
+
+        field restricts the search to one of FIELDS, otherwise all are searched.
+        The postings of the rarest word are read newest first and checked
+        against the other words PROBE_BATCH at a time, and reading stops once
+        there are `limit` matches, so the work depends on the limit rather than
+        on how common the words are.
+        """
+        expanded = sorted((self._expand(word) for word in set(tokenize(query))), key=lambda e: e[2])
+        if not expanded or not expanded[0][2]:
+            return []
+        word, terms, _ = expanded[0]
+        postings = self._walk(word, terms, field)
+        if len(expanded) == 1:
+            return list(islice(postings, limit))
+        loaded = {}
+        results = []
+        while len(results) < limit:
+            batch = list(islice(postings, PROBE_BATCH))
+            if not batch:
+                break
+            matches = set(batch)
+            for other, other_terms, _ in expanded[1:]:
+                if other_terms is None:
+                    if other not in loaded:
+                        loaded[other] = self._load(other, field)
+                    matches &= loaded[other]
+                else:
+                    matches = self._probe(other_terms, field, matches)
+                if not matches:
+                    break
+            results.extend(posting for posting in batch if posting in matches)
+        return results[:limit]
+
+    def registration_heights(self, reg_no):
+        """Heights of the blocks with a registration number made of the same words as reg_no"""
+        words = set(tokenize(reg_no))
+        if not words:
+            return []
+        select = f"SELECT height FROM postings WHERE term = ? AND field = {FIELDS[CAR_REGISTRATION]}"
+        sql = " INTERSECT ".join([select] * len(words)) + " ORDER BY height"
+        return [row[0] for row in self.conn.execute(sql, list(words))]
+
+
+def search_transactions(ledger, index, query, field=None, limit=DEFAULT_LIMIT):
+    """Matching transactions as dicts with height, position and transaction text"""
+    blocks = {}
+    results = []
+    for height, position in index.search(query, field, limit):
+        if height not in blocks:
+            blocks[height] = ledger.get_block(height)
+        results.append({"height": height, "position": position,
+                        "transaction": blocks[height]["transactions"][position]})
+    return results
+
+
+def open_search_index(ledger, path=SEARCH_INDEX_PATH):
+    """Open the search index and catch it up with the ledger's chain"""
+    index = SearchIndex(path)
+    index.sync(ledger)
+    return index
+
+
+if __name__ == "__main__":
+    from ledger import open_ledger
+
+    parser = argparse.ArgumentParser(description="Search the transactions in the blockchain")
+    parser.add_argument("query", help="words to look for, each one matches the start of a word")
+    parser.add_argument("--field", choices=list(FIELDS), help="only search this transaction field")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT, help="maximum number of results")
+    args = parser.parse_args()
+    ledger = open_ledger()
+    start = time.perf_counter()
+    results = ledger.search(args.query, args.field, args.limit)
+    elapsed = time.perf_counter() - start
+    for result in results:
+        print(f"Block {result['height']}, #{result['position']}: {result['transaction']}")
+    print(f"{len(results)} results in {elapsed * 1000:.1f} ms")
@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the top of the repository, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Run the test in an empty data directory, the ledger files use relative paths"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
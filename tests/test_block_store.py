@@ -0,0 +1,41 @@
+import hashlib
+import os
+
+from block_store import GENESIS_TEXT, TRANSACTION_SEPARATOR, open_block_store
+from merkle import merkle_root
+from test_journal import transaction
+
+GENESIS_HASH = hashlib.sha256(GENESIS_TEXT.encode('utf-8')).hexdigest()
+
+
+def legacy_line(number, transactions, nonce, block_hash, extra=""):
+    """A blocks.txt line as the old miner windows wrote it, newlines replaced with commas"""
+    body = TRANSACTION_SEPARATOR.join(transactions).replace("\n", ",")
+    return (f"Block number: {number}, Transactions: {{{body}}}, Nonce: {nonce}, {extra}"
+            f"Number of Transactions: {len(transactions)}, Hash: {block_hash}\n")
+
+
+def test_legacy_blocks_are_migrated(data_dir):
+    mined = [transaction(1, "KA01"), transaction(2, "KA02")]
+    with open("blocks.txt", "w") as f:
+        f.write(f"Block number: 0, Transaction: {{{GENESIS_TEXT}}}, Nonce: 0, Number of Transactions: 1, "
+                f"Hash: {GENESIS_HASH}\n")
+        f.write(legacy_line(1, mined, 42, "a1" * 32))
+        f.write("\nnot a block\n")
+        # Block numbers were rolled back after a cancel, so they can skip
+        f.write(legacy_line(5, [transaction(3, "KA03")], 7, "b2" * 32,
+                            "Timestamp: 1700000000.5, Difficulty: 8.0, Algorithm: sha256d, "))
+
+    store = open_block_store()
+    blocks = list(store.iter_blocks())
+    assert [block["height"] for block in blocks] == [0, 1, 2]
+    assert [block["hash"] for block in blocks] == [GENESIS_HASH, "a1" * 32, "b2" * 32]
+    assert [block["prev_hash"] for block in blocks] == ["", GENESIS_HASH, "a1" * 32]
+    assert [block["transactions"] for block in blocks] == [[GENESIS_TEXT], mined, [transaction(3, "KA03")]]
+    assert [block["nonce"] for block in blocks] == [0, 42, 7]
+    assert all(block["legacy"] and block["merkle_root"] == merkle_root(block["transactions"]) for block in blocks)
+    assert (blocks[2]["timestamp"], blocks[2]["difficulty"], blocks[2]["algorithm"]) == (1700000000.5, 8.0, "sha256d")
+
+    assert not os.path.exists("blocks.txt")
+    assert os.path.exists("blocks.txt.migrated")
+    assert len(open_block_store()) == 3
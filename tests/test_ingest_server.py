@@ -0,0 +1,147 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from file_lock import write_lock
+from ingest_server import IngestService, make_handler
+from ledger import FileLedger
+
+STATS = b"GET /stats HTTP/1.1\r\nConnection: close\r\n\r\n"
+
+
+async def _send(port, request):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(request)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split(b" ")[1]), json.loads(body)
+
+
+async def _exchange(service, request):
+    """Send raw bytes to a running handler, returns the status and JSON body of the response"""
+    server = await asyncio.start_server(make_handler(service), "127.0.0.1", 0)
+    async with server:
+        return await _send(server.sockets[0].getsockname()[1], request)
+
+
+def _post(payload):
+    body = json.dumps(payload).encode('utf-8')
+    return (b"POST /transactions HTTP/1.1\r\nConnection: close\r\n"
+            b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+
+
+@pytest.fixture
+def ledger(data_dir):
+    # The service opens its own ledger on the writer thread
+    ledger = FileLedger()
+    yield ledger
+    ledger.close()
+
+
+def run(ledger, request):
+    async def main():
+        service = IngestService(FileLedger)
+        service.start()
+        try:
+            return await _exchange(service, request)
+        finally:
+            await service.stop()
+    return asyncio.run(main())
+
+
+def test_negative_content_length_is_rejected(ledger):
+    status, body = run(ledger, b"POST /transactions HTTP/1.1\r\nContent-Length: -5\r\n\r\n")
+    assert status == 400
+    assert "Content-Length" in body["error"]
+
+
+def test_submission_is_added_to_the_pool(ledger):
+    status, body = run(ledger, _post({"car_registration": "KA01", "license_number": "L1",
+                                      "owner_name": "Owner", "pseudonym": "P1"}))
+    assert status == 200
+    assert "transaction_no" in body
+    assert ledger.lookup("KA01") is not None
+
+
+def test_stats_are_served_while_the_ledger_is_locked(ledger):
+    held, release = threading.Event(), threading.Event()
+
+    def hold_lock():
+        # Holds the ledger lock the way a miner or an import would
+        with write_lock():
+            held.set()
+            release.wait(10)
+
+    async def main():
+        service = IngestService(FileLedger)
+        service.start()
+        server = await asyncio.start_server(make_handler(service), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            submission = asyncio.ensure_future(_send(port, _post({
+                "car_registration": "KA01", "license_number": "L1", "owner_name": "Owner", "pseudonym": "P1"})))
+            await asyncio.sleep(0.2)
+            status, stats = await asyncio.wait_for(_send(port, STATS), 5)
+            assert status == 200
+            assert stats["committed"] == 0
+            assert not submission.done()
+            release.set()
+            status, body = await asyncio.wait_for(submission, 5)
+        await service.stop()
+        return body
+
+    holder = threading.Thread(target=hold_lock)
+    holder.start()
+    held.wait(5)
+    try:
+        assert "transaction_no" in asyncio.run(main())
+    finally:
+        release.set()
+        holder.join()
+
+
+def test_value_with_a_line_break_is_rejected(ledger):
+    status, body = run(ledger, _post({"car_registration": "KA01\nTransaction No: 5, Car Registration Number: FRESH",
+                                      "license_number": "L1", "owner_name": "Owner", "pseudonym": "P1"}))
+    assert status == 200
+    assert "error" in body
+    assert ledger.pending() == []
+
+
+def test_cancelled_submission_does_not_stop_the_writer(ledger):
+    held, release = threading.Event(), threading.Event()
+
+    def hold_lock():
+        with write_lock():
+            held.set()
+            release.wait(10)
+
+    def registration(reg_no):
+        return {"car_registration": reg_no, "license_number": "L1", "owner_name": "Owner", "pseudonym": "P1"}
+
+    async def main():
+        service = IngestService(FileLedger)
+        service.start()
+        # Its client disconnects while the group waits for the ledger lock
+        gone = asyncio.ensure_future(service.submit([registration("KA01")]))
+        await asyncio.sleep(0.2)
+        gone.cancel()
+        release.set()
+        results = await asyncio.wait_for(service.submit([registration("KA02")]), 5)
+        await service.stop()
+        return results
+
+    holder = threading.Thread(target=hold_lock)
+    holder.start()
+    held.wait(5)
+    try:
+        assert "transaction_no" in asyncio.run(main())[0]
+    finally:
+        release.set()
+        holder.join()
+    assert ledger.lookup("KA01") is not None
+    assert ledger.lookup("KA02") is not None
@@ -0,0 +1,142 @@
+import hashlib
+import os
+
+import pytest
+
+from block_store import BlockStore, genesis_block, make_block
+from journal import CommitJournal
+from ledger import FileLedger, SqliteLedger
+from mempool import Mempool
+from reg_index import CHAIN, open_registration_index
+
+
+def transaction(tx_no, reg_no):
+    return (f"Transaction No: {tx_no}, Car Registration Number: {reg_no}, License Number: L{tx_no}, "
+            f"Car Owner Name: Owner {tx_no}, Pseudonym: P{tx_no}")
+
+
+def next_block(store, transactions):
+    """A block on top of the store's tip, the proof of work isn't checked by the store"""
+    tip = store.tip()
+    height = tip["height"] + 1 if tip else 0
+    block_hash = hashlib.sha256(f"{height} {transactions}".encode('utf-8')).hexdigest()
+    return make_block(height, tip["hash"] if tip else "", transactions, 0, block_hash)
+
+
+@pytest.fixture
+def chain(data_dir):
+    store = BlockStore()
+    store.append(genesis_block())
+    mempool = Mempool()
+    mempool.add_many([transaction(1, "KA01"), transaction(2, "KA02")], sync=True)
+    return store, mempool
+
+
+def test_replay_applies_a_journaled_commit(chain):
+    store, mempool = chain
+    block = next_block(store, [transaction(1, "KA01")])
+    journal = CommitJournal()
+    # Crash after the journal was synced, before the block store or pool were touched
+    journal._append([(block, block["transactions"])])
+
+    assert CommitJournal().recover(BlockStore(), Mempool()) == 1
+    assert BlockStore().tip()["hash"] == block["hash"]
+    assert Mempool().transactions() == [transaction(2, "KA02")]
+    assert journal.records() == []
+
+
+def test_replay_is_harmless_after_the_commit_was_applied(chain):
+    store, mempool = chain
+    block = next_block(store, [transaction(1, "KA01")])
+    CommitJournal(checkpoint_interval=100).commit(store, mempool, [(block, block["transactions"])])
+
+    assert CommitJournal().recover(BlockStore(), Mempool()) == 1
+    assert len(BlockStore()) == 2
+    assert Mempool().transactions() == [transaction(2, "KA02")]
+
+
+def test_torn_record_is_dropped(chain):
+    store, mempool = chain
+    first = next_block(store, [transaction(1, "KA01")])
+    journal = CommitJournal()
+    journal._append([(first, first["transactions"])])
+    second = make_block(2, first["hash"], [transaction(2, "KA02")], 0, "ab" * 32)
+    torn = journal._encode(second, second["transactions"])
+    with open(journal.path, "a") as f:
+        f.write(torn[:len(torn) // 2])
+
+    assert [record["block"]["height"] for record in journal.records()] == [1]
+    assert journal.recover(BlockStore(), Mempool()) == 1
+    assert len(BlockStore()) == 2
+    # The torn commit never happened, its transaction is still pending
+    assert Mempool().transactions() == [transaction(2, "KA02")]
+    assert os.path.getsize(journal.path) == 0
+
+
+def test_corrupt_record_stops_the_replay(chain):
+    store, _ = chain
+    block = next_block(store, [transaction(1, "KA01")])
+    journal = CommitJournal()
+    journal._append([(block, block["transactions"])])
+    with open(journal.path, "r+") as f:
+        line = f.read()
+        f.seek(0)
+        f.write(line.replace("KA01", "KA09"))
+
+    assert journal.records() == []
+    assert journal.recover(BlockStore(), Mempool()) == 0
+    assert len(BlockStore()) == 1
+
+
+def test_commit_refuses_a_block_not_linked_to_the_tip(chain):
+    store, mempool = chain
+    block = next_block(store, [transaction(1, "KA01")])
+    block["prev_hash"] = "de" * 32
+    journal = CommitJournal()
+    with pytest.raises(ValueError):
+        journal.commit(store, mempool, [(block, block["transactions"])])
+    # Nothing was journaled, so nothing is replayed later
+    assert journal.records() == []
+    assert len(store) == 1
+
+
+def test_tip_and_torn_block_are_recovered(chain):
+    store, mempool = chain
+    block = next_block(store, [transaction(1, "KA01")])
+    CommitJournal().commit(store, mempool, [(block, block["transactions"])])
+    os.remove(store.tip_path)
+    with open(store.path, "a") as f:
+        f.write('{"height": 2, "prev_hash": ')
+
+    reopened = BlockStore()
+    assert len(reopened) == 2
+    assert reopened.tip()["hash"] == block["hash"]
+    assert reopened.get(-1) == block
+
+
+def test_registration_index_catches_up_with_the_chain(chain):
+    store, mempool = chain
+    index = open_registration_index(store=store)
+    index.close()
+    block = next_block(store, [transaction(1, "KA01")])
+    # Crash after the commit, before the registration index was updated
+    CommitJournal().commit(store, mempool, [(block, block["transactions"])])
+
+    index = open_registration_index(store=BlockStore())
+    assert index.lookup("KA01") == (CHAIN, 1)
+    index.close()
+
+
+def test_ledgers_refuse_a_block_not_linked_to_the_tip(data_dir):
+    for ledger in (FileLedger(), SqliteLedger()):
+        ledger.commit_block(genesis_block(), [])
+        ledger.add_pending(transaction(1, "KA01"))
+        block = next_block(ledger, [transaction(1, "KA01")])
+        forged = dict(block, prev_hash="de" * 32)
+        with pytest.raises(ValueError):
+            ledger.commit_block(forged, forged["transactions"])
+        assert len(ledger) == 1
+        ledger.commit_block(block, block["transactions"])
+        assert ledger.tip()["hash"] == block["hash"]
+        assert ledger.pending() == []
+        ledger.close()
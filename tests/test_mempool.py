@@ -0,0 +1,83 @@
+import os
+
+from mempool import Mempool
+from test_journal import transaction
+
+
+def lines(count):
+    return [transaction(n, f"KA{n:02d}") for n in range(1, count + 1)]
+
+
+def test_removing_appends_a_tombstone_instead_of_rewriting(data_dir):
+    pool = Mempool()
+    pool.add_many(lines(3))
+    with open(pool.path, "rb") as f:
+        log = f.read()
+    assert pool.remove(lines(3)[1])
+
+    with open(pool.path, "rb") as f:
+        assert f.read() == log
+    with open(pool.tombstone_path) as f:
+        assert f.read().splitlines() == [f"log {os.stat(pool.path).st_ino}", str(log.index(b"\n") + 1)]
+    assert pool.dead == 1
+    assert Mempool().transactions() == [lines(3)[0], lines(3)[2]]
+    assert pool.get(2) is None
+    assert pool.by_registration("KA02") is None
+    assert not pool.remove(lines(3)[1])
+
+
+def test_reads_past_lines_removed_by_another_writer(data_dir):
+    writer, reader = Mempool(), Mempool()
+    writer.add_many(lines(2))
+    assert reader.transactions() == lines(2)
+    writer.remove(lines(2)[0])
+    writer.add_many(lines(4)[2:])
+
+    assert reader.transactions() == lines(4)[1:]
+    assert reader.get(1) is None
+    assert reader.by_registration("KA04") == lines(4)[3]
+
+
+def test_line_still_being_written_is_read_once_complete(data_dir):
+    pool = Mempool()
+    pool.add_many(lines(1))
+    with open(pool.path, "a") as f:
+        f.write(lines(2)[1][:20])
+    assert pool.transactions() == lines(1)
+    with open(pool.path, "a") as f:
+        f.write(lines(2)[1][20:] + "\n")
+    assert pool.transactions() == lines(2)
+
+
+def test_compaction_keeps_only_live_lines(data_dir):
+    pool = Mempool(compact_min_dead=2)
+    pool.add_many(lines(4))
+    pool.remove_many(lines(4)[:2])
+    # Two removed and two live, compaction waits until the dead outnumber the live
+    assert pool.dead == 2
+    pool.remove(lines(4)[2])
+
+    assert pool.dead == 0
+    assert not os.path.exists(pool.tombstone_path)
+    with open(pool.path) as f:
+        assert f.read() == lines(4)[3] + "\n"
+    assert Mempool().transactions() == lines(4)[3:]
+    pool.add_many(lines(5)[4:])
+    assert pool.transactions() == lines(5)[3:]
+
+
+def test_tombstones_of_a_replaced_log_are_ignored(data_dir):
+    pool = Mempool()
+    pool.add_many(lines(2))
+    pool.remove(lines(2)[0])
+    # A compaction interrupted after the new log replaced the old one, before the tombstones were removed
+    with open("replacement.tmp", "w") as f:
+        f.write("".join(line + "\n" for line in lines(2)))
+    os.replace("replacement.tmp", pool.path)
+
+    assert Mempool().transactions() == lines(2)
+    assert pool.transactions() == lines(2)
+    pool.remove(lines(2)[1])
+    with open(pool.tombstone_path) as f:
+        assert f.readline().strip() == f"log {os.stat(pool.path).st_ino}"
+    assert Mempool().transactions() == lines(2)[:1]
@@ -0,0 +1,38 @@
+import threading
+
+import mining_engine
+from block_store import genesis_block
+from ledger import FileLedger
+from miner_daemon import MinerDaemon
+from test_journal import transaction
+
+
+def test_daemon_mines_again_after_a_stop(data_dir, monkeypatch):
+    # Workers look at the stop event every CHECK_INTERVAL nonces, long before
+    # they find a nonce at difficulty 16, so a search left cancelled finds nothing
+    monkeypatch.setattr(mining_engine, "CHECK_SECONDS", 0)
+    ledger = FileLedger()
+    ledger.commit_block(genesis_block(), [])
+    ledger.add_pending_many([transaction(1, "KA01"), transaction(2, "KA02")])
+    ledger.close()
+    daemons, mined = [], []
+
+    def stop_then_run():
+        # The ledger's SQLite connections belong to the thread that opens them
+        daemon = MinerDaemon(FileLedger(), workers=1, difficulty=16)
+        daemons.append(daemon)
+        daemon.stop()
+        mined.append(daemon.run(max_blocks=1, poll_interval=0.01))
+        daemon.ledger.close()
+
+    runner = threading.Thread(target=stop_then_run)
+    runner.start()
+    runner.join(timeout=30)
+    if runner.is_alive():
+        daemons[0].stop()
+        runner.join()
+    assert mined == [1]
+    ledger = FileLedger()
+    assert len(ledger.get_block(1)["transactions"]) == 2
+    assert ledger.pending() == []
+    ledger.close()
@@ -0,0 +1,112 @@
+import multiprocessing
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+import pytest
+
+from block_store import BlockStore, genesis_block
+from file_lock import write_lock
+from ledger import FileLedger, SqliteLedger
+from reg_index import CHAIN, RegistrationIndex
+from search_index import SearchIndex
+from test_journal import next_block, transaction
+from txid import TransactionIds
+
+PROCESSES = 4
+
+pytestmark = pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(),
+                                reason="the workers inherit the test's data directory through fork")
+
+
+def _worker(target, barrier, results, args):
+    barrier.wait()
+    results.put(target(*args))
+
+
+def run_processes(target, *args):
+    """Run target(*args) in PROCESSES processes started together, returns their results"""
+    context = multiprocessing.get_context("fork")
+    barrier = context.Barrier(PROCESSES)
+    results = context.Queue()
+    processes = [context.Process(target=_worker, args=(target, barrier, results, args)) for _ in range(PROCESSES)]
+    for process in processes:
+        process.start()
+    collected = [results.get(timeout=60) for _ in processes]
+    for process in processes:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+    return collected
+
+
+def add_registrations(ledger_class, count):
+    ledger = ledger_class()
+    added = 0
+    for start in range(0, count, 5):
+        group = [transaction(n, f"KA{n}") for n in range(start, start + 5)]
+        added += len(group) - len(ledger.add_pending_many(group))
+    ledger.close()
+    return added
+
+
+@pytest.mark.parametrize("ledger_class", [FileLedger, SqliteLedger])
+def test_each_registration_is_added_once(data_dir, ledger_class):
+    ledger_class().close()
+    added = run_processes(add_registrations, ledger_class, 100)
+    assert sum(added) == 100
+    ledger = ledger_class()
+    assert sorted(ledger.pending()) == sorted(transaction(n, f"KA{n}") for n in range(100))
+    ledger.close()
+
+
+def take_numbers(count):
+    ids = TransactionIds(lease_size=7, ledger=FileLedger())
+    return [ids.next() for _ in range(count)]
+
+
+def test_transaction_numbers_are_unique(data_dir):
+    FileLedger().close()
+    numbers = [n for taken in run_processes(take_numbers, 200) for n in taken]
+    assert len(set(numbers)) == len(numbers) == PROCESSES * 200
+
+
+def sync_indexes():
+    store = BlockStore()
+    with SearchIndex() as search, RegistrationIndex() as registrations:
+        search.sync(store)
+        registrations.sync(store)
+    return True
+
+
+def test_concurrent_syncs_index_each_block_once(data_dir):
+    store = BlockStore()
+    store.append(genesis_block())
+    for height in range(1, 41):
+        store.append(next_block(store, [transaction(height * 10 + n, f"KA{height}-{n}") for n in range(10)]))
+    assert all(run_processes(sync_indexes))
+
+    conn = sqlite3.connect("search.db")
+    counted = dict(conn.execute("SELECT term, count FROM terms"))
+    actual = dict(conn.execute("SELECT term, COUNT(*) FROM postings GROUP BY term"))
+    conn.close()
+    assert counted == actual
+    with RegistrationIndex() as registrations:
+        assert registrations.lookup("KA40-9") == (CHAIN, 40)
+        assert registrations._get_meta("chain_height") == 40
+
+
+@pytest.mark.parametrize("opener", ["from block_store import open_block_store; open_block_store()",
+                                    "from reg_index import open_registration_index; open_registration_index()"],
+                         ids=["block_store", "reg_index"])
+def test_opening_waits_for_the_write_lock(data_dir, opener):
+    store = BlockStore()
+    store.append(genesis_block())
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with write_lock():
+        # Opening may repair the files, so it waits for a writer in the middle of an append
+        reader = subprocess.Popen([sys.executable, "-c", opener], env=dict(os.environ, PYTHONPATH=repo))
+        time.sleep(0.5)
+        assert reader.poll() is None
+    assert reader.wait(timeout=30) == 0
@@ -0,0 +1,82 @@
+import os
+
+import reg_index
+from bloom import BloomFilter
+from file_lock import write_lock
+from ledger import FileLedger
+from mempool import Mempool
+from reg_index import PENDING, RegistrationIndex
+from test_journal import transaction
+
+
+def add_behind_the_cache(path, reg_no):
+    """Add a key the way another process would, keeping the file's mtime so a stat can't see it"""
+    st = os.stat(path)
+    other = BloomFilter.load(path)
+    other.add(reg_no)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+
+def test_lookups_outside_the_lock_only_stat_the_filter(data_dir, monkeypatch):
+    index = RegistrationIndex()
+    index.add_pending_many([(f"KA{n}", n) for n in range(10)])
+    reads = []
+    monkeypatch.setattr(reg_index, "read_signature", lambda path: reads.append(path))
+    for n in range(100, 200):
+        assert index.lookup(f"KA{n}") is None
+    assert reads == []
+    index.close()
+
+
+def test_first_lookup_under_the_lock_reads_the_header(data_dir):
+    index = RegistrationIndex()
+    index.add_pending_many([("KA01", 1)])
+    index.bloom()
+    add_behind_the_cache(index.bloom_path, "KA02")
+    index.conn.execute("INSERT INTO registrations (reg_no, location, height, tx_no) VALUES ('KA02', ?, NULL, 2)",
+                       (PENDING,))
+    # Outside the lock the stale filter may call it new, which writers check again under the lock
+    assert not index.might_contain("KA02")
+    with write_lock():
+        assert index.lookup("KA02") == (PENDING, None)
+    index.close()
+
+
+def test_add_many_writes_the_same_file_as_add(data_dir):
+    keys = [f"KA{n}" for n in range(500)]
+    BloomFilter(1000).save("one.bloom")
+    BloomFilter(1000).save("many.bloom")
+    one = BloomFilter.load("one.bloom")
+    for key in keys:
+        one.add(key)
+    BloomFilter.load("many.bloom").add_many(keys)
+    # Sparse changes are written byte by byte, dense ones as a span
+    BloomFilter.load("many.bloom").add_many(["KA-late"])
+    one.add("KA-late")
+    with open("one.bloom", "rb") as a, open("many.bloom", "rb") as b:
+        assert a.read() == b.read()
+
+
+def test_opening_the_ledger_indexes_a_pool_write_the_index_missed(data_dir):
+    FileLedger().close()
+    # Crash after the pool write, before the index write
+    Mempool().add_many([transaction(1, "KA01")], sync=True)
+
+    ledger = FileLedger()
+    assert ledger.lookup("KA01") == (PENDING, None)
+    assert not ledger.add_pending(transaction(2, "KA01"))
+    ledger.close()
+
+
+def test_opening_the_ledger_forgets_a_denied_registration_the_index_kept(data_dir):
+    ledger = FileLedger()
+    ledger.add_pending(transaction(1, "KA01"))
+    # Crash in deny() after the pool write, before the index write
+    ledger.denied_log.append(transaction(1, "KA01"))
+    ledger.mempool.remove(transaction(1, "KA01"))
+    ledger.close()
+
+    ledger = FileLedger()
+    assert ledger.lookup("KA01") is None
+    assert ledger.add_pending(transaction(2, "KA01"))
+    ledger.close()
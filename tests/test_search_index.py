@@ -0,0 +1,88 @@
+import sqlite3
+
+import pytest
+
+from search_index import MERGE_TERMS, SearchIndex, open_search_index
+from transactions import CAR_REGISTRATION, OWNER_NAME
+
+
+def transaction(tx_no, reg_no, owner, vehicle_type):
+    return (f"Transaction No: {tx_no}, Car Registration Number: {reg_no}, License Number: DL{tx_no}, "
+            f"Car Owner Name: {owner}, Pseudonym: p{tx_no}, Vehicle Type: {vehicle_type}")
+
+
+class Chain:
+    """Just enough of a ledger for SearchIndex.sync()"""
+
+    def __init__(self, blocks):
+        self.blocks = blocks
+
+    def tip(self):
+        return {"height": len(self.blocks) - 1} if self.blocks else None
+
+    def iter_blocks(self, start=0):
+        return iter(self.blocks[start:])
+
+
+@pytest.fixture
+def chain():
+    owners = ["Asha Rao", "Ravi Kumar", "Meera Rao"]
+    types = ["sedan", "suv"]
+    blocks = []
+    for height in range(20):
+        blocks.append({"height": height, "transactions": [
+            transaction(height * 10 + p, f"KA-{p:02d} AB {height * 10 + p}", owners[(height + p) % 3],
+                        types[p % 2]) for p in range(10)]})
+    return Chain(blocks)
+
+
+def brute_force(chain, words, field=None):
+    """Expected results, newest first"""
+    from search_index import tokenize
+    from transactions import parse_transaction
+    found = []
+    for block in reversed(chain.blocks):
+        for position in reversed(range(len(block["transactions"]))):
+            fields = parse_transaction(block["transactions"][position])
+            values = [fields.get(field, "")] if field else list(fields.values())[1:]
+            tokens = [t for value in values for t in tokenize(value)]
+            if all(any(t.startswith(w) for t in tokens) for w in words):
+                found.append((block["height"], position))
+    return found
+
+
+@pytest.mark.parametrize("query, field", [
+    ("sedan", None), ("rao sedan", None), ("ka 0", None), ("1", None), ("a", None),
+    ("rao", OWNER_NAME), ("ab 1", CAR_REGISTRATION), ("nothing", None),
+])
+def test_search_matches_brute_force(data_dir, chain, query, field):
+    index = open_search_index(chain)
+    expected = brute_force(chain, query.lower().split(), field)
+    assert index.search(query, field, limit=1000) == expected
+    assert index.search(query, field, limit=7) == expected[:7]
+    index.close()
+
+
+def test_word_with_many_terms_is_searched(data_dir, chain):
+    index = open_search_index(chain)
+    # "1" starts the number of almost every registration, more than MERGE_TERMS terms
+    assert index._expand("1")[1] is None
+    assert len(index._expand("sedan")[1]) <= MERGE_TERMS
+    assert index.search("1 sedan", limit=1000) == brute_force(chain, ["1", "sedan"])
+    index.close()
+
+
+def test_old_layout_is_rebuilt(data_dir, chain):
+    conn = sqlite3.connect("search.db")
+    conn.execute("CREATE TABLE postings (term TEXT NOT NULL, field INTEGER NOT NULL, height INTEGER NOT NULL, "
+                 "position INTEGER NOT NULL, PRIMARY KEY (term, field, height, position)) WITHOUT ROWID")
+    conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value INTEGER)")
+    conn.execute("INSERT INTO meta VALUES ('chain_height', 19)")
+    conn.commit()
+    conn.close()
+
+    index = SearchIndex()
+    assert index.indexed_height() == -1
+    index.sync(chain)
+    assert index.search("sedan", limit=1000) == brute_force(chain, ["sedan"])
+    index.close()
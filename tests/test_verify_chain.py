@@ -0,0 +1,105 @@
+import pytest
+
+from block_store import block_header, genesis_block, make_block
+from checkpoint import read_checkpoint, verify_from_checkpoint
+from ledger import FileLedger
+from merkle import merkle_root
+from pow_hash import get_hasher, meets_target, target_bytes
+from verify_chain import verify_chain
+
+DIFFICULTY = 4
+
+
+def transaction(tx_no, reg_no):
+    return (f"Transaction No: {tx_no}, Car Registration Number: {reg_no}, License Number: L{tx_no}, "
+            f"Car Owner Name: Owner {tx_no}, Pseudonym: P{tx_no}")
+
+
+def mined_block(ledger, transactions):
+    """A block on the ledger's tip with a real sha256d proof of work"""
+    hasher = get_hasher('sha256d')
+    tip = ledger.tip()
+    header = block_header(tip["hash"], merkle_root(transactions), tip["height"] + 1, 1.0, DIFFICULTY)
+    target = target_bytes(DIFFICULTY)
+    nonce = 0
+    while not meets_target(hasher.hash(header, nonce), target):
+        nonce += 1
+    return make_block(tip["height"] + 1, tip["hash"], transactions, nonce, hasher.hash(header, nonce).hex(),
+                      1.0, DIFFICULTY, hasher.spec())
+
+
+@pytest.fixture
+def ledger(data_dir):
+    ledger = FileLedger()
+    ledger.commit_block(genesis_block(), [])
+    ledger.commit_block(mined_block(ledger, [transaction(1, "KA01")]), [])
+    yield ledger
+    ledger.close()
+
+
+def test_mined_chain_is_valid(ledger):
+    result = verify_chain(ledger, workers=1)
+    assert result["valid"]
+    assert result["verified_height"] == 1
+    assert result["pow_skipped"] == 1
+
+
+@pytest.mark.parametrize("algorithm", [None, "no-such-hash"])
+def test_block_without_a_known_algorithm_is_invalid(ledger, algorithm):
+    tip = ledger.tip()
+    forged = make_block(2, tip["hash"], [transaction(2, "KA02")], 0, "ab" * 32, 1.0, DIFFICULTY, algorithm)
+    ledger.commit_block(forged, [])
+
+    result = verify_chain(ledger, workers=1)
+    assert not result["valid"]
+    assert result["error_height"] == 2
+    assert not verify_from_checkpoint(ledger, workers=1)["valid"]
+
+
+def test_forged_hash_is_invalid(ledger):
+    block = mined_block(ledger, [transaction(2, "KA02")])
+    block["nonce"] += 1
+    ledger.commit_block(block, [])
+
+    result = verify_chain(ledger, workers=1)
+    assert not result["valid"]
+    assert result["error_height"] == 2
+
+
+def test_block_without_a_merkle_root_is_invalid(ledger):
+    block = mined_block(ledger, [transaction(2, "KA02")])
+    block["merkle_root"] = None
+    ledger.commit_block(block, [])
+
+    result = verify_chain(ledger, workers=1)
+    assert not result["valid"]
+    assert result["error_height"] == 2
+    assert result["error"] == "merkle_root is missing"
+
+
+@pytest.mark.parametrize("damage", [lambda line: line[:len(line) // 2], lambda line: b"\x00garbage"],
+                         ids=["truncated", "garbage"])
+def test_unreadable_record_is_invalid(ledger, damage):
+    ledger.commit_block(mined_block(ledger, [transaction(2, "KA02")]), [])
+    with open("blocks.jsonl", "rb") as f:
+        lines = f.readlines()
+    # Keep the record's length so the offsets of the blocks after it still hold
+    damaged = damage(lines[1].rstrip(b"\n"))
+    lines[1] = damaged.ljust(len(lines[1]) - 1) + b"\n"
+    with open("blocks.jsonl", "wb") as f:
+        f.writelines(lines)
+
+    result = verify_chain(ledger, workers=1)
+    assert not result["valid"]
+    assert result["error_height"] == 1
+    assert result["error"].startswith("block record can't be read")
+
+
+def test_verification_resumes_after_the_checkpoint(ledger):
+    assert verify_from_checkpoint(ledger, workers=1)["verified_height"] == 1
+    ledger.commit_block(mined_block(ledger, [transaction(2, "KA02")]), [])
+
+    result = verify_from_checkpoint(ledger, workers=1)
+    assert result["valid"]
+    assert (result["resumed_from"], result["blocks"]) == (2, 1)
+    assert read_checkpoint()["height"] == 2
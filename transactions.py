@@ -0,0 +1,106 @@
+import unicodedata
+
+# Field names used in the transaction lines written by the Certificate Authority
+TRANSACTION_NO = "Transaction No"
+CAR_REGISTRATION = "Car Registration Number"
+LICENSE_NUMBER = "License Number"
+OWNER_NAME = "Car Owner Name"
+PSEUDONYM = "Pseudonym"
+VEHICLE_TYPE = "Vehicle Type"
+MANUFACTURE_YEAR = "Manufacture Year"
+
+
+def parse_transaction(line):
+    """Split a "Key: value, Key: value" transaction line into a dict"""
+    fields = {}
+    for part in line.strip().split(", "):
+        if ": " in part:
+            key, value = part.split(": ", 1)
+            fields[key.strip()] = value.strip()
+    return fields
+
+
+def registration_number(line):
+    """The exact car registration number of a transaction line, or None"""
+    return parse_transaction(line).get(CAR_REGISTRATION) or None
+
+
+def transaction_number(line):
+    """The transaction number of a transaction line as an int, or None"""
+    try:
+        return int(parse_transaction(line)[TRANSACTION_NO])
+    except (KeyError, ValueError):
+        return None
+
+# Fields a registration must have, and the optional ones, in the order they are written
+REQUIRED_FIELDS = (CAR_REGISTRATION, LICENSE_NUMBER, OWNER_NAME, PSEUDONYM)
+OPTIONAL_FIELDS = (VEHICLE_TYPE, MANUFACTURE_YEAR)
+# Keys used for the fields in JSON submissions and import files
+FIELD_KEYS = {
+    "car_registration": CAR_REGISTRATION,
+    "license_number": LICENSE_NUMBER,
+    "owner_name": OWNER_NAME,
+    "pseudonym": PSEUDONYM,
+    "vehicle_type": VEHICLE_TYPE,
+    "manufacture_year": MANUFACTURE_YEAR,
+}
+# Text that separates the fields of a transaction line, so no value may contain it
+FIELD_SEPARATORS = (", ", ": ")
+
+
+def unsafe_value(value):
+    """True if a field value would end the transaction line or start another field"""
+    if any(separator in value for separator in FIELD_SEPARATORS):
+        return True
+    # Cc covers \n, \r and the other control characters, Zl and Zp the
+    # Unicode line and paragraph separators that str.splitlines() breaks on
+    return any(unicodedata.category(ch) in ("Cc", "Zl", "Zp") for ch in value)
+
+
+def unsafe_fields(fields):
+    """Registration fields whose values can't be written into a transaction line"""
+    return [name for name in REQUIRED_FIELDS + OPTIONAL_FIELDS if unsafe_value(fields.get(name, ""))]
+
+
+def _unsafe_reason(names):
+    return f"{', '.join(names)} can't contain line breaks, control characters, ', ' or ': '"
+
+
+def format_transaction(tx_no, fields):
+    """The transaction line for a registration, optional fields are left out when empty.
+
+    Raises ValueError if a value contains a line break or a field separator.
+    """
+    unsafe = unsafe_fields(fields)
+    if unsafe:
+        raise ValueError(_unsafe_reason(unsafe))
+    parts = [f"{TRANSACTION_NO}: {tx_no}"]
+    for name in REQUIRED_FIELDS + OPTIONAL_FIELDS:
+        value = fields.get(name, "").strip()
+        if value or name in REQUIRED_FIELDS:
+            parts.append(f"{name}: {value}")
+    return ", ".join(parts)
+
+
+def missing_fields(fields):
+    """Required fields that are empty or absent"""
+    return [name for name in REQUIRED_FIELDS if not fields.get(name, "").strip()]
+
+
+def validate_registration(fields, ledger=None):
+    """Reason a registration can't be submitted, or None if it can.
+
+    These are the Certificate Authority form's checks: every required field is
+    filled in, no value contains a line break or a field separator, and the car
+    registration number is not pending or in the chain. Without a ledger the
+    last check is left to ledger.add_pending_many().
+    """
+    missing = missing_fields(fields)
+    if missing:
+        return f"missing {', '.join(missing)}"
+    unsafe = unsafe_fields(fields)
+    if unsafe:
+        return _unsafe_reason(unsafe)
+    if ledger is not None and ledger.lookup(fields[CAR_REGISTRATION].strip()) is not None:
+        return f"car registration number {fields[CAR_REGISTRATION].strip()} already exists"
+    return None
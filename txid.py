@@ -0,0 +1,112 @@
+import argparse
+import itertools
+import os
+import threading
+
+from file_lock import locked
+from transactions import transaction_number
+
+SEQUENCE_PATH = "transaction.seq"
+# Transaction numbers reserved by a writer each time it takes the lock
+LEASE_SIZE = 100
+
+# Allocators of this process, by sequence file
+_allocators = {}
+
+
+def highest_transaction_number(ledger):
+    """Highest transaction number in the pending pool and the chain, 0 if there are none"""
+    chain = (t for block in ledger.iter_blocks() for t in block["transactions"])
+    numbers = map(transaction_number, itertools.chain(ledger.pending(), chain))
+    return max(filter(None, numbers), default=0)
+
+
+class TransactionIds:
+    """Hands out unique transaction numbers to any number of processes.
+
+    transaction.seq holds the first number no writer has reserved yet. A
+    writer takes the lock on transaction.seq.lock, reserves the next
+    lease_size numbers by moving the sequence forward, and then hands them
+    out from memory without touching the file. Numbers a writer reserved but
+    never used are skipped, so the numbers are unique and increasing per
+    writer, but can have gaps. The first writer creates the sequence from the
+    highest number already in the pool and the chain, later ones never scan.
+    """
+
+    def __init__(self, path=SEQUENCE_PATH, lease_size=LEASE_SIZE, ledger=None):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.lease_size = lease_size
+        self.ledger = ledger
+        self._next = 0
+        self._end = 0
+        self._mutex = threading.Lock()
+
+    def _read_sequence(self):
+        try:
+            with open(self.path, "r") as f:
+                return int(f.read().strip())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_sequence(self, value):
+        # Replace the file in one step, a crash leaves either the old or the new value
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(f"{value}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def _lease(self, count):
+        with locked(self.lock_path):
+            start = self._read_sequence()
+            if start is None:
+                ledger = self.ledger
+                if ledger is None:
+                    from ledger import open_ledger
+                    ledger = open_ledger()
+                start = highest_transaction_number(ledger) + 1
+            self._write_sequence(start + count)
+        self._next, self._end = start, start + count
+
+    def next(self):
+        """The next unused transaction number"""
+        with self._mutex:
+            if self._next >= self._end:
+                self._lease(self.lease_size)
+            self._next += 1
+            return self._next - 1
+
+    def peek(self):
+        """The highest number reserved by any writer so far, without reserving one"""
+        with locked(self.lock_path):
+            start = self._read_sequence()
+        return None if start is None else start - 1
+
+
+def transaction_ids(path=SEQUENCE_PATH):
+    """This process's allocator for the sequence file at `path`"""
+    if path not in _allocators:
+        _allocators[path] = TransactionIds(path)
+    return _allocators[path]
+
+
+def next_transaction_number(path=SEQUENCE_PATH):
+    return transaction_ids(path).next()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show or reset the transaction number sequence")
+    parser.add_argument("--reset", action="store_true",
+                        help="recreate the sequence from the highest number in the pool and chain")
+    args = parser.parse_args()
+    ids = TransactionIds()
+    if args.reset:
+        with locked(ids.lock_path):
+            if os.path.exists(ids.path):
+                os.remove(ids.path)
+    if ids.peek() is None:
+        # Creates the sequence without reserving any numbers
+        ids._lease(0)
+    print(f"Highest reserved transaction number: {ids.peek()}")
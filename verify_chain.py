@@ -0,0 +1,228 @@
+import argparse
+import os
+import sqlite3
+import struct
+import sys
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from block_store import header_of
+from merkle import merkle_root
+from pow_hash import hasher_from_spec, meets_target, target_bytes
+from transactions import registration_number
+
+# Blocks per proof-of-work job sent to a worker process
+BATCH_SIZE = 64
+# Jobs in flight per worker, bounds the memory used by the pipeline
+JOBS_PER_WORKER = 2
+# Blocks between progress reports
+PROGRESS_EVERY = 1000
+
+
+def _check_pow(batch):
+    """(height, diagnosis) of the first block in the batch whose proof of work fails, or None"""
+    hashers = {}
+    for height, spec, header, nonce, block_hash, difficulty in batch:
+        try:
+            if spec not in hashers:
+                hashers[spec] = hasher_from_spec(spec)
+            digest = hashers[spec].hash(header, nonce)
+        except (ValueError, ImportError) as e:
+            return height, f"cannot recompute the {spec} hash: {e}"
+        if digest.hex() != block_hash:
+            return height, f"stored hash {block_hash} does not match the recomputed hash {digest.hex()}"
+        if difficulty is not None and not meets_target(digest, target_bytes(difficulty)):
+            return height, f"hash {block_hash} does not meet difficulty {difficulty}"
+    return None
+
+
+class _Registrations:
+    """Registration numbers seen so far, kept in a temporary database so memory stays flat"""
+
+    def __init__(self, directory):
+        self.conn = sqlite3.connect(os.path.join(directory, "registrations.db"))
+        self.conn.execute("PRAGMA journal_mode=OFF")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute("CREATE TABLE seen (reg_no TEXT PRIMARY KEY, height INTEGER) WITHOUT ROWID")
+
+    def add(self, reg_no, height):
+        """Returns the height where reg_no was first seen if it is a duplicate, otherwise None"""
+        if self.conn.execute("INSERT OR IGNORE INTO seen VALUES (?, ?)", (reg_no, height)).rowcount:
+            return None
+        return self.conn.execute("SELECT height FROM seen WHERE reg_no = ?", (reg_no,)).fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+
+def _check_record(block):
+    """Diagnosis of a block record that is missing fields or has fields of the wrong type, or None"""
+    if not isinstance(block, dict):
+        return "block record is not a JSON object"
+    for key in ("height", "prev_hash", "merkle_root", "nonce", "hash", "transactions"):
+        if block.get(key) is None:
+            return f"{key} is missing"
+    if not isinstance(block["transactions"], list) or not all(isinstance(t, str) for t in block["transactions"]):
+        return "transactions are not a list of strings"
+    if not isinstance(block["nonce"], int):
+        return f"nonce {block['nonce']!r} is not an integer"
+    try:
+        if len(bytes.fromhex(block["merkle_root"])) != 32:
+            raise ValueError("not 32 bytes")
+    except (TypeError, ValueError):
+        return f"Merkle root {block['merkle_root']!r} is not a 32 byte hex string"
+    return None
+
+
+def _check_block(block, height, prev_hash, registrations, earlier_heights=None):
+    """Diagnosis of the sequential checks of one block, or None if it passes"""
+    error = _check_record(block)
+    if error is not None:
+        return error
+    if block["height"] != height:
+        return f"height field is {block['height']}, expected {height}"
+    if block["prev_hash"] != prev_hash:
+        return f"previous hash {block['prev_hash']!r} does not match block {height - 1} hash {prev_hash!r}"
+    if merkle_root(block["transactions"]) != block["merkle_root"]:
+        return f"Merkle root {block['merkle_root']} does not match the transactions"
+    if height > 0 and not block.get("legacy") and not block.get("algorithm"):
+        # Only the genesis block and migrated blocks have no proof of work to recompute
+        return "no proof-of-work algorithm is recorded"
+    for position, transaction in enumerate(block["transactions"]):
+        reg_no = registration_number(transaction)
+        if reg_no:
+            first = registrations.add(reg_no, height)
+            if first is None and earlier_heights is not None:
+                # Blocks before the verified range come from the ledger's index
+                first = min(earlier_heights(reg_no), default=None)
+            if first is not None:
+                return f"transaction {position + 1} repeats registration {reg_no} from block {first}"
+    return None
+
+
+def verify_chain(ledger=None, start=0, workers=None, progress=None):
+    """Stream the chain from `start` and check it, stopping at the first invalid block.
+
+    Hash linkage, heights, Merkle roots and duplicate registrations are checked
+    in order. Proof-of-work hashes are recomputed in parallel in a process
+    pool. The genesis block and legacy blocks are linked but their proof of
+    work can't be recomputed. Any other block without an algorithm, or with
+    one that is unknown, is invalid. When
+    starting after genesis, registrations are also looked up in the blocks
+    before `start` through ledger.registration_heights().
+
+    progress, if given, is called every PROGRESS_EVERY blocks with (blocks
+    checked, blocks per second). Returns a dict with valid, verified_height,
+    blocks, seconds, rate, pow_skipped and, for an invalid chain,
+    error_height and error.
+    """
+    if ledger is None:
+        from ledger import open_ledger
+        ledger = open_ledger()
+    workers = max(1, workers or os.cpu_count() or 1)
+    prev_hash = ledger.get_block(start - 1)["hash"] if start > 0 else ""
+
+    def earlier_heights(reg_no):
+        return [height for height in ledger.registration_heights(reg_no) if height < start]
+
+    failure = None
+    checked = 0
+    skipped = 0
+    last_height = start - 1
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp, ProcessPoolExecutor(max_workers=workers) as executor:
+        registrations = _Registrations(tmp)
+        jobs = deque()
+        batch = []
+
+        def collect(limit):
+            # Oldest job first, so a failure found here is the lowest failing height so far
+            while len(jobs) > limit:
+                found = jobs.popleft().result()
+                if found is not None:
+                    return found
+            return None
+
+        try:
+            blocks = ledger.iter_blocks(start)
+            height = start - 1
+            while True:
+                height += 1
+                try:
+                    block = next(blocks)
+                except StopIteration:
+                    break
+                except ValueError as e:
+                    # A torn or garbled record, the blocks after it can't be read either
+                    failure = (height, f"block record can't be read: {e}")
+                    break
+                error = _check_block(block, height, prev_hash, registrations,
+                                     earlier_heights if start > 0 else None)
+                if error is None and height > 0 and not block.get("legacy"):
+                    try:
+                        header = header_of(block)
+                    except (TypeError, ValueError, struct.error) as e:
+                        error = f"proof-of-work header can't be built: {e}"
+                if error is not None:
+                    failure = (height, error)
+                    break
+                if height == 0 or block.get("legacy"):
+                    skipped += 1
+                else:
+                    batch.append((height, block["algorithm"], header, block["nonce"],
+                                  block["hash"], block.get("difficulty")))
+                    if len(batch) >= BATCH_SIZE:
+                        jobs.append(executor.submit(_check_pow, batch))
+                        batch = []
+                        found = collect(workers * JOBS_PER_WORKER)
+                        if found is not None:
+                            failure = found
+                            break
+                prev_hash = block["hash"]
+                last_height = height
+                checked += 1
+                if progress is not None and checked % PROGRESS_EVERY == 0:
+                    progress(checked, checked / (time.perf_counter() - started))
+            if batch and (failure is None or failure[0] > batch[0][0]):
+                jobs.append(executor.submit(_check_pow, batch))
+            # Proof-of-work jobs still running cover lower heights than a sequential failure
+            found = collect(0)
+            if found is not None and (failure is None or found[0] < failure[0]):
+                failure = found
+        finally:
+            for job in jobs:
+                job.cancel()
+            registrations.close()
+    seconds = time.perf_counter() - started
+    result = {
+        "valid": failure is None,
+        "verified_height": last_height if failure is None else failure[0] - 1,
+        "blocks": checked if failure is None else failure[0] - start,
+        "seconds": seconds,
+        "rate": checked / seconds if seconds > 0 else 0.0,
+        "pow_skipped": skipped,
+    }
+    if failure is not None:
+        result["error_height"], result["error"] = failure
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check hash linkage, proof of work and duplicates of the chain")
+    parser.add_argument("--start", type=int, default=0, help="first block to verify")
+    parser.add_argument("--workers", type=int, default=None, help="proof-of-work processes, one per core by default")
+    args = parser.parse_args()
+
+    def report(blocks, rate):
+        print(f"{blocks} blocks checked, {rate:,.1f} blocks/sec")
+
+    result = verify_chain(start=args.start, workers=args.workers, progress=report)
+    print(f"{result['blocks']} blocks verified in {result['seconds']:.2f}s ({result['rate']:,.1f} blocks/sec), "
+          f"proof of work not recomputable for {result['pow_skipped']} legacy or genesis blocks")
+    if result["valid"]:
+        print(f"Chain is valid up to block {result['verified_height']}")
+    else:
+        print(f"Block {result['error_height']} is invalid: {result['error']}")
+        sys.exit(1)